@@ -0,0 +1,232 @@
+"""Non-blocking MySQL and HTTP clients for the asyncio serving mode (asgi.py).
+
+Requires aiomysql and httpx. Both are opened by start_clients() inside the
+running event loop and closed by close_clients(). Geocoding and weather
+results go through the same caches as the threaded code paths.
+"""
+import asyncio
+import logging
+import os
+import ssl
+import time
+
+import aiomysql
+import httpx
+
+import metrics
+from cache import AsyncSingleFlight
+from db_pool import PoolExhaustedError
+from logs import get_logger, log_event
+from slow_queries import slow_query_log
+from longlatgetter import GEOCODE_TIMEOUT, cached_geocode, normalize_city, store_geocode
+from sightings import (cached_weather, parse_weather_response, store_weather,
+                       weather_cache_key, weather_url)
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+
+logger = get_logger(__name__)
+
+# errors the async handlers turn into their usual 500 response
+DB_ERRORS = (aiomysql.Error, PoolExhaustedError)
+
+db_pool = None
+http_client = None
+pool_timeout = 5.0
+
+geocode_flight = AsyncSingleFlight()
+weather_flight = AsyncSingleFlight()
+
+
+class GeocodeError(Exception):
+    """The geocoding API answered with an error status (quota, bad key, ...)."""
+
+
+def aiomysql_config(db_config):
+    """Translate the mysql.connector db_config dict into aiomysql keyword args."""
+    config = {
+        "host": db_config["host"],
+        "port": int(db_config.get("port", 3306)),
+        "user": db_config["user"],
+        "password": db_config["password"],
+        "db": db_config["database"],
+        "autocommit": False,
+    }
+    if not db_config.get("ssl_disabled", False):
+        context = ssl.create_default_context()
+        if not db_config.get("ssl_verify_cert", True):
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        config["ssl"] = context
+    return config
+
+
+async def start_clients(db_config):
+    """Open the MySQL pool and the shared HTTP client (ASYNC_DB_POOL_* / ASYNC_HTTP_* env vars).
+
+    Waiting requests cost a coroutine, not a thread, so the pool only has to
+    be as large as the number of queries MySQL should run at once.
+    """
+    global db_pool, http_client, pool_timeout
+    pool_timeout = float(os.environ.get("DB_POOL_TIMEOUT", 5))
+    db_pool = await aiomysql.create_pool(
+        minsize=int(os.environ.get("ASYNC_DB_POOL_MIN", 1)),
+        maxsize=int(os.environ.get("ASYNC_DB_POOL_SIZE", 20)),
+        pool_recycle=int(os.environ.get("ASYNC_DB_POOL_RECYCLE", 3600)),
+        **aiomysql_config(db_config))
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(5.0, connect=GEOCODE_TIMEOUT),
+        limits=httpx.Limits(max_connections=int(os.environ.get("ASYNC_HTTP_MAX_CONNECTIONS", 100))))
+
+
+async def close_clients():
+    global db_pool, http_client
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+    if db_pool is not None:
+        db_pool.close()
+        await db_pool.wait_closed()
+        db_pool = None
+
+
+async def _acquire():
+    try:
+        return await asyncio.wait_for(db_pool.acquire(), pool_timeout)
+    except asyncio.TimeoutError:
+        raise PoolExhaustedError(msg=f"No database connection available within {pool_timeout}s")
+
+
+async def _timed_db(phase, awaitable):
+    # same db execute/fetch timers as db_pool.PooledCursor
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        metrics.record("db", time.perf_counter() - start, phase)
+
+
+async def _log_if_slow(cursor, sql, params, seconds, rows):
+    """Feed the slow query log; EXPLAIN new slow shapes on the same (idle) connection."""
+    logged = slow_query_log.observe(sql, params, seconds, rows, route=metrics.current_route())
+    if logged and slow_query_log.needs_explain(sql):
+        try:
+            await cursor.execute("EXPLAIN " + sql, params)
+            plan = await cursor.fetchall()
+        except Exception as e:
+            plan = {"error": str(e)}
+        slow_query_log.set_explain(sql, plan)
+
+
+async def fetchall(sql, params=()):
+    """Run a query and return its rows as dicts."""
+    conn = await _acquire()
+    try:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            start = time.perf_counter()
+            await _timed_db("execute", cursor.execute(sql, params))
+            rows = await _timed_db("fetch", cursor.fetchall())
+            await _log_if_slow(cursor, sql, params, time.perf_counter() - start, len(rows))
+            return rows
+    finally:
+        db_pool.release(conn)
+
+
+async def stream_query(sql, params, batch_size):
+    """Execute a query on an unbuffered cursor and return an async iterator of row batches.
+
+    The connection is held until the iterator is exhausted or closed (aclose()),
+    so callers must always finish or close it.
+    """
+    conn = await _acquire()
+    try:
+        cursor = await conn.cursor(aiomysql.SSDictCursor)
+        await _timed_db("execute", cursor.execute(sql, params))
+    except BaseException:
+        # don't hand a connection with a half-read result back to the pool
+        conn.close()
+        db_pool.release(conn)
+        raise
+
+    async def batches():
+        try:
+            while True:
+                rows = await _timed_db("fetch", cursor.fetchmany(batch_size))
+                if not rows:
+                    break
+                yield rows
+        finally:
+            await cursor.close()
+            db_pool.release(conn)
+
+    return batches()
+
+
+async def callproc_out(procname, args):
+    """Call a stored procedure and return the value of its last (OUT) argument.
+
+    PyMySQL-style drivers don't hand OUT params back from callproc(); they are
+    read from the @_<procname>_<n> session variables instead.
+    """
+    conn = await _acquire()
+    try:
+        async with conn.cursor() as cursor:
+            start = time.perf_counter()
+            await _timed_db("execute", cursor.callproc(procname, args))
+            slow_query_log.observe(f"CALL {procname}", args, time.perf_counter() - start,
+                                   cursor.rowcount, route=metrics.current_route())
+            while await cursor.nextset():
+                pass
+            await cursor.execute(f"SELECT @_{procname}_{len(args) - 1}")
+            row = await cursor.fetchone()
+            return row[0] if row else None
+    finally:
+        db_pool.release(conn)
+
+
+@metrics.timed("geocode")
+async def geocode_city(city):
+    """Async geocode_city: same cache tiers, Google's REST API via httpx."""
+    key = normalize_city(city)
+    if not key:
+        return None, None
+
+    # both tiers are local (memory / SQLite), cheap enough to read inline
+    cached = cached_geocode(key)
+    if cached is not None:
+        return cached
+
+    @metrics.timed("geocode_api")
+    async def fetch():
+        response = await http_client.get(GEOCODE_URL, params={
+            "address": city, "key": os.environ.get("GOOGLE_MAPS_API_KEY", "")})
+        response.raise_for_status()
+        data = response.json()
+        if data.get("status") not in ("OK", "ZERO_RESULTS"):
+            raise GeocodeError(data.get("error_message") or data.get("status"))
+        return store_geocode(key, data.get("results"))
+
+    return await geocode_flight.do(key, fetch)
+
+
+@metrics.timed("weather")
+async def fetch_weather_data(latitude, longitude):
+    """Async fetch_weather_data: same cell/time-bucket cache as sightings.py."""
+    key = weather_cache_key(latitude, longitude)
+
+    weather = cached_weather(key)
+    if weather is not None:
+        return weather
+
+    @metrics.timed("weather_api")
+    async def fetch():
+        try:
+            response = await http_client.get(weather_url(key[0], key[1]))
+            if response.status_code == 200:
+                result = parse_weather_response(response.json())
+                store_weather(key, result)
+                return result
+        except Exception as e:
+            log_event(logger, logging.WARNING, "weather_api_error", error=str(e))
+        return None
+
+    return await weather_flight.do(key, fetch)
@@ -0,0 +1,298 @@
+"""Sighting density heatmaps (/api/analytics/heatmap).
+
+Counts are binned with NumPy over an in-memory column snapshot of Sighting
+(latitude, longitude, pokemon_id, weather, appearedTimeOfDay), not with SQL
+GROUP BYs. The snapshot is sorted by latitude, so a bounding box starts as a
+binary-searched slice. It is loaded on the first request and refreshed in
+the background every ANALYTICS_SNAPSHOT_TTL seconds; requests keep using the
+previous copy meanwhile. Rendered heatmaps are cached per snapshot by
+(bbox, resolution, filters, layer).
+
+Memory: about 14 bytes per sighting per process (float32 coordinates, so
+positions are kept to ~1 m).
+"""
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from flask import Blueprint, current_app, jsonify, request
+from mysql.connector import Error
+
+from cache import TTLCache
+from logs import get_logger, log_event
+from pokemon_catalog import collation_key
+
+analytics_bp = Blueprint('analytics', __name__)
+logger = get_logger(__name__)
+
+get_connection = None
+pokemon_catalog = None
+sighting_columns = None
+
+SNAPSHOT_TTL = float(os.environ.get("ANALYTICS_SNAPSHOT_TTL", 300))
+DEFAULT_RESOLUTION = 128
+MAX_RESOLUTION = int(os.environ.get("ANALYTICS_MAX_RESOLUTION", 512))
+DEFAULT_TOP_SPECIES = 5
+MAX_TOP_SPECIES = 20
+LAYERS = ("species", "weather", "timeOfDay")
+
+heatmap_cache = TTLCache(maxsize=int(os.environ.get("ANALYTICS_CACHE_SIZE", 256)), ttl=SNAPSHOT_TTL)
+
+
+def init_analytics(connection_func, catalog):
+    global get_connection, pokemon_catalog, sighting_columns
+    get_connection = connection_func
+    pokemon_catalog = catalog
+    sighting_columns = SightingColumns(connection_func, reload_interval=SNAPSHOT_TTL)
+
+
+class SightingColumns:
+    """Column arrays of every Sighting, sorted by latitude.
+
+    weather and appearedTimeOfDay are dictionary-encoded: the arrays hold
+    codes into weather_names / time_names. Each reload builds a new
+    snapshot dict and swaps it in whole, so readers never see a mix.
+    """
+
+    def __init__(self, get_connection, reload_interval=300.0, batch_size=50000):
+        self.get_connection = get_connection
+        self.reload_interval = reload_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._snapshot = None
+        self._version = 0
+
+    def reload(self):
+        """Read Sighting into fresh arrays and swap them in; returns the row count."""
+        weather_codes = {}
+        time_codes = {}
+        chunks = []
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT latitude, longitude, pokemon_id, weather, appearedTimeOfDay FROM Sighting")
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                lats, lngs, pokemon_ids, weathers, times = zip(*rows)
+                count = len(rows)
+                chunks.append((
+                    np.fromiter(map(float, lats), np.float32, count),
+                    np.fromiter(map(float, lngs), np.float32, count),
+                    np.fromiter(pokemon_ids, np.int32, count),
+                    np.fromiter((weather_codes.setdefault(w, len(weather_codes)) for w in weathers),
+                                np.uint16, count),
+                    np.fromiter((time_codes.setdefault(t, len(time_codes)) for t in times),
+                                np.uint16, count),
+                ))
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+        if chunks:
+            latitude, longitude, pokemon_id, weather, time_of_day = (
+                np.concatenate(column) for column in zip(*chunks))
+        else:
+            latitude = longitude = np.empty(0, np.float32)
+            pokemon_id = np.empty(0, np.int32)
+            weather = time_of_day = np.empty(0, np.uint16)
+        order = np.argsort(latitude, kind="stable")
+
+        with self._lock:
+            self._version += 1
+            self._snapshot = {
+                "version": self._version,
+                "loaded_at": time.monotonic(),
+                "latitude": latitude[order],
+                "longitude": longitude[order],
+                "pokemon_id": pokemon_id[order],
+                "weather": weather[order],
+                "time_of_day": time_of_day[order],
+                "weather_names": list(weather_codes),
+                "time_names": list(time_codes),
+            }
+        return len(order)
+
+    def _refresh(self):
+        try:
+            rows = self.reload()
+            log_event(logger, logging.INFO, "sighting_columns_reloaded", sightings=rows)
+        except Error as e:
+            # keep serving the previous snapshot
+            log_event(logger, logging.WARNING, "sighting_columns_reload_failed", error=str(e))
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def current(self):
+        """The latest snapshot: loaded by the first caller, refreshed in the background once stale."""
+        with self._lock:
+            snapshot = self._snapshot
+            stale = (snapshot is not None and self.reload_interval
+                     and time.monotonic() - snapshot["loaded_at"] > self.reload_interval)
+            start_refresh = stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        if snapshot is None:
+            self.reload()
+            return self._snapshot
+        if start_refresh:
+            threading.Thread(target=self._refresh, name="sighting-columns-reload", daemon=True).start()
+        return snapshot
+
+
+def _grid_shape(south, north, width, resolution):
+    """(rows, cols) with `resolution` cells along the longer side of the box."""
+    height = north - south
+    if not width and not height:
+        return 1, 1
+    if width >= height:
+        return max(1, round(resolution * height / width)), resolution
+    return resolution, max(1, round(resolution * width / height))
+
+
+def _layer_grids(keys, cells, names, cell_count, shape):
+    """{name: grid} for every value of a code column that has sightings in the box."""
+    grids = np.bincount(keys.astype(np.int64) * cell_count + cells,
+                        minlength=len(names) * cell_count).reshape((len(names),) + shape)
+    return {names[code]: grids[code] for code in range(len(names)) if grids[code].any()}
+
+
+def compute_heatmap(snapshot, south, north, west, east, resolution, weather=None, time_of_day=None,
+                    pokemon_id=None, layer=None, top_species=DEFAULT_TOP_SPECIES, pokemon=None):
+    """Binned counts of the snapshot's sightings inside a lat/lng box.
+
+    west > east means the box crosses the antimeridian. Cells are in
+    row-major order from the south-west corner; the box edges are inclusive.
+    """
+    start = np.searchsorted(snapshot["latitude"], south, side="left")
+    stop = np.searchsorted(snapshot["latitude"], north, side="right")
+    latitude = snapshot["latitude"][start:stop]
+    longitude = snapshot["longitude"][start:stop]
+
+    if west <= east:
+        width = east - west
+        mask = (longitude >= west) & (longitude <= east)
+        offset = longitude - west
+    else:
+        width = east + 360 - west
+        mask = (longitude >= west) | (longitude <= east)
+        offset = np.where(longitude >= west, longitude - west, longitude + 360 - west)
+
+    columns = {"weather": ("weather", "weather_names", weather),
+               "timeOfDay": ("time_of_day", "time_names", time_of_day)}
+    for column, names, value in columns.values():
+        if value:
+            # compared like MySQL's default collation: case-insensitive, trailing spaces ignored
+            value = collation_key(value)
+            codes = [code for code, name in enumerate(snapshot[names])
+                     if name is not None and collation_key(name) == value]
+            mask &= np.isin(snapshot[column][start:stop], codes)
+    if pokemon_id is not None:
+        mask &= snapshot["pokemon_id"][start:stop] == pokemon_id
+
+    rows, cols = _grid_shape(south, north, width, resolution)
+    cell_count = rows * cols
+    # a zero-width or zero-height box is a single column or row
+    x_scale = cols / width if width else 0
+    y_scale = rows / (north - south) if north > south else 0
+    x = np.minimum((offset[mask] * x_scale).astype(np.int64), cols - 1)
+    y = np.minimum(((latitude[mask] - south) * y_scale).astype(np.int64), rows - 1)
+    cells = y * cols + x
+    counts = np.bincount(cells, minlength=cell_count).reshape(rows, cols)
+
+    result = {
+        "bbox": {"south": south, "north": north, "west": west, "east": east},
+        "rows": rows,
+        "cols": cols,
+        "cellDegrees": {"lat": (north - south) / rows, "lng": width / cols},
+        "total": int(counts.sum()),
+        "max": int(counts.max()) if cell_count else 0,
+        "counts": counts.tolist(),
+    }
+
+    if layer in ("weather", "timeOfDay"):
+        column, names, _ = columns[layer]
+        grids = _layer_grids(snapshot[column][start:stop][mask], cells, snapshot[names],
+                             cell_count, (rows, cols))
+        result["layers"] = sorted(
+            ({"key": name or "Unknown", "total": int(grid.sum()), "counts": grid.tolist()}
+             for name, grid in grids.items()),
+            key=lambda l: -l["total"])
+    elif layer == "species":
+        ids = snapshot["pokemon_id"][start:stop][mask]
+        totals = np.bincount(ids) if len(ids) else np.zeros(0, np.int64)
+        top = [int(i) for i in np.argsort(-totals, kind="stable")[:top_species] if totals[i]]
+        result["layers"] = []
+        for species in top:
+            grid = np.bincount(cells[ids == species], minlength=cell_count).reshape(rows, cols)
+            info = (pokemon or {}).get(species)
+            result["layers"].append({
+                "key": info["pokemon_name"] if info else str(species),
+                "pokemonId": species,
+                "total": int(totals[species]),
+                "counts": grid.tolist(),
+            })
+    return result
+
+
+#density heatmap of sightings in a bounding box, optionally split into layers
+@analytics_bp.route("/api/analytics/heatmap", methods=["GET"])
+def get_heatmap():
+    """Query: south, north, west, east, optional resolution, weather, timeOfDay, name,
+    layer (species | weather | timeOfDay), topSpecies."""
+    args = request.args
+    try:
+        south = float(args["south"])
+        north = float(args["north"])
+        west = float(args["west"])
+        east = float(args["east"])
+        resolution = int(args.get("resolution", DEFAULT_RESOLUTION))
+        top_species = int(args.get("topSpecies", DEFAULT_TOP_SPECIES))
+    except (KeyError, ValueError):
+        return jsonify({"message": "south, north, west, east (and an integer resolution) are required"}), 400
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return jsonify({"message": "Invalid bounding box"}), 400
+    if not 1 <= resolution <= MAX_RESOLUTION:
+        return jsonify({"message": f"resolution must be between 1 and {MAX_RESOLUTION}"}), 400
+    layer = args.get("layer") or None
+    if layer is not None and layer not in LAYERS:
+        return jsonify({"message": f"layer must be one of {', '.join(LAYERS)}"}), 400
+    top_species = min(max(top_species, 1), MAX_TOP_SPECIES)
+
+    weather = args.get("weather") or None
+    time_of_day = args.get("timeOfDay") or None
+    name = args.get("name") or None
+    pokemon_id = None
+
+    try:
+        if name:
+            pokemon = pokemon_catalog.by_name(name)
+            # unknown names match nothing, like the search endpoints
+            pokemon_id = pokemon["pokemon_id"] if pokemon else -1
+        species = pokemon_catalog.snapshot() if layer == "species" else None
+        snapshot = sighting_columns.current()
+    except Error as e:
+        log_event(logger, logging.ERROR, "heatmap_failed", error=str(e))
+        return jsonify({"message": "Failed to load sightings", "error": str(e)}), 500
+
+    key = (snapshot["version"], south, north, west, east, resolution, weather, time_of_day,
+           pokemon_id, layer, top_species if layer == "species" else None)
+    body = heatmap_cache.get(key)
+    if body is None:
+        result = compute_heatmap(snapshot, south, north, west, east, resolution, weather=weather,
+                                 time_of_day=time_of_day, pokemon_id=pokemon_id, layer=layer,
+                                 top_species=top_species, pokemon=species)
+        result["snapshot"] = {"sightings": int(len(snapshot["latitude"])),
+                              "ageSeconds": round(time.monotonic() - snapshot["loaded_at"], 1)}
+        body = jsonify(result).get_data()
+        heatmap_cache.set(key, body)
+    return current_app.response_class(body, mimetype="application/json")
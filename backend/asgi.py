@@ -0,0 +1,378 @@
+"""asyncio serving mode (ASGI).
+
+    pip install aiomysql httpx asgiref uvicorn
+    uvicorn asgi:app --host 0.0.0.0 --port 5001
+
+The routes that spend their time waiting on MySQL, Google geocoding or
+Open-Meteo are served by the coroutines below (aiomysql + httpx), so one
+process holds thousands of them in flight instead of one per thread:
+
+    POST /api/get_pokemon_sightings
+    POST /api/get_pokemon
+    POST /api/sightings
+
+Every other route is handed to the Flask app through asgiref's WSGI adapter,
+on a pool of ASGI_WSGI_THREADS threads (default DB_POOL_SIZE), so the API
+surface is the same as `python backend.py`. Request validation,
+SQL and response bodies are shared with (or mirror) the Flask views.
+"""
+import json
+import logging
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from mysql.connector import Error
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+import aio_clients
+import metrics
+import sightings
+from backend import app as flask_app, data_store, db_config, pokemon_catalog, sighting_index
+from logs import get_logger, log_event
+from columnar import COLUMNAR_MIMETYPE, encode_sightings, wants_columnar
+from pagination import STREAM_BATCH_SIZE, paginate_list, parse_page_args, split_page
+from search_queries import (parse_cp_bounds, parse_range, resolve_sightings_search,
+                            sightings_search_sql, species_search_sql, species_rollup_sql)
+from species_rollup import species_names
+
+# the async handlers query MySQL directly through aiomysql
+if data_store.name != "mysql":
+    raise RuntimeError("The asyncio serving mode needs STORAGE_BACKEND=mysql")
+
+wsgi_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ASGI_WSGI_THREADS", os.environ.get("DB_POOL_SIZE", 10))),
+    thread_name_prefix="asgi-wsgi")
+logger = get_logger("asgi")
+
+
+class PooledWsgiInstance(WsgiToAsgiInstance):
+    # asgiref's own run_wsgi_app is thread-sensitive: every request would run,
+    # one at a time, on the same thread
+    _run_wsgi_app = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=wsgi_executor)(body)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi that serves concurrent requests on the threads of wsgi_executor."""
+
+    async def __call__(self, scope, receive, send):
+        await PooledWsgiInstance(self.wsgi_application)(scope, receive, send)
+
+
+flask_asgi = PooledWsgiToAsgi(flask_app)
+
+
+class AsyncRequest:
+    """The parts of an ASGI HTTP request the async handlers need."""
+
+    def __init__(self, scope, body):
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.headers = {k.decode("latin-1").lower(): v.decode("latin-1")
+                        for k, v in scope.get("headers", [])}
+        self.body = body
+
+    def get_json(self):
+        """Parsed JSON body, or None if it is missing or not JSON."""
+        if not self.body:
+            return None
+        try:
+            return json.loads(self.body)
+        except ValueError:
+            return None
+
+    @property
+    def accept_mimetypes(self):
+        return parse_accept_header(self.headers.get("accept"), MIMEAccept)
+
+
+class AsyncResponse:
+    """Status, headers and a body that is either bytes or an async iterator of bytes."""
+
+    def __init__(self, body=b"", status=200, mimetype="application/json", headers=None):
+        self.body = body
+        self.status = status
+        self.headers = {"Content-Type": mimetype}
+        self.headers.update(headers or {})
+
+
+def dumps(obj):
+    return flask_app.json.dumps(obj, separators=(",", ":"))
+
+
+def json_response(obj, status=200):
+    # same serializer (datetimes, Decimals, sort order) and layout as jsonify()
+    return AsyncResponse((dumps(obj) + "\n").encode(), status)
+
+
+def columnar_response(rows, next_cursor=None):
+    headers = {"Vary": "Accept"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return AsyncResponse(encode_sightings(rows), mimetype=COLUMNAR_MIMETYPE, headers=headers)
+
+
+def sightings_list_response(rows, page, columnar):
+    next_cursor = None
+    if page.paginated:
+        rows, next_cursor = paginate_list(rows, page, lambda row: (row["id"],))
+    if columnar:
+        return columnar_response(rows, next_cursor)
+    if page.paginated:
+        return json_response({"items": rows, "nextCursor": next_cursor})
+    return json_response(rows)
+
+
+async def json_array_chunks(batches):
+    """Render row batches as one JSON array, chunk by chunk (like pagination.stream_rows)."""
+    yield b"["
+    first = True
+    async for rows in batches:
+        chunk = ",".join(dumps(row) for row in rows)
+        yield (chunk if first else "," + chunk).encode()
+        first = False
+    yield b"]"
+
+
+async def get_pokemon_sightings(request):
+    data = request.get_json() or {}
+    name = data.get("name")
+    city = data.get("city")
+    range_miles = data.get("range", 5)
+    weather = data.get("weather")
+    minCP = data.get("minCP")
+    maxCP = data.get("maxCP")
+
+    if not name or not city:
+        return json_response({"message": "Pokémon name and city are required"}, 400)
+
+    try:
+        range_miles = parse_range(range_miles)
+        minCP, maxCP = parse_cp_bounds(minCP, maxCP)
+        page = parse_page_args(data, cursor_types=(str,))
+    except ValueError as e:
+        return json_response({"message": str(e)}, 400)
+
+    lat, lng = await aio_clients.geocode_city(city)
+    if lat is None or lng is None:
+        return json_response({"message": "City not found"}, 400)
+
+    columnar = wants_columnar(request)
+
+    try:
+        pokemon = resolve_sightings_search(pokemon_catalog, name, minCP, maxCP)
+    except Error as e:
+        return json_response({"message": "Database query failed", "error": str(e)}, 500)
+
+    if pokemon is None:
+        return sightings_list_response([], page, columnar)
+
+    if sighting_index is not None and sighting_index.loaded:
+        rows = sighting_index.sightings_near(
+            name, lat, lng, range_miles, weather=weather, min_cp=minCP, max_cp=maxCP)
+        return sightings_list_response(rows, page, columnar)
+
+    sql, params = sightings_search_sql(pokemon["pokemon_id"], lat, lng, range_miles, weather, page)
+
+    try:
+        if page.stream and not (columnar or page.paginated):
+            batches = await aio_clients.stream_query(sql, params, STREAM_BATCH_SIZE)
+            return AsyncResponse(json_array_chunks(batches))
+        rows = await aio_clients.fetchall(sql, params)
+    except aio_clients.DB_ERRORS as e:
+        return json_response({"message": "Database query failed", "error": str(e)}, 500)
+
+    next_cursor = None
+    if page.paginated:
+        rows, next_cursor = split_page(rows, page, lambda row: [row["id"]])
+    if columnar:
+        return columnar_response(rows, next_cursor)
+    if page.paginated:
+        return json_response({"items": rows, "nextCursor": next_cursor})
+    return json_response(rows)
+
+
+async def get_attendance(request):
+    data = request.get_json() or {}
+    range = data.get("range")
+    city_name = data.get("city")
+    pokemon_type = data.get("type")
+    pokemon_rarity = data.get("rarity")
+    weather = data.get("weather")
+    minCP = data.get("minCP")
+    maxCP = data.get("maxCP")
+
+    if range is None:
+        return json_response({"message": "range is required"}, 400)
+    try:
+        range = parse_range(range)
+        minCP, maxCP = parse_cp_bounds(minCP, maxCP)
+    except ValueError as e:
+        return json_response({"message": str(e)}, 400)
+
+    lat, lng = await aio_clients.geocode_city(city_name)
+    if not lat or not lng:
+        return json_response({
+            "message": "City not found",
+            "city": city_name
+        }, 400)
+
+    if sighting_index is not None and sighting_index.loaded:
+        return json_response(sighting_index.species_near(
+            lat, lng, range, pokemon_type=pokemon_type, rarity=pokemon_rarity,
+            weather=weather, min_cp=minCP, max_cp=maxCP))
+
+    rollup = data_store.species_rollup and species_rollup_sql(lat, lng, range, weather)
+    if rollup:
+        sql, params = rollup
+    else:
+        sql, params = species_search_sql(lat, lng, range, weather)
+    try:
+        results = species_names(await aio_clients.fetchall(sql, params), lat, lng, range,
+                                pokemon_catalog, pokemon_type, pokemon_rarity, minCP, maxCP)
+    except aio_clients.DB_ERRORS as e:
+        return json_response({
+            "message": "Database connection failed. Check if your MySQL server is running and accessible.",
+            "error": str(e)
+        }, 500)
+    return json_response(results)
+
+
+async def create_sighting(request):
+    data = request.get_json() or {}
+    pokemon_id = data.get("pokemonId")
+    user_id = data.get("userId")
+    longitude = data.get("longitude")
+    latitude = data.get("latitude")
+    notes = data.get("notes", "")
+
+    if not pokemon_id or not user_id or longitude is None or latitude is None:
+        return json_response({"message": "pokemonId, userId, longitude, and latitude are required"}, 400)
+
+    enricher = sightings.weather_enricher
+    weather_data = None if enricher is not None else await aio_clients.fetch_weather_data(latitude, longitude)
+
+    if weather_data:
+        weather = weather_data['weather']
+        temperature = weather_data['temperature']
+        wind_speed = weather_data['windSpeed']
+    else:
+        weather = data.get("weather", "Clear")
+        temperature = data.get("temperature", 70.0)
+        wind_speed = data.get("windSpeed", 5.0)
+
+    appeared_time = sightings.get_time_of_day()
+    sighting_id = str(uuid.uuid4())
+
+    args = (sighting_id, pokemon_id, longitude, latitude, appeared_time,
+            weather, temperature, wind_speed, user_id, notes, 0)
+    try:
+        report_id = await aio_clients.callproc_out('CreateSightingWithReport', args)
+    except aio_clients.DB_ERRORS as e:
+        log_event(logger, logging.ERROR, "create_sighting_failed", error=str(e))
+        return json_response({"message": "Failed to create sighting", "error": str(e)}, 500)
+
+    if sighting_index is not None:
+        sighting_index.add(sighting_id, pokemon_id, latitude, longitude, weather, appeared_time)
+    if enricher is not None:
+        enricher.submit(sighting_id, latitude, longitude)
+
+    return json_response({
+        "message": "Sighting created successfully",
+        "sightingId": sighting_id,
+        "reportId": report_id
+    })
+
+
+ASYNC_ROUTES = {
+    ("POST", "/api/get_pokemon_sightings"): get_pokemon_sightings,
+    ("POST", "/api/get_pokemon"): get_attendance,
+    ("POST", "/api/sightings"): create_sighting,
+}
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+async def _send_response(send, request, response):
+    headers = dict(response.headers)
+    origin = request.headers.get("origin")
+    if origin:
+        # what flask_cors sends for CORS(app) with its defaults
+        headers["Access-Control-Allow-Origin"] = origin
+        headers["Vary"] = ", ".join(filter(None, [headers.get("Vary"), "Origin"]))
+
+    body = response.body
+    if isinstance(body, bytes):
+        headers["Content-Length"] = str(len(body))
+    await send({
+        "type": "http.response.start",
+        "status": response.status,
+        "headers": [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()],
+    })
+    if isinstance(body, bytes):
+        await send({"type": "http.response.body", "body": body})
+        return
+    try:
+        async for chunk in body:
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+    finally:
+        await body.aclose()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await aio_clients.start_clients(db_config)
+            except Exception as e:
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aio_clients.close_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await _lifespan(receive, send)
+
+    handler = None
+    if scope["type"] == "http":
+        handler = ASYNC_ROUTES.get((scope["method"], scope["path"]))
+    if handler is None:
+        return await flask_asgi(scope, receive, send)
+
+    body = await _read_body(receive)
+    if body is None:
+        return
+    request = AsyncRequest(scope, body)
+    token = metrics.start_request(request.path)
+    response = None
+    try:
+        response = await handler(request)
+    except Exception as e:
+        log_event(logger, logging.ERROR, "unhandled_error", path=request.path, error=str(e), exc_info=True)
+        response = AsyncResponse(b"Internal Server Error", 500, mimetype="text/plain")
+    finally:
+        metrics.finish_request(token, request.method, request.path,
+                               response.status if response is not None else 500)
+    await _send_response(send, request, response)
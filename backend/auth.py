@@ -0,0 +1,166 @@
+"""Session tokens and the cached identity store used for authorization.
+
+/api/login issues a signed session token (itsdangerous, keyed by
+SESSION_SECRET_KEY, valid for SESSION_MAX_AGE seconds). Endpoints that act
+for a user call authenticate(); the caller sends the token as
+`Authorization: Bearer <token>`.
+
+The token only carries the userId. The role and organization come from an
+in-process LRU/TTL cache of User rows, so authorization checks don't hit
+the database per request. Writes to a user's role or organization call
+invalidate_identity(). That also bumps the "users" generation in
+response_cache, so other worker processes drop their copies too.
+
+Until every client sends tokens, a request without one may still name its
+user with a userId field. REQUIRE_SESSION_TOKEN=1 turns that off.
+"""
+import logging
+import os
+import secrets
+
+from flask import jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+
+from cache import TTLCache
+from logs import get_logger, log_event
+from response_cache import response_cache
+
+logger = get_logger(__name__)
+
+SESSION_MAX_AGE = int(os.environ.get("SESSION_MAX_AGE", 7 * 24 * 3600))
+REQUIRE_SESSION_TOKEN = os.environ.get("REQUIRE_SESSION_TOKEN") == "1"
+IDENTITY_NAMESPACE = "users"
+
+get_connection = None
+identity_store = None
+serializer = None
+
+
+class IdentityStore:
+    """userId -> {"userId", "role", "organizationName"}, cached per process.
+
+    Entries remember the `generations` token they were read under and are
+    re-read once it changes, i.e. after invalidate() in any process.
+    Unknown users aren't cached.
+    """
+
+    def __init__(self, get_connection, maxsize=4096, ttl=300.0, generations=response_cache):
+        self.get_connection = get_connection
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generations = generations
+
+    def _key(self, user_id):
+        # userId compares case-insensitively in MySQL's default collation
+        return str(user_id).lower()
+
+    def get(self, user_id):
+        generation = self.generations.generation(IDENTITY_NAMESPACE)
+        entry = self.cache.get(self._key(user_id))
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT userId, role, organizationName FROM User WHERE userId = %s",
+                           (user_id,))
+            identity = cursor.fetchone()
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+        if identity is not None:
+            self.put(identity, generation)
+        return identity
+
+    def put(self, identity, generation=None):
+        if generation is None:
+            generation = self.generations.generation(IDENTITY_NAMESPACE)
+        self.cache.set(self._key(identity["userId"]), (generation, identity))
+
+    def invalidate(self, user_id=None):
+        """Forget one user (or everyone), here and in the other workers."""
+        if user_id is None:
+            self.cache.clear()
+        else:
+            self.cache.delete(self._key(user_id))
+        self.generations.invalidate(IDENTITY_NAMESPACE)
+
+
+def init_auth(connection_func):
+    global get_connection, identity_store, serializer
+    get_connection = connection_func
+    identity_store = IdentityStore(
+        connection_func,
+        maxsize=int(os.environ.get("IDENTITY_CACHE_SIZE", 4096)),
+        ttl=float(os.environ.get("IDENTITY_CACHE_TTL", 300)),
+    )
+    secret = os.environ.get("SESSION_SECRET_KEY")
+    if not secret:
+        # tokens then die with the process; fine for development, not for several hosts
+        secret = secrets.token_hex(32)
+        log_event(logger, logging.WARNING, "session_secret_generated")
+    serializer = URLSafeTimedSerializer(secret, salt="pokesight-session")
+
+
+def issue_token(user_id):
+    return serializer.dumps({"userId": user_id})
+
+
+def invalidate_identity(user_id=None):
+    """Call after changing a user's role or organization (None: any number of users)."""
+    identity_store.invalidate(user_id)
+
+
+def _bearer_token():
+    header = request.headers.get("Authorization", "")
+    scheme, _, token = header.partition(" ")
+    return token.strip() if scheme.lower() == "bearer" and token.strip() else None
+
+
+def authenticate(claimed_user_id=None, not_found="User not found", require_token=False):
+    """(identity, None) for the caller of this request, or (None, error response).
+
+    With a session token, claimed_user_id (the request's userId, if any)
+    must be the token's user. Without one, claimed_user_id is trusted
+    unless REQUIRE_SESSION_TOKEN or require_token is set. Raises
+    mysql.connector.Error if the user has to be read and the database fails.
+    """
+    token = _bearer_token()
+    if token is not None:
+        try:
+            user_id = serializer.loads(token, max_age=SESSION_MAX_AGE)["userId"]
+        except SignatureExpired:
+            return None, (jsonify({"message": "Session expired, please log in again"}), 401)
+        except (BadSignature, KeyError, TypeError):
+            return None, (jsonify({"message": "Invalid session token"}), 401)
+        if claimed_user_id and str(claimed_user_id).lower() != str(user_id).lower():
+            return None, (jsonify({"message": "userId does not match the session"}), 403)
+    elif REQUIRE_SESSION_TOKEN or require_token:
+        return None, (jsonify({"message": "A session token is required"}), 401)
+    elif not claimed_user_id:
+        return None, (jsonify({"message": "userId is required"}), 400)
+    else:
+        user_id = claimed_user_id
+
+    identity = identity_store.get(user_id)
+    if identity is None:
+        return None, (jsonify({"message": not_found}), 401 if token is not None else 404)
+    return identity, None
+
+
+def authenticate_admin(forbidden="Admins only"):
+    """Like authenticate(), but always requires a session token and the admin role.
+
+    For operational endpoints: a bare userId is never accepted here, even
+    while REQUIRE_SESSION_TOKEN is off.
+    """
+    user, error = authenticate(require_token=True)
+    if error:
+        return None, error
+    if user.get("role") != "admin":
+        return None, (jsonify({"message": forbidden}), 403)
+    return user, None
@@ -1,5 +1,6 @@
 # server.py (Flask version)
 
+import logging
 import os
 from dotenv import load_dotenv
 from pprint import pprint
@@ -15,7 +16,21 @@ from flask import Flask, request, jsonify, render_template, redirect, url_for
 from flask_cors import CORS
 import mysql.connector
 from mysql.connector import Error
-from longlatgetter import geocode_city
+from longlatgetter import geocode_city, reset_gmaps_client, geocode_memory_cache, geocode_disk_cache
+from storage import storage_from_env
+from search_queries import (parse_cp_bounds, parse_range, resolve_sightings_search,
+                            sightings_search_sql, species_search_sql, species_rollup_sql)
+from species_rollup import species_names
+from sighting_index import SightingIndex
+from pokemon_catalog import PokemonCatalog
+from pagination import parse_page_args, page_response, paginate_list, split_page, stream_rows
+from columnar import wants_columnar, columnar_response
+from response_cache import response_cache
+from cache import ChangeLog
+import auth
+from logs import get_logger, log_event
+import metrics
+from slow_queries import slow_query_log
 import hashlib
 
 app = Flask(
@@ -27,30 +42,119 @@ app = Flask(
 # Enable CORS for frontend to make requests
 CORS(app)
 
+logger = get_logger("backend")
+# per-route latency + db/geocode/weather/json timers, served at /metrics
+metrics.instrument_app(app)
+
+# MYSQL_* env vars (the same ones load_datasets.py uses) override the defaults
 db_config = {
-    'host': '-',
-    'user':'-',
-    'password': '-', #CHANGE THIS PASSWORD
-    'database': '-',
-    'ssl_disabled': False,  # Enable SSL
+    'host': os.environ.get('MYSQL_HOST', '-'),
+    'port': int(os.environ.get('MYSQL_PORT', 3306)),
+    'user': os.environ.get('MYSQL_USER', '-'),
+    'password': os.environ.get('MYSQL_PASSWORD', '-'), #CHANGE THIS PASSWORD
+    'database': os.environ.get('MYSQL_DATABASE', '-'),
+    'ssl_disabled': os.environ.get('MYSQL_SSL_DISABLED') == '1',  # SSL on unless disabled (local MySQL)
     'ssl_verify_cert': False  # Don't verify server certificate (Cloud SQL handles this)
 }
 
 
+# STORAGE_BACKEND=mysql (default) or sqlite; either way one pool shared by every
+# blueprint, sized by the DB_POOL_* env vars
+data_store = storage_from_env(db_config)
+db_pool = data_store.pool
+
+# set by gunicorn.conf.py: the app is imported once in the master and forked,
+# so per-process resources are set up in after_fork() instead
+PREFORK = os.environ.get("POKESIGHT_PREFORK") == "1"
+
+
 def get_connection():
-    """Create a new DB connection."""
-    return mysql.connector.connect(**db_config)
+    """Check a DB connection out of the shared pool (close() returns it)."""
+    return db_pool.get_connection()
+
+# under prefork every worker holds its own catalog and sighting index; a catalog
+# reload in one worker bumps a response_cache generation that makes the others reload
+shared_generations = response_cache if PREFORK else None
+SIGHTING_CHANGE_LOG_PATH = os.environ.get(
+    "SIGHTING_CHANGE_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "sighting_changes.sqlite3"),
+)
+
+# Pokemon + StatsCP kept in memory; POKEMON_CATALOG_RELOAD_SECONDS > 0 refreshes it periodically
+pokemon_catalog = PokemonCatalog(
+    get_connection, reload_interval=float(os.environ.get("POKEMON_CATALOG_RELOAD_SECONDS", 0)),
+    generations=shared_generations)
+
+def load_pokemon_catalog():
+    try:
+        log_event(logger, logging.INFO, "pokemon_catalog_loaded", pokemon=pokemon_catalog.reload())
+    except Error as e:
+        # retried lazily on first use
+        log_event(logger, logging.WARNING, "pokemon_catalog_load_failed", error=str(e))
+
+load_pokemon_catalog()
+
+def load_sighting_index():
+    """Bulk-load the in-memory sighting index (SIGHTING_INDEX=1), or None."""
+    if os.environ.get("SIGHTING_INDEX", "0") != "1":
+        return None
+    changes = None
+    if PREFORK:
+        # each worker replays the others' writes from this log (sighting_index.py)
+        changes = ChangeLog(SIGHTING_CHANGE_LOG_PATH, table="sighting_changes",
+                            retention=float(os.environ.get("SIGHTING_CHANGE_LOG_RETENTION", 3600)))
+    index = SightingIndex(
+        pokemon_catalog, cell_degrees=float(os.environ.get("SIGHTING_INDEX_CELL_DEGREES", 0.05)),
+        get_connection=get_connection, changes=changes,
+        min_reload_interval=float(os.environ.get("SIGHTING_INDEX_MIN_RELOAD_SECONDS", 30)))
+    conn = None
+    try:
+        conn = get_connection()
+        index.load(conn)
+        log_event(logger, logging.INFO, "sighting_index_loaded", sightings=len(index))
+    except Error as e:
+        # searches fall back to MySQL until the next restart
+        log_event(logger, logging.WARNING, "sighting_index_load_failed", error=str(e))
+    finally:
+        if conn:
+            conn.close()
+    return index
+
+sighting_index = load_sighting_index()
+
+# signed session tokens + the cached identity store (auth.py)
+auth.init_auth(get_connection)
 
 register_organization_routes(app, get_connection)
 
-from sightings import sightings_bp, init_sightings
-init_sightings(get_connection)
+from sightings import sightings_bp, init_sightings, weather_cache, weather_disk_cache
+init_sightings(get_connection, data_store, sighting_index)
 app.register_blueprint(sightings_bp)
 
-from events import events_bp, init_events
-init_events(get_connection)
+from events import events_bp, init_events, start_background_jobs
+init_events(get_connection, start_jobs=not PREFORK)
 app.register_blueprint(events_bp)
 
+from analytics import analytics_bp, init_analytics, heatmap_cache
+init_analytics(get_connection, pokemon_catalog)
+app.register_blueprint(analytics_bp)
+
+
+def after_fork():
+    """Per-worker setup after a prefork server forks the preloaded app.
+
+    The Pokémon catalog and sighting index loaded by the master are inherited
+    copy-on-write; the catalog reloads once it goes stale and the index
+    replays the writes since the fork from its change log. DB connections
+    and HTTP clients are not shared.
+    """
+    db_pool.reset_after_fork()
+    reset_gmaps_client()
+    start_background_jobs()
+    # samples recorded while preloading belong to the master; workers merge theirs for /metrics
+    metrics.registry.reset()
+    metrics.enable_shared()
+
 @app.route("/api/test", methods=["GET"])
 def test_connection():
     """Test endpoint to verify database connection"""
@@ -72,6 +176,75 @@ def test_connection():
             "message": str(e)
         }), 500
 
+@app.route("/api/pool/stats", methods=["GET"])
+def pool_stats():
+    """Connection pool counters: checkout latency, saturation, recycled connections"""
+    return jsonify(db_pool.stats())
+
+def pool_metrics():
+    stats = db_pool.stats()
+    for state in ("idle", "in_use"):
+        yield ("db_pool_connections", "gauge", "Pooled MySQL connections by state",
+               {"state": state}, stats[state])
+    yield ("db_pool_waiting", "gauge", "Requests waiting for a pooled connection", {}, stats["waiting"])
+    yield ("db_pool_checkouts_total", "counter",
+           "Connection checkouts, by whether an idle connection was reused",
+           {"connection": "reused"}, stats["checkouts"] - stats["connections_created"])
+    yield ("db_pool_checkouts_total", "counter",
+           "Connection checkouts, by whether an idle connection was reused",
+           {"connection": "new"}, stats["connections_created"])
+    yield ("db_pool_checkout_wait_seconds_total", "counter", "Time spent waiting for a connection",
+           {}, stats["checkout_time_ms_total"] / 1000)
+    for result in ("prepared", "reused"):
+        yield ("db_pool_prepared_statements_total", "counter",
+               "Prepared-statement executions, by whether the statement was already prepared",
+               {"result": result}, stats[f"statements_{result}"])
+    for event in ("timeouts", "rejected", "recycled_after_error", "failed_health_checks"):
+        yield ("db_pool_events_total", "counter", "Pool timeouts, rejections and recycled connections",
+               {"event": event}, stats[event])
+
+def cache_metrics():
+    caches = (
+        ("geocode", "memory", geocode_memory_cache),
+        ("geocode", "disk", geocode_disk_cache),
+        ("weather", "memory", weather_cache),
+        ("weather", "disk", weather_disk_cache),
+        ("response", "combined", response_cache),
+        ("identity", "memory", auth.identity_store.cache),
+        ("heatmap", "memory", heatmap_cache),
+    )
+    for name, tier, cache in caches:
+        for result, value in (("hit", cache.hits), ("miss", cache.misses)):
+            yield ("cache_requests_total", "counter", "Cache lookups by cache, tier and result",
+                   {"cache": name, "tier": tier, "result": result}, value)
+
+metrics.registry.register_collector(pool_metrics)
+metrics.registry.register_collector(cache_metrics)
+metrics.registry.describe_ratio("db_pool_reuse_ratio", "Share of checkouts served by an idle pooled connection",
+                                "db_pool_checkouts_total", "reused", "new", label="connection")
+metrics.registry.describe_ratio("cache_hit_ratio", "Cache hit ratio by cache and tier",
+                                "cache_requests_total", "hit", "miss")
+
+@app.route("/api/admin/slow-queries", methods=["GET", "DELETE"])
+def slow_queries():
+    """Recent statements over SLOW_QUERY_THRESHOLD_MS, with per-shape totals and EXPLAIN plans (admins only)"""
+    try:
+        _, error = auth.authenticate_admin("Only admins can read the slow query log")
+    except Error as e:
+        return jsonify({"message": "Database query failed", "error": str(e)}), 500
+    if error:
+        return error
+
+    if request.method == "DELETE":
+        slow_query_log.clear()
+        return jsonify({"message": "Slow query log cleared"})
+    return jsonify(slow_query_log.report())
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus text exposition of the request, dependency, pool and cache metrics"""
+    return app.response_class(metrics.registry.render(), content_type=metrics.PROMETHEUS_MIMETYPE)
+
 import hashlib
 def get_hashed_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -86,6 +259,8 @@ def register():
     if not username or not password:
         return jsonify({"message": "Username and password are required"}), 400
     
+    conn = None
+    cursor = None
     try:
         conn = get_connection()
         cursor = conn.cursor(dictionary=True)
@@ -99,14 +274,31 @@ def register():
         organizationName = "default"
         cursor.execute("INSERT INTO User (userId, password, role, organizationName) VALUES (%s, %s, %s, %s)", (username, hashed_password, role, organizationName))
         conn.commit()
-        cursor.close()
-        conn.close()
+        # new member of the default organization
+        response_cache.invalidate("organizations")
         return jsonify({"message": "Registration successful"})
     except Error as e:
         return jsonify({
             "status": "error",
             "message": str(e)
         }), 500
+    finally:
+        # pooled connections must always go back, including the early returns
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def sightings_list_response(sightings, page, columnar):
+    """Render an in-memory sighting list as JSON, a page, or the columnar format."""
+    next_cursor = None
+    if page.paginated:
+        sightings, next_cursor = paginate_list(sightings, page, lambda row: (row["id"],))
+    if columnar:
+        return columnar_response(sightings, next_cursor)
+    if page.paginated:
+        return jsonify({"items": sightings, "nextCursor": next_cursor})
+    return jsonify(sightings)
 
 @app.route("/api/get_pokemon_sightings", methods=["POST"])
 def get_pokemon_sightings():
@@ -121,51 +313,53 @@ def get_pokemon_sightings():
     if not name or not city:
         return jsonify({"message": "Pokémon name and city are required"}), 400
 
+    try:
+        range_miles = parse_range(range_miles)
+        minCP, maxCP = parse_cp_bounds(minCP, maxCP)
+        page = parse_page_args(data, cursor_types=(str,))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     lat, lng = geocode_city(city)
     if lat is None or lng is None:
         return jsonify({"message": "City not found"}), 400
 
-    base_where = """
-        (ST_Distance_Sphere(
-            POINT(%s, %s),
-            POINT(s.longitude, s.latitude)
-        ) / 1609.34) <= %s
-    """
-    params = [lng, lat, range_miles]
-
-    filters = []
+    # Accept: application/vnd.pokesight.sightings+columnar gets the packed format
+    columnar = wants_columnar(request)
 
-    if weather:
-        filters.append("s.weather = %s")
-        params.append(weather)
-
-    if minCP:
-        filters.append("scp.max_cp >= %s")
-        params.append(minCP)
+    try:
+        pokemon = resolve_sightings_search(pokemon_catalog, name, minCP, maxCP)
+    except Error as e:
+        return jsonify({"message": "Database query failed", "error": str(e)}), 500
 
-    if maxCP:
-        filters.append("scp.max_cp <= %s")
-        params.append(maxCP)
+    if pokemon is None:
+        return sightings_list_response([], page, columnar)
 
-    where_clause = base_where
-    if filters:
-        where_clause += " AND " + " AND ".join(filters)
+    if sighting_index is not None and sighting_index.loaded:
+        sightings = sighting_index.sightings_near(
+            name, lat, lng, range_miles, weather=weather, min_cp=minCP, max_cp=maxCP)
+        return sightings_list_response(sightings, page, columnar)
 
-    sql = f"""
-        SELECT s.sightingId as id, s.latitude, s.longitude, s.weather, s.appearedTimeOfDay
-        FROM Pokemon p
-        NATURAL JOIN StatsCP scp 
-        JOIN Sighting s ON p.pokemon_id = s.pokemon_id
-        WHERE p.pokemon_name = %s AND {where_clause}
-    """
-    params = [name] + params  # name goes first
+    sql, params = sightings_search_sql(pokemon["pokemon_id"], lat, lng, range_miles, weather, page,
+                                       where_in_range=data_store.radius_where)
 
     conn = None
     cursor = None
     try:
         conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
+        cursor = conn.cursor(dictionary=True, prepared=True)
         cursor.execute(sql, params)
+        if columnar:
+            sightings, next_cursor = cursor.fetchall(), None
+            if page.paginated:
+                sightings, next_cursor = split_page(sightings, page, lambda row: [row["id"]])
+            return columnar_response(sightings, next_cursor)
+        if page.paginated:
+            return page_response(cursor.fetchall(), page, lambda row: [row["id"]])
+        if page.stream:
+            response = stream_rows(conn, cursor)
+            conn = cursor = None  # closed by the stream when it finishes
+            return response
         sightings = cursor.fetchall()
         return jsonify(sightings)
     except Error as e:
@@ -184,39 +378,39 @@ def get_pokemon_details():
         return jsonify({"message": "Pokémon name is required"}), 400
 
     pokemon_name = data["name"]
-    
-    print("Connecting to database...")
-    conn = get_connection()
-    print("Connected! Creating cursor...")
-    cursor = conn.cursor(dictionary=True)
+
+    # served from the in-memory catalog; unchanged details answer 304 via ETag
     try:
-        sql = """
-            SELECT *
-            FROM Pokemon p NATURAL JOIN StatsCP scp
-            WHERE p.pokemon_name = %s
-            LIMIT 1
-        """
-        cursor.execute(sql, (pokemon_name,))
-        print("Query executed! Fetching results...")
-        pokemon = cursor.fetchone()
-
-        if not pokemon:
-            return jsonify({"message": f"No Pokémon found with name {pokemon_name}"}), 404
-
-        # Optionally format the response
-        response = {
-            "name": pokemon["pokemon_name"],
-            "type": pokemon.get("type", "").split(",") if pokemon.get("type") else [],
-            "rarity": pokemon.get("rarity", ""),
-            "baseAttack": pokemon.get("base_attack", 0),
-            "baseDefense": pokemon.get("base_defense", 0),
-            "baseStamina": pokemon.get("base_stamina", 0),
-            "maxCP": pokemon.get("max_cp", 0)
-        }
-
-        return jsonify(response)
-    finally:
-        cursor.close()
+        details = pokemon_catalog.details(pokemon_name)
+    except Error as e:
+        return jsonify({"message": "Database query failed", "error": str(e)}), 500
+
+    if not details:
+        return jsonify({"message": f"No Pokémon found with name {pokemon_name}"}), 404
+
+    response, etag = details
+    # this is a POST, which make_conditional() won't answer with 304, so check by hand
+    if request.if_none_match.contains(etag):
+        resp = app.response_class(status=304)
+    else:
+        resp = jsonify(response)
+    resp.set_etag(etag)
+    return resp
+
+
+@app.route("/api/pokemon/catalog/reload", methods=["POST"])
+def reload_pokemon_catalog():
+    """Reload the in-memory Pokémon catalog after Pokemon/StatsCP changes (admins only)"""
+    try:
+        _, error = auth.authenticate_admin("Only admins can reload the Pokemon catalog")
+        if error:
+            return error
+        # the other workers reload on their next lookup
+        pokemon_catalog.invalidate()
+        count = pokemon_catalog.reload()
+    except Error as e:
+        return jsonify({"message": "Failed to reload Pokemon catalog", "error": str(e)}), 500
+    return jsonify({"message": "Pokemon catalog reloaded", "pokemonCount": count})
 
 
 @app.route("/api/get_pokemon", methods=["POST"])
@@ -230,11 +424,15 @@ def get_attendance():
     minCP = data.get("minCP")
     maxCP = data.get("maxCP")
 
-    print(f"Received request: city={city_name}, range={range}, type={pokemon_type}, rarity={pokemon_rarity}, weather={weather}, minCP={minCP}, maxCP={maxCP}")
-    
+    if range is None:
+        return jsonify({"message": "range is required"}), 400
+    try:
+        range = parse_range(range)
+        minCP, maxCP = parse_cp_bounds(minCP, maxCP)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
     lat, lng = geocode_city(city_name)
-    
-    print(f"Geocoded: lat={lat}, lng={lng}")
 
     if not lat or not lng:
         return jsonify({
@@ -242,83 +440,34 @@ def get_attendance():
             "city": city_name
         }), 400
 
-    base_where = """
-    (
-        ST_Distance_Sphere(
-            POINT(%s, %s),
-            POINT(s.longitude, s.latitude)
-        ) / 1609.34
-    ) <= %s
-    """
+    if sighting_index is not None and sighting_index.loaded:
+        return jsonify(sighting_index.species_near(
+            lat, lng, range, pokemon_type=pokemon_type, rarity=pokemon_rarity,
+            weather=weather, min_cp=minCP, max_cp=maxCP))
 
-    params = [lng, lat, range]
-
-    filters = []
-
-    # Optional filters
-    if pokemon_type:
-        filters.append("p.type = %s")
-        params.append(pokemon_type)
-
-    if pokemon_rarity:
-        filters.append("p.rarity = %s")
-        params.append(pokemon_rarity)
-
-    if weather:
-        filters.append("s.weather = %s")
-        params.append(weather)
-
-    if minCP:
-        filters.append("scp.max_cp >= %s")
-        params.append(minCP)
-
-    if maxCP:
-        filters.append("scp.max_cp <= %s")
-        params.append(maxCP)
-
-    where_clause = base_where
-    if filters:
-        where_clause += " AND " + " AND ".join(filters)
-
-    if not (minCP or maxCP):
-        sql = f"""
-                SELECT DISTINCT p.pokemon_name
-                FROM Pokemon p 
-                JOIN Sighting s ON p.pokemon_id = s.pokemon_id
-                WHERE {where_clause}
-                ORDER BY p.pokemon_name;
-                """
+    # per-cell rollup instead of the raw sightings where available (species_rollup.py)
+    rollup = data_store.species_rollup and species_rollup_sql(lat, lng, range, weather)
+    if rollup:
+        sql, params = rollup
     else:
-        sql = f"""
-                SELECT DISTINCT p.pokemon_name
-                FROM Pokemon p
-                NATURAL JOIN StatsCP scp 
-                JOIN Sighting s ON p.pokemon_id = s.pokemon_id
-                WHERE {where_clause}
-                ORDER BY p.pokemon_name;
-                """
-
-    print("sql: ", sql)
-    print("filters: ", filters)
-    print("params: ", params)
+        sql, params = species_search_sql(lat, lng, range, weather, where_in_range=data_store.radius_where)
 
     conn = None
     cursor = None
     try:
-        print("Connecting to database...")
         conn = get_connection()
-        print("Connected! Creating cursor...")
-        cursor = conn.cursor(dictionary=True)
-        print(f"Executing query with params: lng={lng}, lat={lat}, range={range}, type={pokemon_type}, rarity={pokemon_rarity}, weather={weather}, minCP={minCP}, maxCP={maxCP}")
+        # the rollup statement changes with its cell cover, so it isn't kept prepared
+        cursor = conn.cursor(dictionary=True, prepared=not rollup)
         cursor.execute(sql, params)
-        print("Query executed! Fetching results...")
-        results = cursor.fetchall()
-        print(f"Found {len(results)} Pokemon")
-        print(f"Results: {results}")
+        results = species_names(cursor.fetchall(), lat, lng, range, pokemon_catalog, pokemon_type,
+                                pokemon_rarity, minCP, maxCP)
+        # sampled (LOG_DEBUG_SAMPLE_RATE); shapes and counts only, never the rows
+        log_event(logger, logging.DEBUG, "species_search", city=city_name, range=range,
+                  type=pokemon_type, rarity=pokemon_rarity, weather=weather,
+                  minCP=minCP, maxCP=maxCP, lat=lat, lng=lng, rows=len(results))
     except Error as e:
-        print("Error fetching pokemon data:", e)
-        import traceback
-        traceback.print_exc()
+        log_event(logger, logging.ERROR, "species_search_failed", city=city_name,
+                  error=str(e), exc_info=True)
         return jsonify({
             "message": "Database connection failed. Check if your MySQL server is running and accessible.",
             "error": str(e)
@@ -340,7 +489,8 @@ def login():
 
     hashed_password = get_hashed_password(password)
 
-    sql = "SELECT * FROM User WHERE userId = %s AND password = %s"
+    # never the password hash
+    sql = "SELECT userId, role, organizationName FROM User WHERE userId = %s AND password = %s"
 
     conn = None
     cursor = None
@@ -351,9 +501,13 @@ def login():
         user = cursor.fetchone()
         
         if user:
+            # the identity checks that follow the login start warm
+            auth.identity_store.put(user)
             return jsonify({
                 "message": "Login successful",
-                "user": user
+                "user": user,
+                "token": auth.issue_token(user["userId"]),
+                "expiresIn": auth.SESSION_MAX_AGE
             })
         else:
             return jsonify({
@@ -0,0 +1,370 @@
+"""Synthetic, reproducible dataset for benchmarking the API (see benchmark.py).
+
+    python bench_data.py --scale 10k --create-schema   # empty local database
+    python bench_data.py --scale 1m
+    python bench_data.py --scale 10m --seed 7
+
+Sightings are clustered around real cities, weighted by population, with a
+gaussian spread that grows with the city; about 5% are scattered uniformly.
+Species follow their rarity (Common species are seen far more often than
+Legendary ones). Users, organizations, events with participants, and
+reports for a share of the sightings are generated alongside, so every
+route the benchmark drives has realistic data behind it.
+
+The same --seed and --scale always produce the same rows, and every id is
+deterministic, so re-running a load is harmless (INSERT IGNORE). All
+synthetic users (bench-user-N) have the password "bench".
+--create-schema creates the tables, indexes, stored procedures
+(procedures.txt) and rollup triggers (species_rollup.txt) first. Connection settings come from MYSQL_HOST /
+MYSQL_USER / MYSQL_PASSWORD / MYSQL_DATABASE, as for load_datasets.py.
+"""
+import argparse
+import hashlib
+import math
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+import mysql.connector
+
+from bulk_sql import insert_many, chunked
+from load_datasets import LOCATION_COLUMNS, POKEMON_COLUMNS, SIGHTING_COLUMNS, STATSCP_COLUMNS
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000}
+
+# (name, latitude, longitude, population in millions, closeToWater)
+CITIES = [
+    ("New York", 40.7128, -74.0060, 8.3, True),
+    ("Los Angeles", 34.0522, -118.2437, 3.9, True),
+    ("Chicago", 41.8781, -87.6298, 2.7, True),
+    ("Houston", 29.7604, -95.3698, 2.3, False),
+    ("Phoenix", 33.4484, -112.0740, 1.6, False),
+    ("Philadelphia", 39.9526, -75.1652, 1.6, True),
+    ("San Antonio", 29.4241, -98.4936, 1.5, False),
+    ("San Diego", 32.7157, -117.1611, 1.4, True),
+    ("Dallas", 32.7767, -96.7970, 1.3, False),
+    ("San Jose", 37.3382, -121.8863, 1.0, False),
+    ("Austin", 30.2672, -97.7431, 1.0, False),
+    ("Jacksonville", 30.3322, -81.6557, 0.95, True),
+    ("Fort Worth", 32.7555, -97.3308, 0.93, False),
+    ("Columbus", 39.9612, -82.9988, 0.9, False),
+    ("Charlotte", 35.2271, -80.8431, 0.88, False),
+    ("San Francisco", 37.7749, -122.4194, 0.8, True),
+    ("Indianapolis", 39.7684, -86.1581, 0.88, False),
+    ("Seattle", 47.6062, -122.3321, 0.74, True),
+    ("Denver", 39.7392, -104.9903, 0.72, False),
+    ("Boston", 42.3601, -71.0589, 0.68, True),
+    ("Nashville", 36.1627, -86.7816, 0.69, False),
+    ("Detroit", 42.3314, -83.0458, 0.64, True),
+    ("Portland", 45.5152, -122.6784, 0.65, True),
+    ("Las Vegas", 36.1699, -115.1398, 0.65, False),
+    ("Miami", 25.7617, -80.1918, 0.45, True),
+    ("Atlanta", 33.7490, -84.3880, 0.5, False),
+    ("Minneapolis", 44.9778, -93.2650, 0.43, True),
+    ("Champaign", 40.1164, -88.2434, 0.09, False),
+    ("Urbana", 40.1106, -88.2073, 0.04, False),
+    ("Springfield", 39.7817, -89.6501, 0.11, False),
+]
+
+BACKGROUND_SHARE = 0.05
+
+TYPES = ["Normal", "Fire", "Water", "Electric", "Grass", "Ice", "Fighting", "Poison", "Ground",
+         "Flying", "Psychic", "Bug", "Rock", "Ghost", "Dragon", "Dark", "Steel", "Fairy"]
+# rarity -> (share of species, relative sighting frequency of each species)
+RARITIES = {"Common": (0.55, 1.0), "Uncommon": (0.25, 0.35), "Rare": (0.13, 0.08),
+            "Legendary": (0.05, 0.01), "Mythical": (0.02, 0.003)}
+WEATHERS = ["Clear", "Clouds", "Rain", "Fog", "Drizzle", "Snow", "Thunderstorm"]
+WEATHER_WEIGHTS = [45, 25, 14, 5, 5, 4, 2]
+TIMES_OF_DAY = ["morning", "afternoon", "evening", "night"]
+
+SPECIES = 151
+EPOCH = datetime(2025, 9, 1)
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS StatsCP (
+        base_attack INT NOT NULL, base_defense INT NOT NULL, base_stamina INT NOT NULL,
+        max_cp INT NOT NULL,
+        PRIMARY KEY (base_attack, base_defense, base_stamina))""",
+    """CREATE TABLE IF NOT EXISTS Pokemon (
+        pokemon_id INT PRIMARY KEY, pokemon_name VARCHAR(255) NOT NULL,
+        base_attack INT, base_defense INT, base_stamina INT,
+        type VARCHAR(255), rarity VARCHAR(50),
+        INDEX pokemon_name_index (pokemon_name))""",
+    """CREATE TABLE IF NOT EXISTS Location (
+        longitude DECIMAL(10,6) NOT NULL, latitude DECIMAL(10,6) NOT NULL,
+        city VARCHAR(255), population_density DOUBLE, closeToWater BOOLEAN,
+        PRIMARY KEY (longitude, latitude))""",
+    """CREATE TABLE IF NOT EXISTS Sighting (
+        sightingId VARCHAR(255) PRIMARY KEY, pokemon_id INT NOT NULL,
+        longitude DECIMAL(10,6) NOT NULL, latitude DECIMAL(10,6) NOT NULL,
+        appearedTimeOfDay VARCHAR(50), weather VARCHAR(50),
+        temperature DECIMAL(5,2), windSpeed DECIMAL(5,2),
+        INDEX sighting_pokemon_index (pokemon_id),
+        INDEX sighting_lat_lng_index (latitude, longitude))""",
+    """CREATE TABLE IF NOT EXISTS Organizations (
+        organizationName VARCHAR(255) PRIMARY KEY)""",
+    """CREATE TABLE IF NOT EXISTS User (
+        userId VARCHAR(255) PRIMARY KEY, password VARCHAR(255) NOT NULL,
+        role VARCHAR(50), organizationName VARCHAR(255),
+        INDEX user_organization_index (organizationName))""",
+    """CREATE TABLE IF NOT EXISTS Events (
+        eventId INT PRIMARY KEY, eventName VARCHAR(255), description TEXT,
+        location VARCHAR(255), time DATETIME, participantCount INT NOT NULL DEFAULT 0,
+        organizationName VARCHAR(255),
+        INDEX events_time_index (time, eventId))""",
+    """CREATE TABLE IF NOT EXISTS Reports (
+        reportId INT AUTO_INCREMENT PRIMARY KEY, sightingId VARCHAR(255),
+        userId VARCHAR(255), eventId INT, status VARCHAR(50), notes TEXT, time DATETIME,
+        INDEX reports_sighting_index (sightingId),
+        INDEX reports_user_index (userId),
+        INDEX reports_event_user_index (eventId, userId))""",
+    """CREATE TABLE IF NOT EXISTS SpeciesCellRollup (
+        cell CHAR(6) CHARACTER SET ascii COLLATE ascii_bin NOT NULL, pokemon_id INT NOT NULL,
+        weather VARCHAR(50) NOT NULL, appearedTimeOfDay VARCHAR(50) NOT NULL,
+        sightingCount INT NOT NULL, lastSeen DATETIME,
+        PRIMARY KEY (cell, pokemon_id, weather, appearedTimeOfDay))""",
+]
+
+USER_COLUMNS = ("userId", "password", "role", "organizationName")
+EVENT_COLUMNS = ("eventId", "eventName", "description", "location", "time",
+                 "participantCount", "organizationName")
+REPORT_COLUMNS = ("reportId", "sightingId", "userId", "eventId", "status", "notes", "time")
+
+PROCEDURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "procedures.txt")
+ROLLUP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "species_rollup.txt")
+_ROUTINE = re.compile(r"DELIMITER //\s*(CREATE (PROCEDURE|TRIGGER)\s+(\w+).*?)\s*//\s*DELIMITER ;", re.S)
+
+
+def parse_scale(value):
+    """'10k' / '1m' / '10m' or a plain number of sightings."""
+    value = value.strip().lower()
+    if value in SCALES:
+        return SCALES[value]
+    return int(value.replace("_", ""))
+
+
+def sizes(sightings):
+    """Row counts of the other tables for a given number of sightings."""
+    users = max(200, sightings // 500)
+    return {
+        "sightings": sightings,
+        "users": users,
+        "organizations": max(10, users // 50),
+        "events": max(50, sightings // 20_000),
+    }
+
+
+def user_id(n):
+    return f"bench-user-{n}"
+
+
+def organization_name(n):
+    return f"bench-org-{n}"
+
+
+# explicit report ids keep re-runs idempotent: sighting n's report is n + 1,
+# event participants start at EVENT_REPORT_IDS; new reports auto-increment above both
+EVENT_REPORT_IDS = 100_000_000
+
+
+def event_id(n):
+    # create_event draws ids from 100000-999999; keep ours outside that range
+    return 1_000_000 + n
+
+
+def max_cp(attack, defense, stamina):
+    """Level-40 CP with perfect IVs, as Pokémon GO computes it."""
+    cpm = 0.7903
+    return int((attack + 15) * math.sqrt(defense + 15) * math.sqrt(stamina + 15) * cpm ** 2 / 10)
+
+
+def pokemon_rows(rng):
+    """[(Pokemon row, StatsCP row)] for the synthetic species."""
+    tiers = []
+    for rarity, (share, _) in RARITIES.items():
+        tiers += [rarity] * round(share * SPECIES)
+    tiers = (tiers + ["Common"] * SPECIES)[:SPECIES]
+    rng.shuffle(tiers)
+
+    rows = []
+    for pokemon_id in range(1, SPECIES + 1):
+        rarity = tiers[pokemon_id - 1]
+        boost = {"Legendary": 80, "Mythical": 90}.get(rarity, 0)
+        attack = rng.randint(40, 250) + boost
+        defense = rng.randint(40, 230) + boost
+        stamina = rng.randint(80, 300) + boost
+        types = rng.sample(TYPES, 2 if rng.random() < 0.3 else 1)
+        rows.append(((pokemon_id, f"Species{pokemon_id:03d}", attack, defense, stamina,
+                      ",".join(types), rarity),
+                     (attack, defense, stamina, max_cp(attack, defense, stamina))))
+    return rows
+
+
+def city_spread(population):
+    # bigger cities sprawl further: ~3 km for a small town, ~25 km for New York
+    return 0.03 + 0.02 * population
+
+
+def sighting_rows(rng, count, pokemon):
+    """Yield (n, Location row, Sighting row) for `count` sightings."""
+    cum_weights = []
+    total = 0.0
+    for _, _, _, population, _ in CITIES:
+        total += population
+        cum_weights.append(total)
+    species_ids = [row[0] for row in pokemon]
+    species_cum_weights = []
+    total = 0.0
+    for row in pokemon:
+        total += RARITIES[row[6]][1]
+        species_cum_weights.append(total)
+
+    for n in range(count):
+        if rng.random() < BACKGROUND_SHARE:
+            latitude = rng.uniform(-55.0, 70.0)
+            longitude = rng.uniform(-180.0, 180.0)
+            city, density, water = "Unknown", 0.0, rng.random() < 0.3
+        else:
+            name, lat, lng, population, water = rng.choices(CITIES, cum_weights=cum_weights)[0]
+            spread = city_spread(population)
+            latitude = max(-90.0, min(90.0, rng.gauss(lat, spread)))
+            longitude = rng.gauss(lng, spread / max(math.cos(math.radians(lat)), 0.1))
+            longitude = (longitude + 180.0) % 360.0 - 180.0
+            distance = math.hypot(latitude - lat, (longitude - lng) * math.cos(math.radians(lat)))
+            city = name
+            density = round(population * 4000 * math.exp(-distance / spread), 1)
+        latitude = round(latitude, 6)
+        longitude = round(longitude, 6)
+        weather = rng.choices(WEATHERS, weights=WEATHER_WEIGHTS)[0]
+        temperature = round(rng.gauss(62.0, 15.0), 1)
+        wind_speed = round(abs(rng.gauss(7.0, 4.0)), 1)
+        yield (n, (longitude, latitude, city, density, water),
+               (f"synthetic-{n}", rng.choices(species_ids, cum_weights=species_cum_weights)[0],
+                longitude, latitude, rng.choice(TIMES_OF_DAY), weather, temperature, wind_speed))
+
+
+def _timestamp(offset_seconds):
+    return (EPOCH + timedelta(seconds=offset_seconds)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def create_schema(conn, paths=(PROCEDURES_PATH, ROLLUP_PATH)):
+    """Create the tables (if missing) and (re)create the stored procedures and triggers."""
+    routines = []
+    for path in paths:
+        with open(path) as f:
+            routines += _ROUTINE.findall(f.read())
+    cursor = conn.cursor()
+    try:
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        for body, kind, name in routines:
+            cursor.execute(f"DROP {kind} IF EXISTS {name}")
+            cursor.execute(body)
+        conn.commit()
+    finally:
+        cursor.close()
+    print(f"Schema ready ({len(SCHEMA)} tables, {len(routines)} procedures/triggers)")
+
+
+def generate(conn, scale, seed=1, chunk_size=5000, report_share=0.1, disable_checks=False):
+    """Write the dataset for `scale` sightings; returns the row counts."""
+    rng = random.Random(seed)
+    counts = sizes(scale)
+    cursor = conn.cursor()
+    if disable_checks:
+        cursor.execute("SET SESSION unique_checks = 0")
+        cursor.execute("SET SESSION foreign_key_checks = 0")
+
+    started = time.monotonic()
+    try:
+        pokemon = pokemon_rows(rng)
+        insert_many(cursor, "StatsCP", STATSCP_COLUMNS, [row[1] for row in pokemon], verb="INSERT IGNORE")
+        insert_many(cursor, "Pokemon", POKEMON_COLUMNS, [row[0] for row in pokemon], verb="INSERT IGNORE")
+        pokemon = [row[0] for row in pokemon]
+
+        organizations = [("default",)] + [(organization_name(n),) for n in range(counts["organizations"])]
+        insert_many(cursor, "Organizations", ("organizationName",), organizations, verb="INSERT IGNORE")
+
+        # every synthetic user logs in with the password "bench"
+        password = hashlib.sha256(b"bench").hexdigest()
+        users = [(user_id(n), password, "admin" if n % 50 == 0 else "user",
+                  organization_name(n % counts["organizations"])) for n in range(counts["users"])]
+        for chunk in chunked(users, chunk_size):
+            insert_many(cursor, "User", USER_COLUMNS, chunk, verb="INSERT IGNORE")
+        conn.commit()
+
+        events = []
+        reports = []
+        for n in range(counts["events"]):
+            city = rng.choice(CITIES)[0]
+            participants = rng.sample(range(counts["users"]), rng.randint(0, 60))
+            events.append((event_id(n), f"{city} Community Day #{n}", "Synthetic benchmark event",
+                           city, _timestamp(rng.randint(0, 180 * 86400)), len(participants),
+                           organization_name(n % counts["organizations"])))
+            reports += [(EVENT_REPORT_IDS + len(reports) + i, None, user_id(u), event_id(n), "joined", "",
+                         _timestamp(n)) for i, u in enumerate(participants)]
+        insert_many(cursor, "Events", EVENT_COLUMNS, events, verb="INSERT IGNORE")
+        for chunk in chunked(reports, chunk_size):
+            insert_many(cursor, "Reports", REPORT_COLUMNS, chunk, verb="INSERT IGNORE")
+        conn.commit()
+
+        every = round(1 / report_share) if report_share > 0 else 0
+        done = 0
+        for chunk in chunked(sighting_rows(rng, scale, pokemon), chunk_size):
+            insert_many(cursor, "Location", LOCATION_COLUMNS, [row[1] for row in chunk], verb="INSERT IGNORE")
+            insert_many(cursor, "Sighting", SIGHTING_COLUMNS, [row[2] for row in chunk], verb="INSERT IGNORE")
+            reported = [(n + 1, sighting[0], user_id(n % counts["users"]), None, "confirmed", "",
+                         _timestamp(n)) for n, _, sighting in chunk if every and n % every == 0]
+            insert_many(cursor, "Reports", REPORT_COLUMNS, reported, verb="INSERT IGNORE")
+            conn.commit()
+
+            done += len(chunk)
+            elapsed = time.monotonic() - started
+            print(f"sightings: {done}/{scale} ({done / elapsed:,.0f} rows/s)", flush=True)
+    finally:
+        cursor.close()
+
+    print(f"Done: {counts} in {time.monotonic() - started:.1f}s")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load a synthetic benchmark dataset into MySQL.")
+    parser.add_argument("--scale", default="10k",
+                        help="number of sightings: 10k, 100k, 1m, 10m or a number (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--report-share", type=float, default=0.1,
+                        help="share of sightings that have a user report (default: %(default)s)")
+    parser.add_argument("--create-schema", action="store_true",
+                        help="create missing tables and (re)create the procedures and triggers first")
+    parser.add_argument("--disable-checks", action="store_true",
+                        help="turn off unique/foreign key checks for the session")
+    parser.add_argument("--host", default=os.environ.get("MYSQL_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MYSQL_PORT", 3306)))
+    parser.add_argument("--user", default=os.environ.get("MYSQL_USER", "root"))
+    parser.add_argument("--password", default=os.environ.get("MYSQL_PASSWORD", ""))
+    parser.add_argument("--database", default=os.environ.get("MYSQL_DATABASE"))
+    args = parser.parse_args(argv)
+
+    conn = mysql.connector.connect(host=args.host, port=args.port, user=args.user,
+                                   password=args.password, database=args.database)
+    try:
+        if args.create_schema:
+            create_schema(conn)
+        generate(conn, parse_scale(args.scale), seed=args.seed, chunk_size=args.chunk_size,
+                 report_share=args.report_share, disable_checks=args.disable_checks)
+    except KeyboardInterrupt:
+        print("Interrupted; re-run the same command to continue (rows are idempotent).",
+              file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
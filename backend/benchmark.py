@@ -0,0 +1,503 @@
+"""Reproducible load test for the API.
+
+    python bench_data.py --scale 1m --create-schema      # once per database
+    python benchmark.py run --duration 60 --concurrency 16
+    python benchmark.py compare bench-results/a.json bench-results/b.json
+
+`run` imports the app in-process against the MySQL database given by the
+MYSQL_* env vars (or --host/--user/... flags), serves it with a threaded
+WSGI server on a local port and drives it with --concurrency client threads
+for --duration seconds after a --warmup period. Requests are drawn from a
+weighted --mix of workloads (map searches, cluster viewports, sighting
+creates and deletes, event joins and leaves, organization listings);
+deletes remove sightings the same client created, leaves undo its joins.
+
+Google geocoding and Open-Meteo are replaced by deterministic local stubs
+(optionally with --stub-latency-ms of simulated network time) underneath
+geocode_city and fetch_weather_data, so their caches stay in the measured
+path. Each run starts from empty geocode/weather/response caches in a
+temporary directory.
+
+The result file (JSON) holds p50/p95/p99 latency, throughput and error
+counts per endpoint, plus the git commit, dataset size and the settings
+the app was run with. `compare` prints the change between two files and
+exits non-zero when any endpoint's p95 regressed by more than --threshold
+percent.
+"""
+import argparse
+import http.client
+import json
+import logging
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from bench_data import CITIES, city_spread
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# workload -> weight; --mix overrides
+DEFAULT_MIX = {
+    "search_sightings": 30,
+    "search_species": 15,
+    "clusters": 20,
+    "create_sighting": 10,
+    "delete_sighting": 8,
+    "join_event": 6,
+    "leave_event": 5,
+    "list_organizations": 6,
+}
+
+CITY_WEIGHTS = [city[3] for city in CITIES]
+RANGES = (1, 2, 5, 10, 25)
+ZOOMS = (9, 11, 13, 15)
+WEATHERS = ("Clear", "Clouds", "Rain", "Fog", "Snow")
+
+# app settings recorded with every result
+RECORDED_ENV_PREFIXES = ("DB_POOL_", "SIGHTING_", "WEATHER_", "RESPONSE_CACHE", "GEOCODE_",
+                         "POKEMON_CATALOG_", "SLOW_QUERY_", "PARTICIPANT_", "LOG_LEVEL")
+
+
+def parse_mix(value):
+    """'clusters=50,create_sighting=10' -> {workload: weight}"""
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"unknown workload {name!r} (one of {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+# deterministic stand-ins for the external APIs
+
+def stub_geocode(city, latency=0.0):
+    """Google-style geocode result for the synthetic dataset's cities, [] otherwise."""
+    if latency:
+        time.sleep(latency)
+    key = " ".join((city or "").lower().split())
+    for name, lat, lng, _, _ in CITIES:
+        if name.lower() == key:
+            return [{"geometry": {"location": {"lat": lat, "lng": lng}}}]
+    return []
+
+
+def stub_weather(latitude, longitude, latency=0.0):
+    """Weather derived from the coordinates only, in parse_weather_response's shape."""
+    if latency:
+        time.sleep(latency)
+    r = random.Random(f"{float(latitude):.4f},{float(longitude):.4f}")
+    return {
+        "weather": r.choice(WEATHERS),
+        "temperature": round(r.uniform(20.0, 95.0), 1),
+        "windSpeed": round(r.uniform(0.0, 25.0), 1),
+    }
+
+
+def install_stubs(latency=0.0):
+    # replace only the upstream calls, so the cache tiers and single-flight still run
+    import longlatgetter
+    import sightings
+    import metrics
+
+    longlatgetter._geocode_api = metrics.timed("geocode_api")(lambda city: stub_geocode(city, latency))
+    sightings.fetch_weather_data_uncached = metrics.timed("weather_api")(
+        lambda latitude, longitude: stub_weather(latitude, longitude, latency))
+
+
+def prepare_environment(args, cache_dir):
+    """Point the app at the benchmark database and fresh caches before it is imported."""
+    os.environ.update({
+        "MYSQL_HOST": args.host,
+        "MYSQL_PORT": str(args.port),
+        "MYSQL_USER": args.user,
+        "MYSQL_PASSWORD": args.password,
+        "MYSQL_DATABASE": args.database or "",
+        "GEOCODE_CACHE_PATH": os.path.join(cache_dir, "geocode.sqlite3"),
+        "WEATHER_CACHE_PATH": os.path.join(cache_dir, "weather.sqlite3"),
+        "RESPONSE_CACHE_PATH": os.path.join(cache_dir, "responses.sqlite3"),
+        "METRICS_DIR": os.path.join(cache_dir, "metrics"),
+    })
+    os.environ.setdefault("MYSQL_SSL_DISABLED", "1")
+    # the per-request debug/info lines would dominate the run's output
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+
+def load_fixtures(get_connection):
+    """Ids the workloads draw from: species, synthetic users and events, sighting count."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT pokemon_id, pokemon_name FROM Pokemon ORDER BY pokemon_id")
+        pokemon = cursor.fetchall()
+        cursor.execute("SELECT userId FROM User WHERE userId LIKE 'bench-user-%%' ORDER BY userId")
+        users = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT eventId FROM Events WHERE eventId >= 1000000 ORDER BY eventId")
+        events = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT COUNT(*) FROM Sighting")
+        sightings = cursor.fetchone()[0]
+    finally:
+        cursor.close()
+        conn.close()
+    if not pokemon or not users or not events:
+        raise SystemExit("No benchmark data found; load it first with bench_data.py")
+    return {"pokemon": pokemon, "users": users, "events": events, "sightings": sightings}
+
+
+class Client:
+    """One simulated user: a keep-alive connection, its own RNG and what it created."""
+
+    def __init__(self, n, host, port, fixtures, mix, seed):
+        self.rng = random.Random(f"{seed}:{n}")
+        self.host = host
+        self.port = port
+        self.fixtures = fixtures
+        self.user = fixtures["users"][n % len(fixtures["users"])]
+        self.workloads = list(mix)
+        self.cum_weights = []
+        total = 0.0
+        for name in self.workloads:
+            total += mix[name]
+            self.cum_weights.append(total)
+        self.created = []
+        self.joined = []
+        self.samples = {}  # workload -> [latency seconds]
+        self.statuses = {}  # workload -> {status: count}
+        self.conn = None
+
+    def request(self, method, path, body=None):
+        payload = None if body is None else json.dumps(body)
+        headers = {"Content-Type": "application/json"} if payload is not None else {}
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    self.conn.close()
+                    self.conn = None
+                return response.status, data
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+
+    def city(self):
+        return self.rng.choices(CITIES, weights=CITY_WEIGHTS)[0]
+
+    # workloads: each returns (status, body)
+
+    def search_sightings(self):
+        name = self.rng.choice(self.fixtures["pokemon"])[1]
+        return self.request("POST", "/api/get_pokemon_sightings", {
+            "name": name, "city": self.city()[0], "range": self.rng.choice(RANGES)})
+
+    def search_species(self):
+        body = {"city": self.city()[0], "range": self.rng.choice(RANGES)}
+        if self.rng.random() < 0.3:
+            body["weather"] = self.rng.choice(WEATHERS)
+        if self.rng.random() < 0.2:
+            body["minCP"] = self.rng.choice((500, 1000, 2000))
+        return self.request("POST", "/api/get_pokemon", body)
+
+    def clusters(self):
+        _, lat, lng, population, _ = self.city()
+        zoom = self.rng.choice(ZOOMS)
+        # a viewport of roughly 1000x700 px at this zoom, near the city
+        half_width = 360.0 / 2 ** zoom * 1000 / 256 / 2
+        half_height = half_width * 0.7 * math.cos(math.radians(lat))
+        lat += self.rng.gauss(0, city_spread(population) / 2)
+        lng += self.rng.gauss(0, city_spread(population) / 2)
+        return self.request("GET", "/api/sightings/clusters?south=%f&north=%f&west=%f&east=%f&zoom=%d" % (
+            lat - half_height, lat + half_height, lng - half_width, lng + half_width, zoom))
+
+    def create_sighting(self):
+        _, lat, lng, population, _ = self.city()
+        spread = city_spread(population)
+        status, data = self.request("POST", "/api/sightings", {
+            "pokemonId": self.rng.choice(self.fixtures["pokemon"])[0],
+            "userId": self.user,
+            "latitude": round(self.rng.gauss(lat, spread), 6),
+            "longitude": round(self.rng.gauss(lng, spread), 6),
+            "notes": "benchmark",
+        })
+        if status == 200:
+            self.created.append(json.loads(data)["sightingId"])
+        return status, data
+
+    def delete_sighting(self):
+        if not self.created:
+            return None
+        sighting_id = self.created.pop(self.rng.randrange(len(self.created)))
+        return self.request("DELETE", f"/api/sightings/{sighting_id}", {"userId": self.user})
+
+    def join_event(self):
+        event_id = self.rng.choice(self.fixtures["events"])
+        status, data = self.request("POST", f"/api/events/{event_id}/join", {
+            "userId": self.user, "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+        if status == 201:
+            self.joined.append(event_id)
+        return status, data
+
+    def leave_event(self):
+        if not self.joined:
+            return None
+        event_id = self.joined.pop(self.rng.randrange(len(self.joined)))
+        return self.request("POST", f"/api/events/{event_id}/leave", {"userId": self.user})
+
+    def list_organizations(self):
+        return self.request("GET", "/api/organizations")
+
+    def run(self, measure_from, stop_at):
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            workload = self.rng.choices(self.workloads, cum_weights=self.cum_weights)[0]
+            try:
+                result = getattr(self, workload)()
+                if result is None:
+                    # nothing of ours to delete/leave yet: create/join instead
+                    workload = {"delete_sighting": "create_sighting",
+                                "leave_event": "join_event"}[workload]
+                    result = getattr(self, workload)()
+                status = result[0]
+            except (http.client.HTTPException, OSError, ValueError, KeyError):
+                status = "error"
+            if started < measure_from:
+                continue
+            self.samples.setdefault(workload, []).append(time.perf_counter() - started)
+            counts = self.statuses.setdefault(workload, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def cleanup(self):
+        """Undo what this client left behind, so the dataset stays the same across runs."""
+        for sighting_id in self.created:
+            self.request("DELETE", f"/api/sightings/{sighting_id}", {"userId": self.user})
+        for event_id in self.joined:
+            self.request("POST", f"/api/events/{event_id}/leave", {"userId": self.user})
+        if self.conn is not None:
+            self.conn.close()
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(samples, statuses, seconds):
+    latencies = sorted(samples)
+    errors = sum(count for status, count in statuses.items()
+                 if status == "error" or status.startswith("5"))
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": dict(sorted(statuses.items())),
+        "throughputRps": round(len(latencies) / seconds, 2),
+        "p50Ms": ms(percentile(latencies, 50)),
+        "p95Ms": ms(percentile(latencies, 95)),
+        "p99Ms": ms(percentile(latencies, 99)),
+        "meanMs": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "maxMs": ms(latencies[-1]) if latencies else None,
+    }
+
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    try:
+        return git("rev-parse", "HEAD") or None, bool(git("status", "--porcelain", "--untracked-files=no"))
+    except OSError:
+        return None, None
+
+
+def run(args):
+    cache_dir = tempfile.mkdtemp(prefix="pokesight-bench-")
+    prepare_environment(args, cache_dir)
+    sys.path.insert(0, HERE)
+    import backend
+    from werkzeug.serving import make_server
+
+    install_stubs(args.stub_latency_ms / 1000)
+    fixtures = load_fixtures(backend.get_connection)
+
+    # werkzeug logs one line per request otherwise
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", args.server_port, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    mix = args.mix or DEFAULT_MIX
+    clients = [Client(n, "127.0.0.1", port, fixtures, mix, args.seed) for n in range(args.concurrency)]
+    started_at = datetime.now(timezone.utc)
+    measure_from = time.perf_counter() + args.warmup
+    stop_at = measure_from + args.duration
+    print(f"{fixtures['sightings']:,} sightings; {args.concurrency} clients, "
+          f"{args.warmup:g}s warmup + {args.duration:g}s on port {port}", flush=True)
+
+    threads = [threading.Thread(target=client.run, args=(measure_from, stop_at)) for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for client in clients:
+        client.cleanup()
+    pool_stats = backend.db_pool.stats()
+    server.shutdown()
+
+    endpoints = {}
+    all_samples, all_statuses = [], {}
+    for workload in mix:
+        samples = [s for client in clients for s in client.samples.get(workload, [])]
+        statuses = {}
+        for client in clients:
+            for status, count in client.statuses.get(workload, {}).items():
+                statuses[status] = statuses.get(status, 0) + count
+                all_statuses[status] = all_statuses.get(status, 0) + count
+        all_samples += samples
+        if samples:
+            endpoints[workload] = summarize(samples, statuses, args.duration)
+
+    commit, dirty = git_revision()
+    result = {
+        "format": 1,
+        "commit": commit,
+        "dirty": dirty,
+        "startedAt": started_at.isoformat(timespec="seconds"),
+        "host": {"python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count()},
+        "config": {
+            "concurrency": args.concurrency,
+            "durationSeconds": args.duration,
+            "warmupSeconds": args.warmup,
+            "seed": args.seed,
+            "stubLatencyMs": args.stub_latency_ms,
+            "mix": mix,
+            "env": {k: v for k, v in sorted(os.environ.items()) if k.startswith(RECORDED_ENV_PREFIXES)},
+        },
+        "dataset": {"sightings": fixtures["sightings"], "users": len(fixtures["users"]),
+                    "events": len(fixtures["events"]), "pokemon": len(fixtures["pokemon"])},
+        "total": summarize(all_samples, all_statuses, args.duration),
+        "endpoints": endpoints,
+        "pool": pool_stats,
+    }
+
+    out = args.out
+    if out is None or os.path.isdir(out) or out.endswith(os.sep):
+        directory = out or os.path.join(HERE, "bench-results")
+        os.makedirs(directory, exist_ok=True)
+        name = f"{started_at:%Y%m%dT%H%M%S}-{(commit or 'nogit')[:10]}-{fixtures['sightings']}.json"
+        out = os.path.join(directory, name)
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+
+    print_table(result)
+    print(f"Results written to {out}")
+    return 0
+
+
+def print_table(result):
+    print(f"{'endpoint':<20} {'requests':>9} {'errors':>7} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for name, stats in rows:
+        print(f"{name:<20} {stats['requests']:>9} {stats['errors']:>7} {stats['throughputRps']:>9.1f} "
+              f"{_fmt(stats['p50Ms']):>9} {_fmt(stats['p95Ms']):>9} {_fmt(stats['p99Ms']):>9}")
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def _change(old, new):
+    if old is None or new is None or old == 0:
+        return "-"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        base = json.load(f)
+    with open(args.candidate) as f:
+        head = json.load(f)
+
+    print(f"baseline  {(base.get('commit') or '?')[:10]}  {base['dataset']['sightings']:,} sightings")
+    print(f"candidate {(head.get('commit') or '?')[:10]}  {head['dataset']['sightings']:,} sightings")
+    if base["dataset"] != head["dataset"] or base["config"]["concurrency"] != head["config"]["concurrency"]:
+        print("warning: the runs used different datasets or concurrency")
+
+    print(f"{'endpoint':<20} {'rps':>16} {'p50 ms':>20} {'p95 ms':>20} {'p99 ms':>20}")
+    regressions = []
+    names = list(base["endpoints"]) + [n for n in head["endpoints"] if n not in base["endpoints"]]
+    for name in names + ["TOTAL"]:
+        old = base["total"] if name == "TOTAL" else base["endpoints"].get(name)
+        new = head["total"] if name == "TOTAL" else head["endpoints"].get(name)
+        if old is None or new is None:
+            print(f"{name:<20} only in {'candidate' if old is None else 'baseline'}")
+            continue
+        cells = []
+        for key in ("throughputRps", "p50Ms", "p95Ms", "p99Ms"):
+            cells.append(f"{_fmt(new[key])} ({_change(old[key], new[key])})")
+        print(f"{name:<20} {cells[0]:>16} {cells[1]:>20} {cells[2]:>20} {cells[3]:>20}")
+        if (name != "TOTAL" and old["p95Ms"] and new["p95Ms"]
+                and new["p95Ms"] > old["p95Ms"] * (1 + args.threshold / 100)):
+            regressions.append(name)
+
+    if regressions:
+        print(f"p95 regressed by more than {args.threshold:g}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the API and compare runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="drive the app with a mixed workload")
+    run_parser.add_argument("--duration", type=float, default=60, help="measured seconds (default: %(default)s)")
+    run_parser.add_argument("--warmup", type=float, default=10, help="unmeasured seconds first (default: %(default)s)")
+    run_parser.add_argument("--concurrency", type=int, default=16, help="client threads (default: %(default)s)")
+    run_parser.add_argument("--mix", type=parse_mix, default=None,
+                            help="workload weights, e.g. clusters=50,create_sighting=10 "
+                                 f"(default: {','.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())})")
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--stub-latency-ms", type=float, default=0,
+                            help="simulated geocoding/weather API latency on cache misses")
+    run_parser.add_argument("--server-port", type=int, default=0, help="port to serve on (default: any free port)")
+    run_parser.add_argument("--out", default=None,
+                            help="result file, or a directory for an auto-named one (default: bench-results/)")
+    run_parser.add_argument("--host", default=os.environ.get("MYSQL_HOST", "localhost"))
+    run_parser.add_argument("--port", type=int, default=int(os.environ.get("MYSQL_PORT", 3306)))
+    run_parser.add_argument("--user", default=os.environ.get("MYSQL_USER", "root"))
+    run_parser.add_argument("--password", default=os.environ.get("MYSQL_PASSWORD", ""))
+    run_parser.add_argument("--database", default=os.environ.get("MYSQL_DATABASE"))
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=10,
+                                help="p95 increase, in percent, that counts as a regression (default: %(default)s)")
+
+    args = parser.parse_args(argv)
+    return run(args) if args.command == "run" else compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+def insert_many(cursor, table, columns, rows, verb="INSERT"):
+    """Insert `rows` (sequences matching `columns`) with one multi-row statement.
+
+    `verb` can be e.g. "INSERT IGNORE" for idempotent inserts. Callers are
+    expected to chunk `rows` so the statement stays under max_allowed_packet.
+    """
+    if not rows:
+        return 0
+    placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    sql = (f"{verb} INTO {table} ({', '.join(columns)}) VALUES "
+           + ", ".join([placeholders] * len(rows)))
+    params = [value for row in rows for value in row]
+    cursor.execute(sql, params)
+    return cursor.rowcount
+
+
+def chunked(iterable, size):
+    """Yield lists of up to `size` items from any iterable, lazily."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
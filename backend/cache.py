@@ -0,0 +1,305 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries expire after a TTL.
+
+    Each entry can carry its own TTL (e.g. shorter TTLs for negative results).
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= now:
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _thread_connection(local, path):
+    # sqlite connections can't be shared across threads (or a fork)
+    conn = getattr(local, "conn", None)
+    if conn is None or getattr(local, "pid", None) != os.getpid():
+        conn = sqlite3.connect(path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        local.conn = conn
+        local.pid = os.getpid()
+    return conn
+
+
+class DiskCache:
+    """Persistent key/value store backed by a local SQLite file.
+
+    Values are stored as JSON with an absolute expiry time, so the cache
+    survives restarts. SQLite handles locking, which makes the same file safe
+    to share between threads and worker processes. Expired rows are only
+    skipped on read; they are deleted when the cache is opened and then on
+    every `purge_every`-th set() of each process.
+    """
+
+    def __init__(self, path, table="cache", purge_every=1000):
+        self.path = path
+        self.table = table
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._sets = 0
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+        self.purge_expired()
+
+    def _conn(self):
+        return _thread_connection(self._local, self.path)
+
+    def get(self, key, default=None):
+        try:
+            row = self._conn().execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            self.misses += 1
+            return default
+        if row is None or row[1] <= time.time():
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl):
+        try:
+            conn = self._conn()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl),
+            )
+            conn.commit()
+        except sqlite3.Error:
+            # the disk tier is best-effort; the in-process tier still works
+            pass
+        self._sets += 1
+        if self.purge_every and self._sets % self.purge_every == 0:
+            self.purge_expired()
+
+    def delete(self, key):
+        try:
+            conn = self._conn()
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            conn.commit()
+        except sqlite3.Error:
+            pass
+
+    def purge_expired(self):
+        """Delete expired rows; returns how many were removed."""
+        try:
+            conn = self._conn()
+            removed = conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),)).rowcount
+            conn.commit()
+        except sqlite3.Error:
+            return 0
+        return removed
+
+
+class ChangeLog:
+    """Append-only log of JSON entries in a local SQLite file, shared by worker processes.
+
+    Every append gets the next sequence number. A reader remembers the last
+    one it applied and reads only the newer entries. Entries are kept for
+    `retention` seconds (purged when the log is opened and then on every
+    `purge_every`-th append of each process); a reader that falls further
+    behind gets None from since() and has to resync another way. As with
+    DiskCache, SQLite errors are swallowed and reported as None.
+    """
+
+    def __init__(self, path, table="changes", retention=3600.0, purge_every=1000):
+        self.path = path
+        self.table = table
+        self.retention = retention
+        self.purge_every = purge_every
+        self._local = threading.local()
+        self._appends = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, value TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.commit()
+        self.purge()
+
+    def _conn(self):
+        return _thread_connection(self._local, self.path)
+
+    def last_seq(self):
+        """Sequence number of the newest entry ever appended (0 if none), or None."""
+        try:
+            # AUTOINCREMENT's counter survives purging the rows
+            row = self._conn().execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = ?", (self.table,)).fetchone()
+        except sqlite3.Error:
+            return None
+        return row[0] if row else 0
+
+    def append(self, value):
+        """Append an entry; returns its sequence number, or None if it wasn't written."""
+        try:
+            conn = self._conn()
+            seq = conn.execute(
+                f"INSERT INTO {self.table} (value, created_at) VALUES (?, ?)",
+                (json.dumps(value), time.time()),
+            ).lastrowid
+            conn.commit()
+        except sqlite3.Error:
+            return None
+        self._appends += 1
+        if self.purge_every and self._appends % self.purge_every == 0:
+            self.purge()
+        return seq
+
+    def since(self, seq, limit=1000):
+        """Up to `limit` (seq, value) pairs appended after `seq`, oldest first.
+
+        None if some of them were already purged (or the log was recreated),
+        or if the log can't be read.
+        """
+        try:
+            rows = self._conn().execute(
+                f"SELECT seq, value FROM {self.table} WHERE seq > ? ORDER BY seq LIMIT ?",
+                (seq, limit),
+            ).fetchall()
+        except sqlite3.Error:
+            return None
+        if rows:
+            if rows[0][0] != seq + 1:
+                return None
+        elif self.last_seq() != seq:
+            return None
+        return [(row_seq, json.loads(value)) for row_seq, value in rows]
+
+    def purge(self):
+        """Delete entries older than the retention; returns how many were removed."""
+        try:
+            conn = self._conn()
+            removed = conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at <= ?",
+                (time.time() - self.retention,)).rowcount
+            conn.commit()
+        except sqlite3.Error:
+            return 0
+        return removed
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait and get the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines: concurrent awaits of one key share one task.
+
+    The shared task is shielded, so a cancelled waiter doesn't cancel the
+    lookup for the others.
+    """
+
+    def __init__(self):
+        self._tasks = {}
+        self.shared = 0
+
+    async def do(self, key, coro_fn):
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(coro_fn())
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
@@ -0,0 +1,88 @@
+import math
+
+# Web map tiles are 256px wide; at zoom z the world is 256 * 2^z px across
+TILE_SIZE = 256
+DEFAULT_CELL_PIXELS = 64
+TOP_POKEMON = 5
+
+
+def cell_degrees(zoom, cell_pixels=DEFAULT_CELL_PIXELS):
+    """Grid cell size (in degrees) covering roughly `cell_pixels` on screen at `zoom`."""
+    return cell_pixels * 360.0 / (TILE_SIZE * (2 ** zoom))
+
+
+def viewport_boxes(south, north, west, east):
+    """Split a viewport into lat/lng boxes; two when it crosses the antimeridian."""
+    if west <= east:
+        return [(south, north, west, east)]
+    return [(south, north, west, 180.0), (south, north, -180.0, east)]
+
+
+def grid_cells(boxes, cell_deg):
+    """Number of grid cells of size `cell_deg` the boxes touch."""
+    total = 0
+    for south, north, west, east in boxes:
+        rows = math.floor(north / cell_deg) - math.floor(south / cell_deg) + 1
+        cols = math.floor(east / cell_deg) - math.floor(west / cell_deg) + 1
+        total += rows * cols
+    return total
+
+
+def capped_cell_degrees(cell_deg, boxes, max_cells):
+    """`cell_deg`, doubled until the boxes touch at most `max_cells` cells.
+
+    Each doubling is the grid one zoom level out, so a coarsened grid is
+    still snapped like the normal one. Stops at cells as wide as the world.
+    """
+    while cell_deg < 360 and grid_cells(boxes, cell_deg) > max_cells:
+        cell_deg *= 2
+    return cell_deg
+
+
+class ClusterGrid:
+    """Accumulates sightings into fixed grid cells and reports one cluster per cell.
+
+    Cells are snapped to a global grid so clusters don't jump around as the
+    map pans. Each cluster carries its centroid, count, a weather breakdown,
+    and the most frequent Pokémon.
+    """
+
+    def __init__(self, cell_deg):
+        self.cell_deg = cell_deg
+        self._cells = {}
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def add(self, lat, lng, weather, pokemon_name, count=1, sum_lat=None, sum_lng=None):
+        """Add one sighting, or a pre-aggregated group of `count` sightings."""
+        key = self._cell(lat, lng)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = {"count": 0, "sum_lat": 0.0, "sum_lng": 0.0,
+                                       "weather": {}, "pokemon": {}}
+        cell["count"] += count
+        cell["sum_lat"] += lat * count if sum_lat is None else sum_lat
+        cell["sum_lng"] += lng * count if sum_lng is None else sum_lng
+        weather = weather or "Unknown"
+        cell["weather"][weather] = cell["weather"].get(weather, 0) + count
+        if pokemon_name:
+            cell["pokemon"][pokemon_name] = cell["pokemon"].get(pokemon_name, 0) + count
+
+    def clusters(self):
+        out = []
+        for (cy, cx), cell in self._cells.items():
+            top = sorted(cell["pokemon"].items(), key=lambda kv: (-kv[1], kv[0]))[:TOP_POKEMON]
+            out.append({
+                "latitude": round(cell["sum_lat"] / cell["count"], 6),
+                "longitude": round(cell["sum_lng"] / cell["count"], 6),
+                "count": cell["count"],
+                "bounds": {
+                    "south": cy * self.cell_deg, "north": (cy + 1) * self.cell_deg,
+                    "west": cx * self.cell_deg, "east": (cx + 1) * self.cell_deg,
+                },
+                "weather": cell["weather"],
+                "topPokemon": [{"name": name, "count": n} for name, n in top],
+            })
+        out.sort(key=lambda c: -c["count"])
+        return out
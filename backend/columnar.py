@@ -0,0 +1,146 @@
+"""Packed columnar encoding for sighting search results.
+
+Clients opt in with `Accept: application/vnd.pokesight.sightings+columnar`
+(JSON stays the default). All integers and floats are little-endian.
+
+    header
+      4 bytes   magic "PKSC"
+      u8        version (1)
+      u8        flags: bit 0 = dictionary codes are u16 instead of u8
+      u16       reserved (0)
+      u32       row count N
+    id column (variable-length UTF-8 strings)
+      u32[N+1]  offsets into the blob (offset[0] = 0, offset[N] = blob length)
+      bytes     blob
+    latitude column
+      f32[N]
+    longitude column
+      f32[N]
+    weather column (dictionary-encoded)
+      u16       dictionary size D
+      D x (u8 length + UTF-8 bytes)   dictionary entries; "" stands for null
+      u8[N] or u16[N]                 codes into the dictionary
+    appearedTimeOfDay column: same layout as weather
+
+float32 keeps coordinates to ~1 m, well below what the map can show.
+"""
+import struct
+import sys
+from array import array
+
+from flask import Response
+
+COLUMNAR_MIMETYPE = "application/vnd.pokesight.sightings+columnar"
+MAGIC = b"PKSC"
+VERSION = 1
+FLAG_WIDE_CODES = 0x01
+
+
+def wants_columnar(req):
+    """True if the request prefers the columnar format over JSON."""
+    accept = req.accept_mimetypes
+    return (accept.best_match([COLUMNAR_MIMETYPE, "application/json"]) == COLUMNAR_MIMETYPE
+            and accept[COLUMNAR_MIMETYPE] > accept["application/json"])
+
+
+def _le_bytes(typecode, values):
+    arr = array(typecode, values)
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _dictionary_encode(values):
+    codes = []
+    dictionary = {}
+    for value in values:
+        value = "" if value is None else str(value)
+        code = dictionary.get(value)
+        if code is None:
+            code = dictionary[value] = len(dictionary)
+        codes.append(code)
+    return list(dictionary), codes
+
+
+def encode_sightings(rows):
+    """Encode rows shaped like /api/get_pokemon_sightings results."""
+    n = len(rows)
+    weather_dict, weather_codes = _dictionary_encode(r["weather"] for r in rows)
+    time_dict, time_codes = _dictionary_encode(r["appearedTimeOfDay"] for r in rows)
+    wide = max(len(weather_dict), len(time_dict)) > 255
+
+    parts = [MAGIC, struct.pack("<BBHI", VERSION, FLAG_WIDE_CODES if wide else 0, 0, n)]
+
+    ids = [str(r["id"]).encode("utf-8") for r in rows]
+    offsets = [0]
+    for encoded in ids:
+        offsets.append(offsets[-1] + len(encoded))
+    parts.append(_le_bytes("I", offsets))
+    parts.append(b"".join(ids))
+
+    parts.append(_le_bytes("f", [float(r["latitude"]) for r in rows]))
+    parts.append(_le_bytes("f", [float(r["longitude"]) for r in rows]))
+
+    code_type = "H" if wide else "B"
+    for dictionary, codes in ((weather_dict, weather_codes), (time_dict, time_codes)):
+        parts.append(struct.pack("<H", len(dictionary)))
+        for entry in dictionary:
+            encoded = entry.encode("utf-8")[:255]
+            parts.append(struct.pack("<B", len(encoded)) + encoded)
+        parts.append(_le_bytes(code_type, codes))
+
+    return b"".join(parts)
+
+
+def decode_sightings(payload):
+    """Inverse of encode_sightings (reference decoder for clients and debugging)."""
+    view = memoryview(payload)
+    if bytes(view[:4]) != MAGIC:
+        raise ValueError("Not a columnar sightings payload")
+    version, flags, _, n = struct.unpack_from("<BBHI", view, 4)
+    if version != VERSION:
+        raise ValueError(f"Unsupported columnar version {version}")
+    pos = 12
+
+    def take(typecode, count):
+        nonlocal pos
+        arr = array(typecode)
+        size = arr.itemsize * count
+        arr.frombytes(view[pos:pos + size])
+        if sys.byteorder != "little":
+            arr.byteswap()
+        pos += size
+        return arr
+
+    offsets = take("I", n + 1)
+    blob = bytes(view[pos:pos + offsets[-1]])
+    pos += offsets[-1]
+    ids = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(n)]
+    lats = take("f", n)
+    lngs = take("f", n)
+
+    code_type = "H" if flags & FLAG_WIDE_CODES else "B"
+    columns = []
+    for _ in range(2):
+        (size,) = struct.unpack_from("<H", view, pos)
+        pos += 2
+        dictionary = []
+        for _ in range(size):
+            length = view[pos]
+            dictionary.append(bytes(view[pos + 1:pos + 1 + length]).decode("utf-8") or None)
+            pos += 1 + length
+        columns.append([dictionary[c] for c in take(code_type, n)])
+
+    return [
+        {"id": ids[i], "latitude": lats[i], "longitude": lngs[i],
+         "weather": columns[0][i], "appearedTimeOfDay": columns[1][i]}
+        for i in range(n)
+    ]
+
+
+def columnar_response(rows, next_cursor=None):
+    response = Response(encode_sightings(rows), mimetype=COLUMNAR_MIMETYPE)
+    response.headers["Vary"] = "Accept"
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
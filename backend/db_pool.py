@@ -0,0 +1,398 @@
+import collections
+import os
+import threading
+import time
+
+import mysql.connector
+from mysql.connector import Error
+from mysql.connector import errors as mysql_errors
+
+import metrics
+from slow_queries import slow_query_log
+
+
+class PoolExhaustedError(Error):
+    """Raised when no connection could be checked out of the pool in time.
+
+    Subclasses mysql.connector.Error so the existing `except Error` blocks in
+    the route handlers turn it into their usual 500 response.
+    """
+
+
+# errors that mean the underlying socket/session can't be trusted anymore
+CONNECTION_ERRORS = (mysql_errors.OperationalError, mysql_errors.InterfaceError)
+
+
+class PooledCursor:
+    """Thin cursor wrapper that flags the owning connection as broken on
+    connection-level errors so it is recycled instead of reused, and times
+    execute/fetch calls for the metrics endpoint.
+
+    Each statement's execute + fetch time is summed; when the statement is
+    done (next execute or close) it goes to the slow query log.
+    """
+
+    def __init__(self, pooled_conn, cursor):
+        self._pooled_conn = pooled_conn
+        self._cursor = cursor
+        self._statement = None  # [sql, params, seconds so far]
+
+    def _call(self, phase, method, args, kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except CONNECTION_ERRORS:
+            self._pooled_conn._broken = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.record("db", elapsed, phase)
+            if self._statement is not None:
+                self._statement[2] += elapsed
+
+    def _begin(self, sql, params):
+        self._finish_statement()
+        self._statement = [sql, params, 0.0]
+
+    def _finish_statement(self):
+        statement, self._statement = self._statement, None
+        if statement is None or not slow_query_log.enabled:
+            return
+        sql, params, seconds = statement
+        slow_query_log.observe(sql, params, seconds, self._cursor.rowcount,
+                               explain=self._explain, route=metrics.current_route())
+
+    def _explain(self, sql, params):
+        # raw cursor: the EXPLAIN itself is neither timed nor logged
+        cursor = self._pooled_conn._raw.cursor(dictionary=True)
+        try:
+            cursor.execute("EXPLAIN " + sql, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._begin(operation, params)
+        return self._call("execute", self._cursor.execute, (operation, params) + args, kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self._begin(operation, f"<{len(seq_params) if hasattr(seq_params, '__len__') else '?'} rows>")
+        return self._call("execute", self._cursor.executemany, (operation, seq_params) + args, kwargs)
+
+    def callproc(self, procname, args=(), **kwargs):
+        self._begin(f"CALL {procname}", args)
+        return self._call("execute", self._cursor.callproc, (procname, args), kwargs)
+
+    def close(self):
+        self._finish_statement()
+        return self._cursor.close()
+
+    def fetchone(self, *args, **kwargs):
+        return self._call("fetch", self._cursor.fetchone, args, kwargs)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._call("fetch", self._cursor.fetchmany, args, kwargs)
+
+    def fetchall(self, *args, **kwargs):
+        return self._call("fetch", self._cursor.fetchall, args, kwargs)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class PreparedCursor(PooledCursor):
+    """PooledCursor that runs each statement as a server-side prepared statement.
+
+    The prepared statements live on the pooled connection (see
+    ConnectionPool._prepared), so a statement executed before on the same
+    connection is neither sent nor parsed again, only its parameters.
+    close() leaves the statement prepared for the next checkout.
+    """
+
+    def __init__(self, pooled_conn, dictionary=False):
+        super().__init__(pooled_conn, None)
+        self._dictionary = dictionary
+
+    def execute(self, operation, params=None):
+        pooled_conn = self._pooled_conn
+        # the cached copy of operation: mysql.connector re-prepares unless it's the same object
+        self._cursor, operation = pooled_conn._pool._prepared(pooled_conn._raw, operation, self._dictionary)
+        self._begin(operation, params)
+        return self._call("execute", self._cursor.execute, (operation, params), {})
+
+    def close(self):
+        self._finish_statement()
+        if self._cursor is not None and self._pooled_conn._raw.unread_result:
+            self._cursor.fetchall()
+
+
+class PooledConnection:
+    """Connection handed out by the pool.
+
+    Behaves like a mysql.connector connection; close() returns it to the pool
+    instead of tearing down the TCP/TLS session.
+    """
+
+    def __init__(self, pool, raw_conn):
+        self._pool = pool
+        self._raw = raw_conn
+        self._broken = False
+        self._closed = False
+
+    def cursor(self, *args, **kwargs):
+        if kwargs.get("prepared"):
+            return PreparedCursor(self, dictionary=kwargs.get("dictionary", False))
+        return PooledCursor(self, self._raw.cursor(*args, **kwargs))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._raw, self._broken)
+        self._raw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None and isinstance(exc, CONNECTION_ERRORS):
+            self._broken = True
+        self.close()
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise PoolExhaustedError(msg="Connection already returned to the pool")
+        return getattr(self._raw, name)
+
+
+class ConnectionPool:
+    """Bounded pool of database connections shared by every blueprint.
+
+    `connect` opens a raw connection (default: mysql.connector with
+    db_config); sqlite_storage passes one that opens wrapped SQLite handles.
+
+    - at most `size` connections are open at once
+    - at most `max_waiters` requests queue for a connection; the rest fail fast
+    - connections idle longer than `health_check_interval` seconds are pinged
+      on checkout and replaced if the ping fails
+    - connections released after a connection-level error are closed and
+      replaced (counted as "recycled")
+    - cursor(prepared=True) statements stay prepared on their connection,
+      up to `max_prepared` per connection (least recently used closed first)
+    """
+
+    def __init__(self, db_config, size=10, max_waiters=32, timeout=5.0,
+                 health_check_interval=30.0, connect=None, max_prepared=32):
+        self.db_config = db_config
+        self.connect = connect
+        self.size = size
+        self.max_waiters = max_waiters
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.max_prepared = max_prepared
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []  # (raw_conn, released_at), used LIFO
+        self._open = 0
+        self._waiting = 0
+        # id(raw_conn) -> OrderedDict {(sql, dictionary): (prepared cursor, sql)}
+        self._statements = {}
+
+        self._stats = {
+            "checkouts": 0,
+            "checkout_time_ms_total": 0.0,
+            "checkout_time_ms_max": 0.0,
+            "saturated_checkouts": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "connections_created": 0,
+            "recycled_after_error": 0,
+            "failed_health_checks": 0,
+            "statements_prepared": 0,
+            "statements_reused": 0,
+        }
+
+    def _connect(self):
+        if self.connect is not None:
+            conn = self.connect()
+        else:
+            conn = mysql.connector.connect(**self.db_config)
+        with self._lock:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, raw_conn):
+        # closing the connection deallocates its prepared statements server-side
+        self._statements.pop(id(raw_conn), None)
+        try:
+            raw_conn.close()
+        except Exception:
+            pass
+
+    def _prepared(self, raw_conn, sql, dictionary):
+        """(prepared cursor, cached sql) for `sql` on a checked-out connection."""
+        statements = self._statements.setdefault(id(raw_conn), collections.OrderedDict())
+        key = (sql, dictionary)
+        entry = statements.get(key)
+        if entry is not None:
+            statements.move_to_end(key)
+            with self._lock:
+                self._stats["statements_reused"] += 1
+            return entry
+        if len(statements) >= self.max_prepared:
+            _, (oldest, _) = statements.popitem(last=False)
+            oldest.close()
+        entry = statements[key] = (raw_conn.cursor(prepared=True, dictionary=dictionary), sql)
+        with self._lock:
+            self._stats["statements_prepared"] += 1
+        return entry
+
+    def _healthy(self, raw_conn, released_at):
+        if time.monotonic() - released_at < self.health_check_interval:
+            return True
+        try:
+            raw_conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def get_connection(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        saturated = False
+
+        with self._available:
+            while True:
+                if self._idle:
+                    raw_conn, released_at = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    # reserve the slot now, connect outside the lock
+                    self._open += 1
+                    raw_conn, released_at = None, None
+                    break
+
+                if not saturated:
+                    saturated = True
+                    self._stats["saturated_checkouts"] += 1
+                    if self._waiting >= self.max_waiters:
+                        self._stats["rejected"] += 1
+                        raise PoolExhaustedError(
+                            msg=f"Connection pool wait queue is full ({self.max_waiters} waiting)")
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolExhaustedError(
+                        msg=f"Timed out after {self.timeout}s waiting for a database connection")
+                self._waiting += 1
+                try:
+                    self._available.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+        if raw_conn is not None and not self._healthy(raw_conn, released_at):
+            self._discard(raw_conn)
+            with self._lock:
+                self._stats["failed_health_checks"] += 1
+            raw_conn = None
+
+        if raw_conn is None:
+            try:
+                raw_conn = self._connect()
+            except Exception:
+                with self._available:
+                    self._open -= 1
+                    self._available.notify()
+                raise
+
+        elapsed_ms = (time.monotonic() - start) * 1000
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["checkout_time_ms_total"] += elapsed_ms
+            if elapsed_ms > self._stats["checkout_time_ms_max"]:
+                self._stats["checkout_time_ms_max"] = elapsed_ms
+
+        return PooledConnection(self, raw_conn)
+
+    def _release(self, raw_conn, broken):
+        if not broken:
+            try:
+                # drop anything the handler left behind (uncommitted writes,
+                # unread result sets) before the next request sees it
+                if raw_conn.unread_result:
+                    raw_conn.consume_results()
+                if raw_conn.in_transaction:
+                    raw_conn.rollback()
+                broken = not raw_conn.is_connected()
+            except Exception:
+                broken = True
+
+        with self._available:
+            if broken:
+                self._open -= 1
+                self._stats["recycled_after_error"] += 1
+            else:
+                self._idle.append((raw_conn, time.monotonic()))
+            self._available.notify()
+
+        if broken:
+            self._discard(raw_conn)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+                "waiting": self._waiting,
+                "max_waiters": self.max_waiters,
+            })
+        checkouts = stats["checkouts"]
+        stats["checkout_time_ms_avg"] = (
+            stats["checkout_time_ms_total"] / checkouts if checkouts else 0.0)
+        return stats
+
+    def reset_after_fork(self):
+        """Start over in a forked child process.
+
+        Connections inherited from the parent share their sockets with it (and
+        with sibling workers), so they are abandoned rather than closed: a
+        close() would send COM_QUIT on a session another process may be using.
+        """
+        self._inherited = [conn for conn, _ in self._idle]
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle = []
+        self._open = 0
+        self._waiting = 0
+        self._statements = {}
+        for name in self._stats:
+            self._stats[name] = 0
+
+    def close_all(self):
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+            self._open -= len(idle)
+        for raw_conn, _ in idle:
+            self._discard(raw_conn)
+
+
+def pool_from_env(db_config, connect=None):
+    """Build a ConnectionPool sized from DB_POOL_* environment variables."""
+    return ConnectionPool(
+        db_config,
+        connect=connect,
+        size=int(os.environ.get("DB_POOL_SIZE", 10)),
+        max_waiters=int(os.environ.get("DB_POOL_MAX_WAITERS", 32)),
+        timeout=float(os.environ.get("DB_POOL_TIMEOUT", 5)),
+        health_check_interval=float(os.environ.get("DB_POOL_HEALTHCHECK_INTERVAL", 30)),
+        max_prepared=int(os.environ.get("DB_POOL_MAX_PREPARED", 32)),
+    )
@@ -1,21 +1,163 @@
+import os
 import random
+import threading
+import logging
+import time
+try:
+    import fcntl
+except ImportError:  # Windows: no other workers to coordinate with
+    fcntl = None
 from flask import Blueprint, request, jsonify
 from mysql.connector import Error
+from auth import authenticate_admin
+from pagination import (NULLABLE_TEXT, PAGE_ARGS, parse_page_args, keyset_where, order_by_sql,
+                        page_response, stream_rows)
+from response_cache import cached_response, response_cache
+from logs import get_logger, log_event
 
 events_bp = Blueprint('events', __name__)
+logger = get_logger(__name__)
 
 get_connection = None
 
-def init_events(connection_func):
-    """Initialize the events module with the database connection function"""
+LOCK_EVENT_SQL = "SELECT eventId FROM Events WHERE eventId = %s FOR UPDATE"
+IS_PARTICIPANT_SQL = "SELECT 1 FROM Reports WHERE eventId = %s AND userId = %s LIMIT 1"
+
+def init_events(connection_func, start_jobs=True):
+    """Initialize the events module with the database connection function
+
+    start_jobs=False leaves the background jobs to start_background_jobs(),
+    e.g. in each worker after a prefork server forks.
+    """
     global get_connection
     get_connection = connection_func
+    if start_jobs:
+        start_background_jobs()
+
+
+def start_background_jobs():
+    # PARTICIPANT_RECONCILE_INTERVAL > 0 runs the drift repair job in the background
+    interval = float(os.environ.get("PARTICIPANT_RECONCILE_INTERVAL", 0))
+    if interval > 0:
+        start_participant_reconciler(interval)
+
+
+def reconcile_participant_counts(batch_size=500):
+    """Repair Events.participantCount drift against COUNT(DISTINCT Reports.userId).
+
+    Walks Events in eventId order, batch_size events per transaction. Each
+    batch locks its event rows (like join/leave do) before recounting, so the
+    fix can't race a concurrent join or leave. Returns the number of events fixed.
+    """
+    fixed = 0
+    last_id = None
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        while True:
+            if last_id is None:
+                cursor.execute("SELECT eventId FROM Events ORDER BY eventId LIMIT %s", (batch_size,))
+            else:
+                cursor.execute("SELECT eventId FROM Events WHERE eventId > %s ORDER BY eventId LIMIT %s",
+                               (last_id, batch_size))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                break
+            last_id = ids[-1]
+            conn.rollback()  # end the read snapshot before locking
+
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"SELECT eventId FROM Events WHERE eventId IN ({placeholders}) FOR UPDATE", ids)
+            cursor.fetchall()
+            cursor.execute(f"""
+                SELECT e.eventId, e.participantCount, COUNT(DISTINCT r.userId)
+                FROM Events e
+                LEFT JOIN Reports r ON r.eventId = e.eventId
+                WHERE e.eventId IN ({placeholders})
+                GROUP BY e.eventId, e.participantCount
+            """, ids)
+            drifted = [(actual, event_id) for event_id, stored, actual in cursor.fetchall()
+                       if stored != actual]
+            if drifted:
+                cursor.executemany("UPDATE Events SET participantCount = %s WHERE eventId = %s", drifted)
+                fixed += len(drifted)
+            conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    if fixed:
+        response_cache.invalidate("events")
+    return fixed
+
+
+RECONCILE_LOCK_PATH = os.environ.get(
+    "PARTICIPANT_RECONCILE_LOCK",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "reconciler.lock"),
+)
+
+
+def _acquire_reconciler_lock():
+    """Hold an exclusive lock file so one process per host runs the reconciler.
+
+    Every worker of a prefork server starts the thread; the lock is held until
+    the process exits, and another worker picks it up on its next tick.
+    Returns the open lock file (True without fcntl), or None if another
+    process holds it.
+    """
+    if fcntl is None:
+        return True
+    os.makedirs(os.path.dirname(RECONCILE_LOCK_PATH), exist_ok=True)
+    lock_file = open(RECONCILE_LOCK_PATH, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def start_participant_reconciler(interval):
+    def run():
+        lock = None
+        while True:
+            time.sleep(interval)
+            if lock is None:
+                lock = _acquire_reconciler_lock()
+                if lock is None:
+                    continue
+            try:
+                fixed = reconcile_participant_counts()
+                if fixed:
+                    log_event(logger, logging.INFO, "participant_counts_reconciled", events_fixed=fixed)
+            except Error as e:
+                log_event(logger, logging.ERROR, "participant_reconcile_failed", error=str(e))
+
+    thread = threading.Thread(target=run, name="participant-reconciler", daemon=True)
+    thread.start()
+    return thread
 
 
 @events_bp.route("/api/events", methods=["GET"])
+@cached_response("events", args=PAGE_ARGS)
 def get_all_events():
-    """Get all events with participant count calculated from Reports table"""
-    sql = """
+    """Get all events with their maintained participant count
+
+    Supports optional ?limit=&after= keyset pagination and ?stream=1.
+    """
+    try:
+        page = parse_page_args(request.args, cursor_types=(NULLABLE_TEXT, int))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    order_by = [("e.time", "DESC"), ("e.eventId", "DESC")]
+    where = ""
+    params = []
+    if page.paginated and page.after is not None:
+        keyset_sql, params = keyset_where(order_by, page.after)
+        where = "WHERE " + keyset_sql
+    sql = f"""
         SELECT 
             e.eventId,
             e.eventName,
@@ -23,22 +165,31 @@ def get_all_events():
             e.location,
             e.time,
             e.organizationName,
-            COUNT(DISTINCT r.userId) AS participantCount,
+            e.participantCount,
             o.organizationName AS hostOrganization
         FROM Events e
-        LEFT JOIN Reports r 
-            ON e.eventId = r.eventId
         LEFT JOIN Organizations o 
             ON e.organizationName = o.organizationName
-        GROUP BY e.eventId, e.eventName, e.description, e.location, e.time, e.organizationName, o.organizationName
-        ORDER BY e.time DESC;
+        {where}
+        ORDER BY {order_by_sql(order_by)}
     """
+    if page.paginated:
+        sql += " LIMIT %s"
+        params.append(page.limit + 1)
+
     conn = None
     cursor = None
     try:
         conn = get_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute(sql)
+        cursor.execute(sql, params)
+        if page.paginated:
+            return page_response(cursor.fetchall(), page,
+                                 lambda row: [row["time"], row["eventId"]])
+        if page.stream:
+            response = stream_rows(conn, cursor)
+            conn = cursor = None  # closed by the stream when it finishes
+            return response
         events = cursor.fetchall()
         return jsonify(events)
     except Error as e:
@@ -53,6 +204,7 @@ def get_all_events():
             conn.close()
 
 @events_bp.route("/api/events/user/<userId>", methods=["GET"])
+@cached_response("events")
 def get_user_events(userId):
     sql = """
         SELECT DISTINCT e.* FROM Events e
@@ -92,16 +244,18 @@ def create_event():
         cursor = conn.cursor()
         # Generate a unique eventId
         event_id = random.randint(100000, 999999)
+        # participantCount is maintained by join/leave, so a new event always starts at 0
         cursor.execute(sql, (
             event_id,
             data['eventName'],
             data['description'],
             data['location'],
             data['time'],
-            data['participantCount'],
+            0,
             data['organizationName']
         ))
         conn.commit()
+        response_cache.invalidate("events")
         return jsonify({"message": "Event created successfully.", "eventId": event_id}), 201
     except Error as e:
         return jsonify({
@@ -127,6 +281,14 @@ def join_event(eventId):
     try:
         conn = get_connection()
         cursor = conn.cursor()
+        # lock the event row so concurrent joins/leaves of one event serialize
+        cursor.execute(LOCK_EVENT_SQL, (eventId,))
+        if cursor.fetchone() is None:
+            conn.rollback()
+            return jsonify({"message": "Event not found."}), 404
+        cursor.execute(IS_PARTICIPANT_SQL, (eventId, data['userId']))
+        already_joined = cursor.fetchone() is not None
+
         cursor.execute(sql, (
             data.get('sightingId'),
             data['userId'],
@@ -135,9 +297,13 @@ def join_event(eventId):
             data.get('notes', ''),
             data.get('time')
         ))
-        cursor.execute(update_sql, (eventId,))
+        report_id = cursor.lastrowid
+        # participantCount counts distinct users, so only a first join bumps it
+        if not already_joined:
+            cursor.execute(update_sql, (eventId,))
         conn.commit()
-        return jsonify({"message": "Successfully joined event.", "reportId": cursor.lastrowid}), 201
+        response_cache.invalidate("events")
+        return jsonify({"message": "Successfully joined event.", "reportId": report_id}), 201
     except Error as e:
         return jsonify({
             "message": "Database connection failed. Check if your MySQL server is running and accessible.",
@@ -153,15 +319,20 @@ def join_event(eventId):
 def leave_event(eventId):
     data = request.get_json()
     sql = "DELETE FROM Reports WHERE eventId = %s AND userId = %s"
-    update_sql = "UPDATE Events SET participantCount = participantCount - 1 WHERE eventId = %s"
+    update_sql = "UPDATE Events SET participantCount = GREATEST(participantCount - 1, 0) WHERE eventId = %s"
     conn = None
     cursor = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
+        cursor.execute(LOCK_EVENT_SQL, (eventId,))
+        cursor.fetchone()
         cursor.execute(sql, (eventId, data['userId']))
-        cursor.execute(update_sql, (eventId,))
+        # only a user who actually had reports for the event was counted
+        if cursor.rowcount > 0:
+            cursor.execute(update_sql, (eventId,))
         conn.commit()
+        response_cache.invalidate("events")
         return jsonify({"message": "Successfully left event."})
     except Error as e:
         return jsonify({
@@ -184,6 +355,7 @@ def delete_event(eventId):
         cursor = conn.cursor()
         cursor.execute(sql, (eventId,))
         conn.commit()
+        response_cache.invalidate("events")
         return jsonify({"message": "Event deleted successfully."})
     except Error as e:
         return jsonify({
@@ -194,4 +366,18 @@ def delete_event(eventId):
         if cursor:
             cursor.close()
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+@events_bp.route("/api/events/reconcile", methods=["POST"])   # Repair participantCount drift now
+def reconcile_events():
+    try:
+        _, error = authenticate_admin("Only admins can reconcile participant counts")
+        if error:
+            return error
+        fixed = reconcile_participant_counts()
+        return jsonify({"message": "Participant counts reconciled.", "eventsFixed": fixed})
+    except Error as e:
+        return jsonify({
+            "message": "Database connection failed. Check if your MySQL server is running and accessible.",
+            "error": str(e)
+        }), 500
@@ -0,0 +1,176 @@
+import math
+import os
+
+METERS_PER_MILE = 1609.34
+# ST_Distance_Sphere's default radius, so the box and the exact check agree
+EARTH_RADIUS_MILES = 6370986 / METERS_PER_MILE
+# widen the box slightly so rounding never drops a point right on the circle
+BOX_MARGIN = 1.001
+
+# Set SIGHTING_SPATIAL_INDEX=1 once the geo_point column + SPATIAL index from
+# spatial_index.txt exist; the box prefilter then goes through the R-tree.
+USE_SPATIAL_INDEX = os.environ.get("SIGHTING_SPATIAL_INDEX", "0") == "1"
+
+
+def bounding_box(lat, lng, range_miles):
+    """Lat/lng box that fully contains the circle of `range_miles` around a point.
+
+    Returns (min_lat, max_lat, min_lng, max_lng). Near the poles or across the
+    antimeridian the longitude span falls back to the whole [-180, 180] range.
+    """
+    lat = float(lat)
+    lng = float(lng)
+    angular = float(range_miles) * BOX_MARGIN / EARTH_RADIUS_MILES
+    d_lat = math.degrees(angular)
+
+    min_lat = lat - d_lat
+    max_lat = lat + d_lat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+
+    # widest longitude span of the circle (at its tangent latitude)
+    sin_ratio = math.sin(angular) / math.cos(math.radians(lat))
+    if sin_ratio >= 1:
+        return min_lat, max_lat, -180.0, 180.0
+    d_lng = math.degrees(math.asin(sin_ratio))
+    min_lng = lng - d_lng
+    max_lng = lng + d_lng
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def haversine_miles(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * math.asin(math.sqrt(a))
+
+
+def _box_polygon_wkt(min_lat, max_lat, min_lng, max_lng):
+    # SRID 4326 uses latitude-longitude axis order in WKT
+    corners = [(min_lat, min_lng), (max_lat, min_lng), (max_lat, max_lng),
+               (min_lat, max_lng), (min_lat, min_lng)]
+    return "POLYGON((" + ", ".join(f"{a} {b}" for a, b in corners) + "))"
+
+
+def radius_where(lat, lng, range_miles, alias="s"):
+    """WHERE fragment + params selecting rows of `alias` within range_miles.
+
+    The bounding box comes first as plain range predicates on
+    latitude/longitude (or an MBRContains on the spatial column), which the
+    indexes can serve; the exact spherical distance is only evaluated for the
+    rows inside the box.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, range_miles)
+
+    if USE_SPATIAL_INDEX:
+        box_sql = f"MBRContains(ST_GeomFromText(%s, 4326), {alias}.geo_point)"
+        params = [_box_polygon_wkt(min_lat, max_lat, min_lng, max_lng)]
+    else:
+        box_sql = (f"{alias}.latitude BETWEEN %s AND %s"
+                   f" AND {alias}.longitude BETWEEN %s AND %s")
+        params = [min_lat, max_lat, min_lng, max_lng]
+
+    sql = f"""
+        {box_sql}
+        AND (ST_Distance_Sphere(
+            POINT(%s, %s),
+            POINT({alias}.longitude, {alias}.latitude)
+        ) / {METERS_PER_MILE}) <= %s
+    """
+    params += [lng, lat, range_miles]
+    return sql, params
+
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash(lat, lng, precision):
+    """Standard base-32 geohash of a point (what MySQL's ST_GeoHash returns)."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    lat = float(lat)
+    lng = float(lng)
+    chars = []
+    code = 0
+    for bit in range(precision * 5):
+        if bit % 2 == 0:
+            mid = (lng_lo + lng_hi) / 2
+            if lng >= mid:
+                code = code * 2 + 1
+                lng_lo = mid
+            else:
+                code *= 2
+                lng_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                code = code * 2 + 1
+                lat_lo = mid
+            else:
+                code *= 2
+                lat_hi = mid
+        if bit % 5 == 4:
+            chars.append(GEOHASH_ALPHABET[code])
+            code = 0
+    return "".join(chars)
+
+
+def geohash_box(cell):
+    """(min_lat, max_lat, min_lng, max_lng) of a geohash cell."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lng_lo, lng_hi = -180.0, 180.0
+    even = True
+    for char in cell:
+        code = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            bit = (code >> shift) & 1
+            if even:
+                mid = (lng_lo + lng_hi) / 2
+                if bit:
+                    lng_lo = mid
+                else:
+                    lng_hi = mid
+            else:
+                mid = (lat_lo + lat_hi) / 2
+                if bit:
+                    lat_lo = mid
+                else:
+                    lat_hi = mid
+            even = not even
+    return lat_lo, lat_hi, lng_lo, lng_hi
+
+
+def box_distance_miles(lat, lng, box):
+    """(nearest, farthest) distance in miles from a point to a lat/lng box.
+
+    Along a parallel the distance only grows with the longitude gap, so the
+    extremes lie on a meridian: the box's two edges, or the point's own
+    meridian/antimeridian where the box spans them. Along a meridian,
+    cos(distance) is a sinusoid in latitude, so the candidates there are the
+    corners and its stationary points.
+    """
+    min_lat, max_lat, min_lng, max_lng = box
+    lat = float(lat)
+    lng = float(lng)
+    half_width = (max_lng - min_lng) / 2
+    center_gap = abs(((min_lng + max_lng) / 2 - lng + 180) % 360 - 180)
+
+    meridians = [min_lng, max_lng]
+    inside_lng = center_gap <= half_width
+    if inside_lng:
+        meridians.append(lng)
+    if center_gap >= 180 - half_width:
+        meridians.append(lng + 180)
+
+    phi = math.radians(lat)
+    distances = []
+    for meridian in meridians:
+        peak = math.degrees(math.atan2(math.sin(phi), math.cos(phi) * math.cos(math.radians(meridian - lng))))
+        for candidate in (min_lat, max_lat, peak, peak - 180, peak + 180):
+            if min_lat <= candidate <= max_lat:
+                distances.append(haversine_miles(lat, lng, candidate, meridian))
+
+    nearest = 0.0 if inside_lng and min_lat <= lat <= max_lat else min(distances)
+    return nearest, max(distances)
@@ -0,0 +1,47 @@
+# Production server: gunicorn -c gunicorn.conf.py   (run from backend/)
+#
+# The app is imported once in the master (Pokémon catalog and, with
+# SIGHTING_INDEX=1, the sighting index are loaded there and shared
+# copy-on-write), then forked into `workers` processes. Each worker opens its
+# own DB pool and HTTP clients in post_fork. The geocode, weather and
+# response caches have an SQLite tier under backend/cache/ that all workers
+# read and write, so a lookup made by one worker is a hit for the others.
+#
+# The sighting index and Pokémon catalog are per worker after the fork. Each
+# sighting write is applied to the writing worker's index and appended to a
+# shared change log (backend/cache/sighting_changes.sqlite3); the other
+# workers replay the new entries before their next search. A worker further
+# behind than SIGHTING_CHANGE_LOG_RETENTION (default 3600 s) searches MySQL
+# until a background reload catches it up. /api/pokemon/catalog/reload bumps a
+# generation in the shared response cache and the other workers' catalogs
+# reload on their next lookup.
+import multiprocessing
+import os
+
+# read by backend.py at import time
+os.environ["POKESIGHT_PREFORK"] = "1"
+
+wsgi_app = "backend:app"
+bind = os.environ.get("BIND", "0.0.0.0:5001")
+preload_app = True
+
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+# DB_POOL_SIZE is per worker and should be at least `threads`
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = 30
+keepalive = 5
+# recycle workers now and then to bound memory growth
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = max_requests // 10
+
+
+def when_ready(server):
+    # connections the master opened while preloading must not leak into the workers
+    import backend
+    backend.db_pool.close_all()
+
+
+def post_fork(server, worker):
+    import backend
+    backend.after_fork()
@@ -0,0 +1,228 @@
+"""Bulk loader for the Kaggle datasets the app is built on.
+
+    python load_datasets.py pokemon   pokemon_go.csv   # -> Pokemon, StatsCP
+    python load_datasets.py sightings 300k.csv         # -> Location, Sighting
+
+- pokemon:   https://www.kaggle.com/datasets/shreyasur965/pokemon-go
+- sightings: https://www.kaggle.com/datasets/semioniy/predictemall
+
+CSVs are streamed row by row and written in chunks of multi-row INSERT IGNORE
+statements, one transaction per chunk. After every chunk the number of rows
+done is saved to a checkpoint file, so re-running the same command after an
+interruption skips what's already loaded. Sighting ids are derived from the
+file and row number, so replaying a chunk is harmless.
+
+Connection settings come from MYSQL_HOST / MYSQL_USER / MYSQL_PASSWORD /
+MYSQL_DATABASE (or the matching --host/--user/... flags). With --sqlite PATH
+the rows go into an embedded database for STORAGE_BACKEND=sqlite instead.
+"""
+import argparse
+import ast
+import csv
+import json
+import os
+import sys
+import time
+
+import mysql.connector
+
+from bulk_sql import insert_many, chunked
+
+
+POKEMON_COLUMNS = ("pokemon_id", "pokemon_name", "base_attack", "base_defense",
+                   "base_stamina", "type", "rarity")
+STATSCP_COLUMNS = ("base_attack", "base_defense", "base_stamina", "max_cp")
+LOCATION_COLUMNS = ("longitude", "latitude", "city", "population_density", "closeToWater")
+SIGHTING_COLUMNS = ("sightingId", "pokemon_id", "longitude", "latitude", "appearedTimeOfDay",
+                    "weather", "temperature", "windSpeed")
+
+
+def _int(value):
+    return int(float(value)) if value not in (None, "") else None
+
+
+def _float(value):
+    return float(value) if value not in (None, "") else None
+
+
+def _bool(value):
+    return str(value).strip().lower() in ("true", "1", "yes")
+
+
+def _type_list(value):
+    # the dataset stores types as a Python list literal, e.g. "['Grass', 'Poison']";
+    # the API splits Pokemon.type on commas
+    value = (value or "").strip()
+    if value.startswith("["):
+        try:
+            return ",".join(str(t).strip() for t in ast.literal_eval(value))
+        except (ValueError, SyntaxError):
+            pass
+    return value
+
+
+def pokemon_rows(row):
+    """Map one pokemon-go CSV row to ({table: row}) for Pokemon and StatsCP."""
+    stats = (_int(row.get("base_attack")), _int(row.get("base_defense")),
+             _int(row.get("base_stamina")))
+    out = {
+        "Pokemon": (_int(row["pokemon_id"]), row.get("pokemon_name"), *stats,
+                    _type_list(row.get("type")), row.get("rarity")),
+    }
+    max_cp = _int(row.get("max_cp"))
+    if max_cp is not None and None not in stats:
+        out["StatsCP"] = (*stats, max_cp)
+    return out
+
+
+def sighting_rows(row, sighting_id):
+    """Map one predictemall CSV row to rows for Location and Sighting."""
+    longitude = _float(row["longitude"])
+    latitude = _float(row["latitude"])
+    return {
+        "Location": (longitude, latitude, row.get("city") or "Unknown",
+                     _float(row.get("population_density")) or 0, _bool(row.get("closeToWater"))),
+        "Sighting": (sighting_id, _int(row["pokemonId"]), longitude, latitude,
+                     row.get("appearedTimeOfDay"), row.get("weather"),
+                     _float(row.get("temperature")), _float(row.get("windSpeed"))),
+    }
+
+
+DATASETS = {
+    "pokemon": {
+        # parents first so FK checks pass within a chunk
+        "tables": [("StatsCP", STATSCP_COLUMNS), ("Pokemon", POKEMON_COLUMNS)],
+        "map": lambda row, source, n: pokemon_rows(row),
+    },
+    "sightings": {
+        "tables": [("Location", LOCATION_COLUMNS), ("Sighting", SIGHTING_COLUMNS)],
+        "map": lambda row, source, n: sighting_rows(row, row.get("_id") or f"{source}-{n}"),
+    },
+}
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    # write-then-rename so a crash never leaves a half-written checkpoint
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+
+def iter_csv(path, skip):
+    """Stream (row_number, row) from a CSV, skipping rows already loaded."""
+    with open(path, newline="", encoding="utf-8") as f:
+        for n, row in enumerate(csv.DictReader(f)):
+            if n >= skip:
+                yield n, row
+
+
+def load(conn, dataset, path, chunk_size=5000, checkpoint_path=None, restart=False,
+         disable_checks=False):
+    spec = DATASETS[dataset]
+    source = os.path.splitext(os.path.basename(path))[0]
+    key = f"{dataset}:{os.path.abspath(path)}"
+
+    checkpoint = {} if checkpoint_path is None else load_checkpoint(checkpoint_path)
+    done = 0 if restart else checkpoint.get(key, {}).get("rows_done", 0)
+    if done:
+        print(f"Resuming {dataset} from row {done}")
+
+    cursor = conn.cursor()
+    if disable_checks:
+        cursor.execute("SET SESSION unique_checks = 0")
+        cursor.execute("SET SESSION foreign_key_checks = 0")
+
+    # the last table is the dataset's own (Sighting, Pokemon); the others are parents
+    main_table = spec["tables"][-1][0]
+    started = time.monotonic()
+    loaded = 0
+    skipped = 0
+    ignored = 0  # main-table rows INSERT IGNORE dropped (duplicate key or FK violation)
+    try:
+        for chunk in chunked(iter_csv(path, done), chunk_size):
+            rows = {table: [] for table, _ in spec["tables"]}
+            for n, row in chunk:
+                try:
+                    mapped = spec["map"](row, source, n)
+                except (KeyError, ValueError, TypeError):
+                    skipped += 1
+                    continue
+                for table, values in mapped.items():
+                    rows[table].append(values)
+
+            for table, columns in spec["tables"]:
+                inserted = insert_many(cursor, table, columns, rows[table], verb="INSERT IGNORE")
+                if table == main_table:
+                    loaded += inserted
+                    ignored += len(rows[table]) - inserted
+            conn.commit()
+
+            done = chunk[-1][0] + 1
+            if checkpoint_path is not None:
+                checkpoint[key] = {"rows_done": done, "updated_at": time.time()}
+                save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.monotonic() - started
+            print(f"{dataset}: {done} rows read, {loaded} inserted, {ignored} ignored "
+                  f"({loaded / elapsed:,.0f} rows/s)", flush=True)
+    finally:
+        cursor.close()
+
+    elapsed = time.monotonic() - started
+    rate = loaded / elapsed if elapsed > 0 else 0
+    print(f"Done: {loaded} {main_table} rows inserted from {path} in {elapsed:.1f}s "
+          f"({rate:,.0f} rows/s, {skipped} malformed rows skipped, "
+          f"{ignored} rows ignored as duplicates or foreign key violations)")
+    return loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load the Pokémon GO Kaggle datasets into MySQL.")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("csv_path")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--checkpoint", default="load_checkpoint.json",
+                        help="progress file used to resume (default: %(default)s)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start over")
+    parser.add_argument("--disable-checks", action="store_true",
+                        help="turn off unique/foreign key checks for the session (staging loads)")
+    parser.add_argument("--host", default=os.environ.get("MYSQL_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MYSQL_PORT", 3306)))
+    parser.add_argument("--user", default=os.environ.get("MYSQL_USER", "root"))
+    parser.add_argument("--password", default=os.environ.get("MYSQL_PASSWORD", ""))
+    parser.add_argument("--database", default=os.environ.get("MYSQL_DATABASE"))
+    parser.add_argument("--sqlite", metavar="PATH",
+                        help="load into this SQLite file (created if missing) instead of MySQL")
+    args = parser.parse_args(argv)
+    if args.sqlite and args.disable_checks:
+        parser.error("--disable-checks only applies to MySQL")
+
+    if args.sqlite:
+        from sqlite_storage import SQLiteConnection, init_schema
+        init_schema(args.sqlite)
+        conn = SQLiteConnection(args.sqlite)
+    else:
+        conn = mysql.connector.connect(host=args.host, port=args.port, user=args.user,
+                                       password=args.password, database=args.database)
+    try:
+        load(conn, args.dataset, args.csv_path, chunk_size=args.chunk_size,
+             checkpoint_path=args.checkpoint, restart=args.restart,
+             disable_checks=args.disable_checks)
+    except KeyboardInterrupt:
+        print("Interrupted; re-run the same command to resume.", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
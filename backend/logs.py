@@ -0,0 +1,65 @@
+"""Leveled, sampled, structured (one JSON object per line) logging.
+
+    logger = get_logger(__name__)
+    log_event(logger, logging.DEBUG, "species_search", city=city, rows=len(rows))
+
+LOG_LEVEL sets the threshold (default INFO). Debug events are also sampled
+at LOG_DEBUG_SAMPLE_RATE (default 1%) so turning on debug logging in
+production doesn't flood stdout; warnings and errors are always written.
+"""
+import json
+import logging
+import os
+import random
+import sys
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", 0.01))
+
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            "pid": record.process,
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_logger(name):
+    global _configured
+    if not _configured:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(JsonFormatter())
+        root = logging.getLogger("pokesight")
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+        _configured = True
+    return logging.getLogger("pokesight." + name)
+
+
+def log_event(logger, level, event, sample=None, exc_info=False, **fields):
+    """Log `event` with structured fields.
+
+    `sample` is the fraction of calls kept (defaults to LOG_DEBUG_SAMPLE_RATE
+    for debug events, 1 otherwise); kept events record their sample_rate.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = sample if sample is not None else (
+        LOG_DEBUG_SAMPLE_RATE if level <= logging.DEBUG else 1.0)
+    if rate < 1.0:
+        if random.random() >= rate:
+            return
+        fields["sample_rate"] = rate
+    logger.log(level, event, extra={"fields": fields}, exc_info=exc_info)
+
@@ -1,16 +1,87 @@
 import googlemaps
 import os
 
-# Load API key from environment variable
-gmaps = googlemaps.Client(key=os.environ.get("GOOGLE_MAPS_API_KEY", ""))
+import metrics
+from cache import TTLCache, DiskCache
 
-def geocode_city(city):
-    geocode_result = gmaps.geocode(city)
+GEOCODE_TIMEOUT = float(os.environ.get("GEOCODE_TIMEOUT", 5))
+# found cities basically never move; "not found" may be a typo that gets fixed upstream
+GEOCODE_TTL = float(os.environ.get("GEOCODE_CACHE_TTL", 30 * 24 * 3600))
+GEOCODE_NEGATIVE_TTL = float(os.environ.get("GEOCODE_NEGATIVE_TTL", 3600))
+GEOCODE_CACHE_PATH = os.environ.get(
+    "GEOCODE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "geocode.sqlite3"),
+)
+
+# tier 1: in-process LRU, tier 2: on-disk store that survives restarts
+geocode_memory_cache = TTLCache(
+    maxsize=int(os.environ.get("GEOCODE_LRU_SIZE", 1024)), ttl=GEOCODE_TTL)
+geocode_disk_cache = DiskCache(GEOCODE_CACHE_PATH, table="geocode")
+
+_gmaps = None
+
+
+def get_gmaps_client():
+    """Create the Google Maps client on first use."""
+    global _gmaps
+    if _gmaps is None:
+        # Load API key from environment variable
+        _gmaps = googlemaps.Client(
+            key=os.environ.get("GOOGLE_MAPS_API_KEY", ""), timeout=GEOCODE_TIMEOUT)
+    return _gmaps
+
+
+def reset_gmaps_client():
+    """Drop the client (and its HTTP session) so a forked worker opens its own."""
+    global _gmaps
+    _gmaps = None
+
+
+def normalize_city(city):
+    """Cache key for a city string: case/whitespace-insensitive."""
+    return " ".join((city or "").lower().split())
+
+
+def cached_geocode(key):
+    """(lat, lng) from the memory or disk tier, or None on a miss."""
+    cached = geocode_memory_cache.get(key)
+    if cached is None:
+        cached = geocode_disk_cache.get(key)
+        if cached is not None:
+            ttl = GEOCODE_TTL if cached[0] is not None else GEOCODE_NEGATIVE_TTL
+            geocode_memory_cache.set(key, tuple(cached), ttl=ttl)
+    return tuple(cached) if cached is not None else None
+
+
+def store_geocode(key, geocode_result):
+    """Cache a raw geocoder result in both tiers and return its (lat, lng)."""
     if geocode_result:
         location = geocode_result[0]['geometry']['location']
-        return location['lat'], location['lng']
+        result = (location['lat'], location['lng'])
+        ttl = GEOCODE_TTL
     else:
-        return None, None
+        result = (None, None)
+        ttl = GEOCODE_NEGATIVE_TTL
+
+    geocode_memory_cache.set(key, result, ttl=ttl)
+    geocode_disk_cache.set(key, list(result), ttl)
+    return result
 
 
+@metrics.timed("geocode_api")
+def _geocode_api(city):
+    return get_gmaps_client().geocode(city)
+
+
+# cache hits included; the upstream share is recorded as geocode_api
+@metrics.timed("geocode")
+def geocode_city(city):
+    key = normalize_city(city)
+    if not key:
+        return None, None
+
+    cached = cached_geocode(key)
+    if cached is not None:
+        return cached
 
+    return store_geocode(key, _geocode_api(city))
@@ -0,0 +1,319 @@
+"""In-process metrics, exposed in Prometheus text format at GET /metrics.
+
+- http_request_duration_seconds{method, route, status}: per-route latency
+- dependency_duration_seconds{dependency, phase}: db execute/fetch,
+  geocode and weather lookups (geocode_api/weather_api for the upstream
+  calls on a cache miss) and JSON encoding, wherever they happen
+- request_dependency_seconds{route, dependency}: the same time, summed per
+  request, so a slow route can be attributed to MySQL, geocoding or JSON
+- pool and cache gauges/counters come from collectors registered at startup
+
+Under a prefork server (POKESIGHT_PREFORK=1) each worker also writes its
+samples to METRICS_DIR every METRICS_FLUSH_SECONDS, and /metrics sums the
+files of all live workers, so any worker can answer a scrape.
+"""
+import contextvars
+import functools
+import glob
+import inspect
+import json
+import os
+import threading
+import time
+
+from flask import g, request
+from flask.json.provider import DefaultJSONProvider
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PROMETHEUS_MIMETYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_DIR = os.environ.get(
+    "METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "metrics"))
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+
+# per-request {dependency: seconds}; set by the request hooks, None outside requests
+_request_timings = contextvars.ContextVar("request_timings", default=None)
+_current_route = contextvars.ContextVar("current_route", default=None)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta = {}        # name -> (type, help)
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., sum, count]
+        self._collectors = []
+        self._ratios = []
+        self.shared_dir = None
+        self._next_flush = 0.0
+
+    def describe(self, name, kind, help_text):
+        self._meta[name] = (kind, help_text)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [0] * len(DEFAULT_BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(DEFAULT_BUCKETS):
+                if value <= bound:
+                    hist[i] += 1
+            hist[-2] += value
+            hist[-1] += 1
+        if self.shared_dir is not None and time.monotonic() >= self._next_flush:
+            self.flush()
+
+    def describe_ratio(self, name, help_text, counter, hit, miss, label="result"):
+        """Gauge `name` = hit / (hit + miss) of `counter`, per remaining label set.
+
+        Derived after merging workers, so it is the ratio of the sums rather
+        than a sum of per-worker ratios.
+        """
+        self._ratios.append((name, help_text, counter, hit, miss, label))
+
+    def _derive_ratios(self, samples, meta):
+        for name, help_text, counter, hit, miss, label in self._ratios:
+            totals = {}
+            for (sample_name, labels), value in list(samples.items()):
+                if sample_name != counter:
+                    continue
+                outcome = dict(labels).get(label)
+                rest = tuple(pair for pair in labels if pair[0] != label)
+                hits_misses = totals.setdefault(rest, [0, 0])
+                if outcome == hit:
+                    hits_misses[0] += value
+                elif outcome == miss:
+                    hits_misses[1] += value
+            for rest, (hits, misses) in totals.items():
+                samples[(name, rest)] = hits / (hits + misses) if hits + misses else 0.0
+            meta[name] = ("gauge", help_text)
+
+    def reset(self):
+        """Drop recorded samples, e.g. ones a forked worker inherited from the master."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def register_collector(self, fn):
+        """fn() -> iterable of (name, kind, help, labels dict, value), read at scrape time."""
+        self._collectors.append(fn)
+
+    def snapshot(self):
+        """This process's samples as plain JSON-able data."""
+        meta = dict(self._meta)
+        gauges = []
+        for collector in self._collectors:
+            for name, kind, help_text, labels, value in collector():
+                meta[name] = (kind, help_text)
+                gauges.append([name, sorted(labels.items()), value])
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, list(labels), list(hist)] for (name, labels), hist in self._histograms.items()]
+        return {"meta": meta, "counters": counters + gauges, "histograms": histograms}
+
+    def flush(self):
+        """Write this worker's snapshot for the others to merge (prefork mode)."""
+        self._next_flush = time.monotonic() + METRICS_FLUSH_SECONDS
+        path = os.path.join(self.shared_dir, f"{os.getpid()}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _merged(self):
+        if self.shared_dir is None:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.shared_dir, "*.json")):
+            pid = int(os.path.basename(path).split(".")[0])
+            if not _alive(pid):
+                # a recycled worker; Prometheus treats the drop like a counter reset
+                _remove(path)
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def render(self):
+        meta = {}
+        samples = {}
+        histograms = {}
+        for snap in self._merged():
+            meta.update(snap["meta"])
+            for name, labels, value in snap["counters"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                samples[key] = samples.get(key, 0) + value
+            for name, labels, hist in snap["histograms"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.get(key)
+                histograms[key] = hist if merged is None else [a + b for a, b in zip(merged, hist)]
+
+        self._derive_ratios(samples, meta)
+
+        lines = []
+        for name in sorted(meta):
+            kind, help_text = meta[name]
+            series = [(k, v) for k, v in samples.items() if k[0] == name]
+            hists = [(k, v) for k, v in histograms.items() if k[0] == name]
+            if not series and not hists:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (_, labels), value in sorted(series):
+                lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            for (_, labels), hist in sorted(hists):
+                # observe() already counts into every bucket >= value, i.e. cumulatively
+                for bound, count in zip(DEFAULT_BUCKETS, hist):
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+                lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {hist[-1]}")
+                lines.append(f"{name}_sum{_labels(labels)} {_number(hist[-2])}")
+                lines.append(f"{name}_count{_labels(labels)} {hist[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+registry = Registry()
+registry.describe("http_request_duration_seconds", "histogram", "Request latency by route")
+registry.describe("dependency_duration_seconds", "histogram",
+                  "Time spent in MySQL, geocoding, weather lookups and JSON encoding")
+registry.describe("request_dependency_seconds", "histogram",
+                  "Per-request time spent in each dependency, by route")
+
+
+def enable_shared(directory=METRICS_DIR):
+    """Merge metrics across worker processes through files in `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    registry.shared_dir = directory
+
+
+def record(dependency, seconds, phase=""):
+    """Account `seconds` spent in a dependency, globally and for the current request."""
+    registry.observe("dependency_duration_seconds", seconds, dependency=dependency, phase=phase)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[dependency] = timings.get(dependency, 0.0) + seconds
+
+
+def timed(dependency, phase=""):
+    """Decorator recording a function's (or coroutine's) wall time under `dependency`."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    record(dependency, time.perf_counter() - start, phase)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(dependency, time.perf_counter() - start, phase)
+        return wrapper
+    return decorator
+
+
+def start_request(route=None):
+    """Begin a request's dependency breakdown; returns the token for finish_request."""
+    return _request_timings.set({}), _current_route.set(route), time.perf_counter()
+
+
+def finish_request(token, method, route, status):
+    reset_token, route_token, start = token
+    timings = _request_timings.get() or {}
+    _request_timings.reset(reset_token)
+    _current_route.reset(route_token)
+    registry.observe("http_request_duration_seconds", time.perf_counter() - start,
+                     method=method, route=route, status=str(status))
+    for dependency, seconds in timings.items():
+        registry.observe("request_dependency_seconds", seconds, route=route, dependency=dependency)
+
+
+def current_route():
+    """Route of the request being served on this thread/task, or None."""
+    return _current_route.get()
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, with encoding time recorded as the "json" dependency."""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            record("json", time.perf_counter() - start, "encode")
+
+
+def instrument_app(app):
+    """Install the request hooks and the timed JSON provider on a Flask app."""
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_token = start_request(
+            request.url_rule.rule if request.url_rule is not None else None)
+
+    @app.teardown_request
+    def _metrics_finish(exc):
+        token = g.pop("_metrics_token", None)
+        if token is None:
+            return
+        rule = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        status = g.pop("_metrics_status", 500 if exc is not None else 200)
+        finish_request(token, request.method, rule, status)
+
+    @app.after_request
+    def _metrics_status(response):
+        g._metrics_status = response.status_code
+        return response
+
@@ -1,11 +1,29 @@
 from flask import request, jsonify
 from mysql.connector import Error
+from pagination import (PAGE_ARGS, parse_page_args, keyset_where, order_by_sql, page_response,
+                        stream_rows)
+from response_cache import cached_response, response_cache
+from auth import authenticate, invalidate_identity
 
 
 def register_organization_routes(app, get_connection):
 
     @app.route("/api/organizations", methods=["GET"])
+    @cached_response("organizations", args=PAGE_ARGS)
     def get_organizations():
+        # optional ?limit=&after= keyset pagination or ?stream=1
+        try:
+            page = parse_page_args(request.args, cursor_types=(str,))
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        order_by = [("o.organizationName", "ASC")]
+        where = ""
+        params = []
+        if page.paginated and page.after is not None:
+            keyset_sql, params = keyset_where(order_by, page.after)
+            where = "WHERE " + keyset_sql
+
         conn = None
         cursor = None
 
@@ -13,18 +31,29 @@ def register_organization_routes(app, get_connection):
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
 
-            sql = """
+            sql = f"""
                 SELECT 
                     o.organizationName,
                     COUNT(u.userId) AS memberCount
                 FROM Organizations o
                 LEFT JOIN User u
                     ON u.organizationName = o.organizationName
+                {where}
                 GROUP BY o.organizationName
-                ORDER BY o.organizationName;
+                ORDER BY {order_by_sql(order_by)}
             """
-
-            cursor.execute(sql)
+            if page.paginated:
+                sql += " LIMIT %s"
+                params.append(page.limit + 1)
+
+            cursor.execute(sql, params)
+            if page.paginated:
+                return page_response(cursor.fetchall(), page,
+                                     lambda row: [row["organizationName"]])
+            if page.stream:
+                response = stream_rows(conn, cursor)
+                conn = cursor = None  # closed by the stream when it finishes
+                return response
             orgs = cursor.fetchall()
             return jsonify(orgs)
 
@@ -74,6 +103,7 @@ def register_organization_routes(app, get_connection):
                 (organization_name,)
             )
             conn.commit()
+            response_cache.invalidate("organizations")
 
             return jsonify({
                 "message": "Organization created successfully",
@@ -99,27 +129,20 @@ def register_organization_routes(app, get_connection):
         orgName = orgName.strip()
 
         data = request.get_json(silent=True) or {}
-        user_id = data.get("userId")
-
-        if not user_id:
-            return jsonify({"message": "userId is required"}), 400
 
         conn = None
         cursor = None
 
         try:
-            conn = get_connection()
-            cursor = conn.cursor(dictionary=True)
-            cursor.execute(
-                "SELECT userId, role FROM User WHERE userId = %s;",
-                (user_id,)
-            )
-            user_row = cursor.fetchone()
-            if not user_row:
-                return jsonify({"message": "Requesting user not found"}), 404
+            # session token (or legacy userId) -> cached identity, no User query
+            user, error = authenticate(data.get("userId"), not_found="Requesting user not found")
+            if error:
+                return error
 
-            is_admin = (user_row.get("role") == "admin")
+            is_admin = (user.get("role") == "admin")
 
+            conn = get_connection()
+            cursor = conn.cursor(dictionary=True)
             cursor.execute(
                 "SELECT organizationName FROM Organizations WHERE organizationName = %s;",
                 (orgName,)
@@ -154,6 +177,7 @@ def register_organization_routes(app, get_connection):
                     (orgName,)
                 )
                 conn.commit()
+                response_cache.invalidate("organizations", "events")
 
                 return jsonify({
                     "message": "Organization deleted successfully",
@@ -181,6 +205,8 @@ def register_organization_routes(app, get_connection):
             )
 
             conn.commit()
+            response_cache.invalidate("organizations", "events")
+            invalidate_identity()
 
             return jsonify({
                 "message": "Organization deleted by admin. All members were removed from this organization.",
@@ -202,6 +228,7 @@ def register_organization_routes(app, get_connection):
 
 
     @app.route("/api/user/<userId>/organization", methods=["GET"])
+    @cached_response("organizations")
     def get_user_organization(userId):
         """
         Get the organization for a specific user.
@@ -252,17 +279,14 @@ def register_organization_routes(app, get_connection):
         cursor = None
 
         try:
+            # users can only move themselves
+            user, error = authenticate(userId)
+            if error:
+                return error
+
             conn = get_connection()
             cursor = conn.cursor(dictionary=True)
 
-            cursor.execute(
-                "SELECT userId FROM User WHERE userId = %s;",
-                (userId,)
-            )
-            user = cursor.fetchone()
-            if not user:
-                return jsonify({"message": "User not found"}), 404
-
             if new_org != "default":
                 cursor.execute(
                     "SELECT organizationName FROM Organizations WHERE organizationName = %s;",
@@ -276,9 +300,11 @@ def register_organization_routes(app, get_connection):
 
             cursor.execute(
                 "UPDATE User SET organizationName = %s WHERE userId = %s;",
-                (new_org, userId)
+                (new_org, user["userId"])
             )
             conn.commit()
+            response_cache.invalidate("organizations")
+            invalidate_identity(user["userId"])
 
             return jsonify({
                 "message": "User left organization" if leaving else "User organization updated successfully",
@@ -0,0 +1,179 @@
+import base64
+import json
+import os
+
+from flask import Response, current_app, jsonify, stream_with_context
+
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 1000))
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", 500))
+# query parameters read by parse_page_args
+PAGE_ARGS = ("limit", "after", "stream")
+# cursor_types entry for a column that can be NULL (e.g. a time)
+NULLABLE_TEXT = (str, type(None))
+
+
+class PageArgs:
+    """Opt-in paging/streaming options read from a request.
+
+    limit  -> page size (keyset pagination); responses become
+              {"items": [...], "nextCursor": <token or null>}
+    after  -> opaque cursor from a previous page's nextCursor
+    stream -> stream the full result as a chunked JSON array
+    """
+
+    def __init__(self, limit=None, after=None, stream=False):
+        self.limit = limit
+        self.after = after
+        self.stream = stream
+
+    @property
+    def paginated(self):
+        return self.limit is not None
+
+
+def _truthy(value):
+    return value is True or str(value).lower() in ("1", "true", "yes")
+
+
+def parse_page_args(source, cursor_types=None):
+    """Read limit/after/stream from a dict (JSON body) or request.args.
+
+    cursor_types gives the type (or tuple of types) of each ORDER BY column;
+    a cursor of another length or with values of other types, e.g. one from
+    a different endpoint, is malformed. Raises ValueError on a malformed
+    limit or cursor.
+    """
+    source = source or {}
+    limit = source.get("limit")
+    if limit is not None and limit != "":
+        limit = int(limit)
+        if limit <= 0:
+            raise ValueError("limit must be a positive integer")
+        limit = min(limit, MAX_PAGE_SIZE)
+    else:
+        limit = None
+
+    after = source.get("after")
+    after = decode_cursor(after) if after else None
+    if after is not None and cursor_types is not None and (
+            len(after) != len(cursor_types)
+            or not all(isinstance(value, types) for value, types in zip(after, cursor_types))):
+        raise ValueError("Invalid cursor")
+    return PageArgs(limit=limit, after=after, stream=_truthy(source.get("stream", False)))
+
+
+def encode_cursor(values):
+    raw = json.dumps([v if isinstance(v, (int, float, str)) or v is None else str(v)
+                      for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def keyset_where(order_by, after):
+    """WHERE fragment + params selecting rows strictly after `after`.
+
+    order_by is a list of (column expression, "ASC" | "DESC") matching the
+    query's ORDER BY; the last column must make the ordering unique. Cursor
+    values may be None: NULLs sort first in ASC and last in DESC, as in MySQL
+    (and SQLite). For a NOT NULL column the optimizer drops the IS NULL terms.
+    """
+    if len(after) != len(order_by):
+        raise ValueError("Invalid cursor")
+    clauses = []
+    params = []
+    for i, (column, direction) in enumerate(order_by):
+        value = after[i]
+        descending = direction.upper() == "DESC"
+        if value is None:
+            if descending:
+                continue  # nothing sorts after a NULL
+            beyond = f"{column} IS NOT NULL"
+        elif descending:
+            beyond = f"({column} < %s OR {column} IS NULL)"
+        else:
+            beyond = f"{column} > %s"
+        parts = [f"{prev} IS NULL" if prev_value is None else f"{prev} = %s"
+                 for (prev, _), prev_value in zip(order_by[:i], after[:i])]
+        parts.append(beyond)
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(v for v in after[:i + 1] if v is not None)
+    if not clauses:
+        return "FALSE", params
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def order_by_sql(order_by):
+    return ", ".join(f"{column} {direction}" for column, direction in order_by)
+
+
+def split_page(rows, page, cursor_key):
+    """(page rows, next cursor or None) from rows fetched with LIMIT page.limit + 1."""
+    has_more = len(rows) > page.limit
+    rows = rows[:page.limit]
+    next_cursor = encode_cursor(cursor_key(rows[-1])) if has_more and rows else None
+    return rows, next_cursor
+
+
+def page_response(rows, page, cursor_key):
+    """jsonify a page fetched with LIMIT page.limit + 1."""
+    rows, next_cursor = split_page(rows, page, cursor_key)
+    return jsonify({"items": rows, "nextCursor": next_cursor})
+
+
+def paginate_list(rows, page, sort_key):
+    """Keyset-paginate an in-memory list sorted by sort_key (ascending).
+
+    Returns (page rows, next cursor or None).
+    """
+    rows = sorted(rows, key=sort_key)
+    if page.after is not None:
+        after = tuple(page.after)
+        rows = [row for row in rows if tuple(sort_key(row)) > after]
+    return split_page(rows[:page.limit + 1], page, lambda row: list(sort_key(row)))
+
+
+def stream_rows(conn, cursor, batch_size=STREAM_BATCH_SIZE):
+    """Stream an executed query's rows as a JSON array using fetchmany.
+
+    Takes ownership of the connection and cursor and closes them when the
+    response finishes, so callers must not close them themselves. That
+    includes a response closed before its body was read (client gone, HEAD).
+    """
+    dumps = current_app.json.dumps
+    closed = []
+
+    def close():
+        if not closed:
+            closed.append(True)
+            cursor.close()
+            conn.close()
+
+    def generate():
+        try:
+            yield "["
+            first = True
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                chunk = ",".join(dumps(row) for row in rows)
+                yield chunk if first else "," + chunk
+                first = False
+            yield "]"
+        finally:
+            # back to the pool as soon as the last row is out
+            close()
+
+    response = Response(stream_with_context(generate()), mimetype="application/json")
+    response.call_on_close(close)
+    return response
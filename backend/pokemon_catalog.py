@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from mysql.connector import Error
+
+from logs import get_logger, log_event
+
+logger = get_logger(__name__)
+
+# response_cache namespace bumped by invalidate()
+GENERATION_NAMESPACE = "pokemon"
+
+
+def collation_key(value):
+    """Comparison key for text filters matching MySQL's default collation:
+    case-insensitive, trailing spaces ignored (PAD SPACE)."""
+    return (value or "").rstrip(" ").casefold()
+
+
+class PokemonCatalog:
+    """In-memory copy of Pokemon + StatsCP, indexed by id and by name.
+
+    The table is small and almost never changes, so it is loaded once and
+    served from memory. It is reloaded on demand (reload()) or, when
+    `reload_interval` is set, in the background by the first lookup after it
+    goes stale; lookups keep using the previous copy meanwhile.
+    Pokémon without a StatsCP row are kept with max_cp = None.
+
+    With `generations` (the shared response_cache, for a prefork server), a
+    copy also goes stale when any process calls invalidate().
+    """
+
+    def __init__(self, get_connection, reload_interval=0, generations=None):
+        self.get_connection = get_connection
+        self.reload_interval = reload_interval
+        self.generations = generations
+        self._generation = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._by_id = {}
+        self._by_name = {}
+        self._details = {}  # pokemon_id -> (response dict, etag)
+        self._refreshing = False
+        self.loaded_at = None
+
+    def reload(self):
+        generation = self._current_generation()
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT p.pokemon_id, p.pokemon_name, p.type, p.rarity,
+                       p.base_attack, p.base_defense, p.base_stamina, scp.max_cp
+                FROM Pokemon p
+                LEFT JOIN StatsCP scp
+                    ON p.base_attack = scp.base_attack
+                    AND p.base_defense = scp.base_defense
+                    AND p.base_stamina = scp.base_stamina
+            """)
+            rows = cursor.fetchall()
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+        by_id = {}
+        by_name = {}
+        details = {}
+        for row in rows:
+            by_id[row["pokemon_id"]] = row
+            if row["pokemon_name"]:
+                # MySQL compares names case-insensitively; keep the first like LIMIT 1 did
+                by_name.setdefault(collation_key(row["pokemon_name"]), row)
+            if row["max_cp"] is not None:
+                details[row["pokemon_id"]] = self._build_details(row)
+
+        with self._lock:
+            self._by_id = by_id
+            self._by_name = by_name
+            self._details = details
+            self._generation = generation
+            self.loaded_at = time.monotonic()
+        return len(by_id)
+
+    def _current_generation(self):
+        if self.generations is None:
+            return None
+        return self.generations.generation(GENERATION_NAMESPACE)
+
+    def invalidate(self):
+        """Mark every process's copy stale, e.g. before reloading after Pokemon/StatsCP changes."""
+        if self.generations is not None:
+            self.generations.invalidate(GENERATION_NAMESPACE)
+
+    @staticmethod
+    def _build_details(row):
+        response = {
+            "name": row["pokemon_name"],
+            "type": row.get("type", "").split(",") if row.get("type") else [],
+            "rarity": row.get("rarity", ""),
+            "baseAttack": row.get("base_attack", 0),
+            "baseDefense": row.get("base_defense", 0),
+            "baseStamina": row.get("base_stamina", 0),
+            "maxCP": row.get("max_cp", 0)
+        }
+        body = json.dumps(response, sort_keys=True, default=str).encode()
+        return response, hashlib.sha1(body).hexdigest()
+
+    def _refresh(self):
+        try:
+            self.reload()
+        except Error as e:
+            # keep serving the previous copy if a periodic reload fails
+            log_event(logger, logging.WARNING, "pokemon_catalog_reload_failed", error=str(e))
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _ensure_fresh(self):
+        if self.loaded_at is None:
+            # nothing to serve yet: one caller loads it, concurrent ones wait for it
+            with self._load_lock:
+                if self.loaded_at is None:
+                    self.reload()
+            return
+        generation = self._current_generation()
+        with self._lock:
+            stale = generation != self._generation or (
+                self.reload_interval and time.monotonic() - self.loaded_at > self.reload_interval)
+            start_refresh = stale and not self._refreshing
+            if start_refresh:
+                self._refreshing = True
+        if start_refresh:
+            threading.Thread(target=self._refresh, name="pokemon-catalog-reload", daemon=True).start()
+
+    def snapshot(self):
+        """The current {pokemon_id: row} mapping, for tight loops over many lookups."""
+        self._ensure_fresh()
+        return self._by_id
+
+    def by_id(self, pokemon_id):
+        self._ensure_fresh()
+        return self._by_id.get(pokemon_id)
+
+    def by_name(self, name):
+        self._ensure_fresh()
+        return self._by_name.get(collation_key(name))
+
+    def details(self, name):
+        """(API details dict, etag) for a Pokémon name, or None.
+
+        Matches the old NATURAL JOIN lookup: Pokémon without CP stats are
+        treated as not found.
+        """
+        pokemon = self.by_name(name)
+        if pokemon is None:
+            return None
+        return self._details.get(pokemon["pokemon_id"])
+
+    def __len__(self):
+        return len(self._by_id)
@@ -0,0 +1,136 @@
+import functools
+import hashlib
+import os
+import threading
+import time
+
+from urllib.parse import urlencode
+
+from flask import request, current_app
+
+from cache import DiskCache, TTLCache
+
+
+class ResponseCache:
+    """Caches the serialized body of GET responses, grouped by namespace.
+
+    Write paths call invalidate(namespace) after they commit; every cached
+    response in that namespace is dropped. Entries also expire after `ttl`
+    seconds as a safety net for writes made outside the API.
+
+    With a `shared` DiskCache, bodies and invalidations are shared by every
+    worker process on the host: a write handled by one worker invalidates
+    the others, and a response rendered by one is served by all of them.
+    The in-process tier keeps at most `maxsize` entries (LRU).
+    """
+
+    def __init__(self, ttl=300.0, shared=None, maxsize=1024):
+        self.ttl = ttl
+        self.shared = shared
+        self._lock = threading.Lock()
+        # (namespace, key) -> (body, mimetype, etag, generation); entries of an
+        # invalidated namespace are skipped by their generation and age out of the LRU
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generations = {}  # namespace -> generation, changed on every invalidation
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, namespace):
+        """Token that changes whenever the namespace is invalidated (in any process)."""
+        if self.shared is not None:
+            return self.shared.get("generation:" + namespace, 0)
+        with self._lock:
+            return self._generations.get(namespace, 0)
+
+    def get(self, namespace, key):
+        """(body, mimetype, etag) of a current entry, or None."""
+        generation = self.generation(namespace)
+        entry = self._entries.get((namespace, key))
+        if entry is not None and entry[3] != generation:
+            entry = None
+        if entry is None and self.shared is not None:
+            stored = self.shared.get(f"response:{namespace}:{key}")
+            if stored is not None and stored["generation"] == generation:
+                entry = (stored["body"].encode(), stored["mimetype"], stored["etag"], generation)
+                self._entries.set((namespace, key), entry)
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[:3]
+
+    def put(self, namespace, key, body, mimetype, generation):
+        """Store a response unless the namespace was invalidated since `generation`."""
+        etag = hashlib.sha1(body).hexdigest()
+        if self.generation(namespace) != generation:
+            return etag
+        self._entries.set((namespace, key), (body, mimetype, etag, generation))
+        if self.shared is not None:
+            self.shared.set(f"response:{namespace}:{key}", {
+                "body": body.decode(), "mimetype": mimetype, "etag": etag,
+                "generation": generation}, self.ttl)
+        return etag
+
+    def invalidate(self, *namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                # wall-clock generations stay unique across processes without a shared counter
+                generation = max(time.time(), self._generations.get(namespace, 0) + 1e-6)
+                self._generations[namespace] = generation
+                if self.shared is not None:
+                    self.shared.set("generation:" + namespace, generation, INVALIDATION_TTL)
+
+
+# generations must outlive every entry stored under them
+INVALIDATION_TTL = 365 * 24 * 3600
+RESPONSE_CACHE_PATH = os.environ.get(
+    "RESPONSE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "responses.sqlite3"),
+)
+
+# RESPONSE_CACHE_SHARED=0 keeps the cache in-process only
+response_cache = ResponseCache(
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 300)),
+    maxsize=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+    shared=DiskCache(RESPONSE_CACHE_PATH, table="responses")
+    if os.environ.get("RESPONSE_CACHE_SHARED", "1") == "1" else None,
+)
+
+
+def _with_etag(body, mimetype, etag):
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype=mimetype)
+    response.set_etag(etag)
+    # let clients keep a copy but always revalidate it with If-None-Match
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def cached_response(namespace, args=()):
+    """Decorator for GET views: serve from response_cache, keyed by path + the query `args`.
+
+    `args` names the query parameters the view reads; other parameters don't
+    create new entries. Only complete 200 responses are cached (not streamed ones).
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*view_args, **kwargs):
+            query = [(name, request.args[name]) for name in args if name in request.args]
+            key = request.path + ("?" + urlencode(query) if query else "")
+            entry = response_cache.get(namespace, key)
+            if entry is not None:
+                return _with_etag(*entry)
+
+            generation = response_cache.generation(namespace)
+            response = current_app.make_response(view(*view_args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            body = response.get_data()
+            etag = response_cache.put(namespace, key, body, response.mimetype, generation)
+            return _with_etag(body, response.mimetype, etag)
+        return wrapper
+    return decorator
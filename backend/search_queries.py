@@ -0,0 +1,131 @@
+import math
+
+from geo import radius_where
+from pagination import order_by_sql
+from species_rollup import MIN_RANGE_MILES, cover, ranges_where
+
+# shared by the Flask views in backend.py and the async handlers in asgi.py;
+# where_in_range is the storage backend's radius_where (MySQL's by default).
+# Optional filters are NULL-tolerant predicates ("%s IS NULL OR ..."), so a
+# search has a fixed statement text whatever filters it uses, which the
+# pool keeps prepared per connection (cursor(prepared=True), db_pool.py).
+
+SIGHTINGS_ORDER_BY = [("s.sightingId", "ASC")]
+
+
+def parse_range(value):
+    """The search radius in miles as a float; ValueError unless it is a finite number >= 0."""
+    try:
+        range_miles = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("range must be a non-negative number")
+    if not (math.isfinite(range_miles) and range_miles >= 0):
+        raise ValueError("range must be a non-negative number")
+    return range_miles
+
+
+def parse_cp_bounds(minCP, maxCP):
+    """(minCP, maxCP) as floats (None/"" stay None); ValueError unless both are finite numbers."""
+    bounds = []
+    for value in (minCP, maxCP):
+        if value is None or value == "":
+            bounds.append(None)
+            continue
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("minCP and maxCP must be numbers")
+        if not math.isfinite(value):
+            raise ValueError("minCP and maxCP must be numbers")
+        bounds.append(value)
+    return tuple(bounds)
+
+
+def resolve_sightings_search(pokemon_catalog, name, minCP=None, maxCP=None):
+    """The catalog row to search sightings for, or None if nothing can match.
+
+    name -> pokemon_id and the CP bounds are resolved against the in-memory
+    catalog, so the sighting query itself never joins Pokemon/StatsCP.
+    The bounds come from parse_cp_bounds().
+    """
+    pokemon = pokemon_catalog.by_name(name)
+    if pokemon is None or pokemon["max_cp"] is None:
+        return None
+    if (minCP and pokemon["max_cp"] < minCP) or (maxCP and pokemon["max_cp"] > maxCP):
+        return None
+    return pokemon
+
+
+def _in_range_sql(lat, lng, range_miles, weather, where_in_range):
+    """WHERE fragment + params shared by the sighting searches: in range, optional weather."""
+    in_range, params = where_in_range(lat, lng, range_miles)
+    weather = weather or None
+    return f"{in_range} AND (%s IS NULL OR s.weather = %s)", params + [weather, weather]
+
+
+def sightings_search_sql(pokemon_id, lat, lng, range_miles, weather=None, page=None,
+                         where_in_range=radius_where):
+    """(sql, params) for /api/get_pokemon_sightings.
+
+    Two statement shapes: every match, or one keyset page (the first page
+    passes a NULL cursor).
+    """
+    where, params = _in_range_sql(lat, lng, range_miles, weather, where_in_range)
+    sql = f"""
+        SELECT s.sightingId as id, s.latitude, s.longitude, s.weather, s.appearedTimeOfDay
+        FROM Sighting s
+        WHERE s.pokemon_id = %s AND {where}
+    """
+    params = [pokemon_id] + params  # pokemon_id goes first
+    if page is not None and page.paginated:
+        if page.after is not None and len(page.after) != len(SIGHTINGS_ORDER_BY):
+            raise ValueError("Invalid cursor")
+        after = page.after[0] if page.after else None
+        sql += f" AND (%s IS NULL OR s.sightingId > %s) ORDER BY {order_by_sql(SIGHTINGS_ORDER_BY)} LIMIT %s"
+        params += [after, after, page.limit + 1]
+    return sql, params
+
+
+def species_search_sql(lat, lng, range_miles, weather=None, where_in_range=radius_where):
+    """(sql, params) for /api/get_pokemon: ids of the species seen in range.
+
+    Type, rarity and CP filters and the names come from the catalog
+    (species_rollup.species_names), so the statement never joins Pokemon
+    or StatsCP and has a single shape.
+    """
+    where, params = _in_range_sql(lat, lng, range_miles, weather, where_in_range)
+    sql = f"""
+        SELECT DISTINCT s.pokemon_id
+        FROM Sighting s
+        WHERE {where}
+    """
+    return sql, params
+
+
+def species_rollup_sql(lat, lng, range_miles, weather=None):
+    """(sql, params) for /api/get_pokemon answered from SpeciesCellRollup.
+
+    Rows are (cell, pokemon_id): cell is NULL for species seen inside the
+    circle, otherwise the edge cell species_rollup.species_names() still has
+    to check. Each covering range is a primary-key range scan. None if the
+    search is too small for the rollup (use species_search_sql).
+    """
+    if float(range_miles) < MIN_RANGE_MILES:
+        return None
+    inside, edge = cover(float(lat), float(lng), float(range_miles))
+
+    selects = []
+    params = []
+    # edge rows are few and deduplicated in Python; a DISTINCT there would
+    # make SQLite walk the whole primary key to get (cell, pokemon_id) order
+    for ranges, columns in ((inside, "DISTINCT NULL AS cell, r.pokemon_id"),
+                            (edge, "r.cell, r.pokemon_id")):
+        if not ranges:
+            continue
+        where, where_params = ranges_where(ranges)
+        if weather:
+            where += " AND r.weather = %s"
+            where_params.append(weather)
+        selects.append(f"SELECT {columns} FROM SpeciesCellRollup r WHERE {where}")
+        params += where_params
+    return " UNION ALL ".join(selects), params
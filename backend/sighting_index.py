@@ -0,0 +1,303 @@
+import logging
+import math
+import threading
+import time
+
+from mysql.connector import Error
+
+from geo import bounding_box, haversine_miles
+from logs import get_logger, log_event
+from pokemon_catalog import collation_key
+
+logger = get_logger(__name__)
+
+
+class SightingIndex:
+    """Memory-resident grid index over every Sighting, for radius searches.
+
+    Sightings are bucketed into square lat/lng cells of `cell_degrees`; a radius
+    query only visits the cells overlapping its bounding box and then applies
+    the exact distance. Pokémon attributes (name/type/rarity/max_cp) come from
+    the shared PokemonCatalog so the same filters as the SQL search path can
+    be applied.
+
+    Writes update the index in place. When several processes each hold a
+    copy (a prefork server), pass `changes`, a ChangeLog shared by all of
+    them: every write is also appended there, and each copy replays the
+    entries it hasn't applied yet before it answers a search. A copy that
+    fell further behind than the log's retention reports loaded == False, so
+    callers search MySQL instead, until a background reload (at most one per
+    `min_reload_interval` seconds) catches it up.
+    """
+
+    def __init__(self, catalog, cell_degrees=0.05, get_connection=None, changes=None,
+                 min_reload_interval=30.0):
+        self.catalog = catalog
+        self.cell_degrees = cell_degrees
+        self.get_connection = get_connection
+        self.changes = changes
+        self.min_reload_interval = min_reload_interval
+        self._lock = threading.RLock()
+        self._sightings = {}  # sightingId -> (lat, lng, pokemon_id, weather, appearedTimeOfDay)
+        self._cells = {}      # (cell_x, cell_y) -> set of sightingIds
+        self._loaded = False
+        self._seq = 0         # last change log entry applied
+        self._refreshing = False
+        self._reload_started = None
+
+    def _cell(self, lat, lng):
+        return (math.floor(lng / self.cell_degrees), math.floor(lat / self.cell_degrees))
+
+    def load(self, conn, batch_size=10000):
+        """Bulk-load every Sighting from MySQL."""
+        # read first: writes during the load are replayed from the log afterwards
+        seq = self.changes.last_seq() if self.changes is not None else 0
+        sightings = {}
+        cells = {}
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT sightingId, pokemon_id, latitude, longitude, weather, appearedTimeOfDay
+                FROM Sighting
+            """)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    lat = float(row["latitude"])
+                    lng = float(row["longitude"])
+                    sightings[row["sightingId"]] = (
+                        lat, lng, row["pokemon_id"], row["weather"], row["appearedTimeOfDay"])
+                    cells.setdefault(self._cell(lat, lng), set()).add(row["sightingId"])
+        finally:
+            cursor.close()
+
+        with self._lock:
+            self._sightings = sightings
+            self._cells = cells
+            # an unreadable log leaves the copy not loaded; a background reload retries
+            self._seq = seq or 0
+            self._loaded = seq is not None and self._catch_up()
+
+    def _catch_up(self):
+        """Replay the change log entries after self._seq; False if that isn't possible."""
+        if self.changes is None:
+            return True
+        with self._lock:
+            while True:
+                entries = self.changes.since(self._seq)
+                if entries is None:
+                    return False
+                for seq, ops in entries:
+                    self._apply_locked(ops)
+                    self._seq = seq
+                if not entries:
+                    return True
+
+    def _apply_locked(self, ops):
+        # entries may be replayed onto a copy that already has them; every op is idempotent
+        for op in ops:
+            if op[0] == "add":
+                self._add_locked(*op[1:])
+            elif op[0] == "remove":
+                self._remove_locked(op[1])
+            elif op[0] == "weather":
+                self._update_weather_locked(op[1], op[2])
+
+    def _publish(self, ops):
+        """Apply a write here and append it to the change log for the other copies."""
+        with self._lock:
+            self._apply_locked(ops)
+        if self.changes is None:
+            return
+        seq = self.changes.append(ops)
+        if seq is None:
+            log_event(logger, logging.WARNING, "sighting_index_change_not_logged", ops=len(ops))
+            return
+        with self._lock:
+            if seq == self._seq + 1:
+                # nothing from other processes in between
+                self._seq = seq
+            elif self._loaded and not self._catch_up():
+                self._loaded = False
+
+    def _refresh(self):
+        conn = None
+        try:
+            conn = self.get_connection()
+            self.load(conn)
+            log_event(logger, logging.INFO, "sighting_index_reloaded", sightings=len(self))
+        except Error as e:
+            # searches keep going to MySQL until a later reload succeeds
+            log_event(logger, logging.WARNING, "sighting_index_reload_failed", error=str(e))
+        finally:
+            if conn:
+                conn.close()
+            with self._lock:
+                self._refreshing = False
+
+    @property
+    def loaded(self):
+        """True if searches can use the index: loaded and caught up with the other processes' writes."""
+        if self.changes is None:
+            return self._loaded
+        if self._loaded:
+            last = self.changes.last_seq()
+            if last is not None and last == self._seq:
+                return True
+            with self._lock:
+                if last is not None and self._catch_up():
+                    return True
+                self._loaded = False
+        now = time.monotonic()
+        with self._lock:
+            start_refresh = (not self._refreshing and self.get_connection is not None
+                             and (self._reload_started is None
+                                  or now - self._reload_started >= self.min_reload_interval))
+            if start_refresh:
+                self._refreshing = True
+                self._reload_started = now
+        if start_refresh:
+            threading.Thread(target=self._refresh, name="sighting-index-reload", daemon=True).start()
+        return False
+
+    def _add_locked(self, sighting_id, pokemon_id, latitude, longitude, weather, appeared_time_of_day):
+        lat = float(latitude)
+        lng = float(longitude)
+        self._remove_locked(sighting_id)
+        self._sightings[sighting_id] = (lat, lng, pokemon_id, weather, appeared_time_of_day)
+        self._cells.setdefault(self._cell(lat, lng), set()).add(sighting_id)
+
+    def add(self, sighting_id, pokemon_id, latitude, longitude, weather, appeared_time_of_day):
+        self.add_many([(sighting_id, pokemon_id, latitude, longitude, weather, appeared_time_of_day)])
+
+    def add_many(self, rows):
+        """add() for (sightingId, pokemon_id, latitude, longitude, weather, appearedTimeOfDay) tuples."""
+        self._publish([("add", sighting_id, pokemon_id, float(latitude), float(longitude),
+                        weather, appeared_time_of_day)
+                       for sighting_id, pokemon_id, latitude, longitude, weather, appeared_time_of_day
+                       in rows])
+
+    def _update_weather_locked(self, sighting_id, weather):
+        record = self._sightings.get(sighting_id)
+        if record is not None:
+            self._sightings[sighting_id] = record[:3] + (weather,) + record[4:]
+
+    def update_weather(self, sighting_id, weather):
+        self._publish([("weather", sighting_id, weather)])
+
+    def remove(self, sighting_id):
+        self.remove_many([sighting_id])
+
+    def remove_many(self, sighting_ids):
+        self._publish([("remove", sighting_id) for sighting_id in sighting_ids])
+
+    def _remove_locked(self, sighting_id):
+        record = self._sightings.pop(sighting_id, None)
+        if record is None:
+            return
+        cell = self._cell(record[0], record[1])
+        bucket = self._cells.get(cell)
+        if bucket is not None:
+            bucket.discard(sighting_id)
+            if not bucket:
+                del self._cells[cell]
+
+    def __len__(self):
+        return len(self._sightings)
+
+    def _matches(self, pokemon, pokemon_id, weather, filters):
+        # text filters are collation keys (see _scan_box), like MySQL's case-insensitive `=`
+        if filters["weather"] and collation_key(weather) != filters["weather"]:
+            return False
+        info = pokemon.get(pokemon_id)
+        if info is None:
+            return False
+        if filters["name"] is not None and collation_key(info["pokemon_name"]) != filters["name"]:
+            return False
+        if filters["type"] and collation_key(info["type"]) != filters["type"]:
+            return False
+        if filters["rarity"] and collation_key(info["rarity"]) != filters["rarity"]:
+            return False
+        if filters["need_cp"]:
+            max_cp = info["max_cp"]
+            if max_cp is None:
+                return False
+            if filters["min_cp"] and max_cp < float(filters["min_cp"]):
+                return False
+            if filters["max_cp"] and max_cp > float(filters["max_cp"]):
+                return False
+        return True
+
+    def _scan(self, lat, lng, range_miles, filters):
+        lat = float(lat)
+        lng = float(lng)
+        range_miles = float(range_miles)
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, range_miles)
+
+        with self._lock:
+            for row in self._scan_box(min_lat, max_lat, min_lng, max_lng, filters):
+                if haversine_miles(lat, lng, row[1], row[2]) <= range_miles:
+                    yield row
+
+    def _scan_box(self, min_lat, max_lat, min_lng, max_lng, filters):
+        # caller holds self._lock
+        pokemon = self.catalog.snapshot()
+        filters = dict(filters)
+        for key in ("name", "type", "rarity", "weather"):
+            if filters[key] is not None:
+                filters[key] = collation_key(filters[key])
+        x0, y0 = self._cell(min_lat, min_lng)
+        x1, y1 = self._cell(max_lat, max_lng)
+
+        # visit whichever is smaller: the cells in the box or the non-empty cells
+        if (x1 - x0 + 1) * (y1 - y0 + 1) <= len(self._cells):
+            buckets = (self._cells.get((x, y)) for x in range(x0, x1 + 1)
+                       for y in range(y0, y1 + 1))
+        else:
+            buckets = (ids for (x, y), ids in self._cells.items()
+                       if x0 <= x <= x1 and y0 <= y <= y1)
+        for bucket in buckets:
+            if not bucket:
+                continue
+            for sighting_id in bucket:
+                s_lat, s_lng, pokemon_id, weather, time_of_day = self._sightings[sighting_id]
+                if not (min_lat <= s_lat <= max_lat and min_lng <= s_lng <= max_lng):
+                    continue
+                if not self._matches(pokemon, pokemon_id, weather, filters):
+                    continue
+                yield sighting_id, s_lat, s_lng, pokemon_id, weather, time_of_day
+
+    def sightings_in_box(self, min_lat, max_lat, min_lng, max_lng, name=None, weather=None):
+        """(lat, lng, weather, pokemon_name) for every sighting inside a lat/lng box."""
+        filters = {"name": name, "type": None, "rarity": None, "weather": weather,
+                   "min_cp": None, "max_cp": None, "need_cp": False}
+        with self._lock:
+            pokemon = self.catalog.snapshot()
+            return [(s_lat, s_lng, s_weather, pokemon[pokemon_id]["pokemon_name"])
+                    for _, s_lat, s_lng, pokemon_id, s_weather, _
+                    in self._scan_box(min_lat, max_lat, min_lng, max_lng, filters)]
+
+    def sightings_near(self, name, lat, lng, range_miles, weather=None, min_cp=None, max_cp=None):
+        """Same rows as /api/get_pokemon_sightings: one Pokémon's sightings in range."""
+        filters = {"name": name, "type": None, "rarity": None, "weather": weather,
+                   "min_cp": min_cp, "max_cp": max_cp, "need_cp": True}
+        return [
+            {"id": sighting_id, "latitude": s_lat, "longitude": s_lng,
+             "weather": s_weather, "appearedTimeOfDay": time_of_day}
+            for sighting_id, s_lat, s_lng, _, s_weather, time_of_day
+            in self._scan(lat, lng, range_miles, filters)
+        ]
+
+    def species_near(self, lat, lng, range_miles, pokemon_type=None, rarity=None,
+                     weather=None, min_cp=None, max_cp=None):
+        """Same rows as /api/get_pokemon: distinct Pokémon names seen in range."""
+        filters = {"name": None, "type": pokemon_type, "rarity": rarity, "weather": weather,
+                   "min_cp": min_cp, "max_cp": max_cp, "need_cp": bool(min_cp or max_cp)}
+        pokemon_ids = {pokemon_id for _, _, _, pokemon_id, _, _
+                       in self._scan(lat, lng, range_miles, filters)}
+        pokemon = self.catalog.snapshot()
+        names = sorted({pokemon[pokemon_id]["pokemon_name"] for pokemon_id in pokemon_ids},
+                       key=str.lower)
+        return [{"pokemon_name": name} for name in names]
@@ -1,16 +1,48 @@
+import json
 import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import requests
+import logging
 from flask import Blueprint, request, jsonify
 from mysql.connector import Error
+import metrics
+from cache import TTLCache, DiskCache, SingleFlight
+from logs import get_logger, log_event
+from weather_enrichment import enricher_from_env
+from bulk_sql import insert_many, chunked
+from clusters import (ClusterGrid, DEFAULT_CELL_PIXELS, capped_cell_degrees, cell_degrees,
+                      viewport_boxes)
+from pagination import (NULLABLE_TEXT, parse_page_args, keyset_where, order_by_sql, page_response,
+                        stream_rows)
+from auth import authenticate
+from response_cache import response_cache
 
 sightings_bp = Blueprint('sightings', __name__)
+logger = get_logger(__name__)
 
 get_connection = None
+sighting_index = None
+weather_enricher = None
+storage = None
 
-#for connection with backend.py
-def init_sightings(connection_func):
-    global get_connection
+#for connection with backend.py (store is the storage backend that runs the
+#create/delete transactions, sighting_index the optional in-memory index)
+def init_sightings(connection_func, store, index=None):
+    global get_connection, sighting_index, weather_enricher, storage
     get_connection = connection_func
+    storage = store
+    sighting_index = index
+    # WEATHER_ENRICHMENT=async moves the weather lookup off the request path
+    weather_enricher = enricher_from_env(
+        connection_func, fetch_weather_data, on_update=_on_weather_enriched)
+
+
+def _on_weather_enriched(sighting_id, weather_data):
+    if sighting_index is not None:
+        sighting_index.update_weather(sighting_id, weather_data['weather'])
 
 
 # Weather code to condition mapping for Open-Meteo API
@@ -24,29 +56,95 @@ WEATHER_CODE_MAP = {
     95: 'Thunderstorm', 96: 'Thunderstorm', 99: 'Thunderstorm',
 }
 
-#weather data fetching
+# Weather is cached per grid cell (~5 km at the default 0.05°) and time bucket,
+# and concurrent lookups for the same cell share one upstream request.
+WEATHER_CELL_DEGREES = float(os.environ.get("WEATHER_CACHE_CELL_DEGREES", 0.05))
+WEATHER_CACHE_TTL = float(os.environ.get("WEATHER_CACHE_TTL", 900))
+WEATHER_CACHE_PATH = os.environ.get(
+    "WEATHER_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "weather.sqlite3"),
+)
+# tier 1: in-process LRU, tier 2: on-disk store shared by all worker processes
+weather_cache = TTLCache(maxsize=int(os.environ.get("WEATHER_CACHE_SIZE", 4096)), ttl=WEATHER_CACHE_TTL)
+weather_disk_cache = DiskCache(WEATHER_CACHE_PATH, table="weather")
+weather_flight = SingleFlight()
+
+
+def weather_cell(latitude, longitude):
+    """Center of the grid cell a coordinate falls into."""
+    cell_lat = round(float(latitude) / WEATHER_CELL_DEGREES) * WEATHER_CELL_DEGREES
+    cell_lng = round(float(longitude) / WEATHER_CELL_DEGREES) * WEATHER_CELL_DEGREES
+    return round(cell_lat, 6), round(cell_lng, 6)
+
+
+def weather_cache_key(latitude, longitude):
+    """(cell_lat, cell_lng, time bucket): one upstream lookup per cell per WEATHER_CACHE_TTL."""
+    cell_lat, cell_lng = weather_cell(latitude, longitude)
+    return cell_lat, cell_lng, int(time.time() // WEATHER_CACHE_TTL)
+
+
+def weather_url(latitude, longitude):
+    return f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current=temperature_2m,weather_code,wind_speed_10m&temperature_unit=fahrenheit&wind_speed_unit=mph"
+
+
+def parse_weather_response(data):
+    current = data.get('current', {})
+    weather_code = current.get('weather_code', 0)
+    weather = WEATHER_CODE_MAP.get(weather_code, 'Clear')
+
+    temperature = current.get('temperature_2m', 70.0)
+
+    wind_speed = current.get('wind_speed_10m', 5.0)
+
+    return {
+        'weather': weather,
+        'temperature': round(temperature, 1),
+        'windSpeed': round(wind_speed, 1)
+    }
+
+
+def cached_weather(key):
+    """Weather for a weather_cache_key from the memory or disk tier, or None."""
+    weather = weather_cache.get(key)
+    if weather is None:
+        weather = weather_disk_cache.get("%s,%s,%s" % key)
+        if weather is not None:
+            weather_cache.set(key, weather)
+    return weather
+
+
+def store_weather(key, weather):
+    weather_cache.set(key, weather)
+    weather_disk_cache.set("%s,%s,%s" % key, weather, WEATHER_CACHE_TTL)
+
+
+#weather data fetching (cached)
+@metrics.timed("weather")
 def fetch_weather_data(latitude, longitude):
+    key = weather_cache_key(latitude, longitude)
+
+    weather = cached_weather(key)
+    if weather is not None:
+        return weather
+
+    def fetch():
+        result = fetch_weather_data_uncached(key[0], key[1])
+        if result is not None:
+            store_weather(key, result)
+        return result
+
+    return weather_flight.do(key, fetch)
+
+
+@metrics.timed("weather_api")
+def fetch_weather_data_uncached(latitude, longitude):
     try:
-        url = f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current=temperature_2m,weather_code,wind_speed_10m&temperature_unit=fahrenheit&wind_speed_unit=mph"
-        response = requests.get(url, timeout=5)
+        response = requests.get(weather_url(latitude, longitude), timeout=5)
         
         if response.status_code == 200:
-            data = response.json()
-            current = data.get('current', {})
-            weather_code = current.get('weather_code', 0)
-            weather = WEATHER_CODE_MAP.get(weather_code, 'Clear')
-            
-            temperature = current.get('temperature_2m', 70.0)
-            
-            wind_speed = current.get('wind_speed_10m', 5.0)
-            
-            return {
-                'weather': weather,
-                'temperature': round(temperature, 1),
-                'windSpeed': round(wind_speed, 1)
-            }
+            return parse_weather_response(response.json())
     except Exception as e:
-        print(f"Weather API error: {e}")
+        log_event(logger, logging.WARNING, "weather_api_error", error=str(e))
     
     return None
 
@@ -68,24 +166,49 @@ def get_time_of_day():
 
 @sightings_bp.route("/api/sightings/user/<userId>", methods=["GET"])
 def get_user_sightings(userId):
-    conn = None
-    cursor = None
+    # optional ?limit=&after= keyset pagination or ?stream=1
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
+        page = parse_page_args(request.args, cursor_types=(NULLABLE_TEXT, int))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    order_by = [("r.time", "DESC"), ("r.reportId", "DESC")]
+    where = "r.userId = %s"
+    params = [userId]
+    if page.paginated and page.after is not None:
+        keyset_sql, keyset_params = keyset_where(order_by, page.after)
+        where += " AND " + keyset_sql
+        params += keyset_params
+    sql = f"""
             SELECT s.*, p.pokemon_name as pokemonName, l.city as location, r.reportId, r.status, r.notes, r.time as reportTime
             FROM Reports r
             JOIN Sighting s ON r.sightingId = s.sightingId
             JOIN Pokemon p ON s.pokemon_id = p.pokemon_id
             LEFT JOIN Location l ON s.longitude = l.longitude AND s.latitude = l.latitude
-            WHERE r.userId = %s
-            ORDER BY r.time DESC
-        """, (userId,))
+            WHERE {where}
+            ORDER BY {order_by_sql(order_by)}
+        """
+    if page.paginated:
+        sql += " LIMIT %s"
+        params.append(page.limit + 1)
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(sql, params)
+        if page.paginated:
+            return page_response(cursor.fetchall(), page,
+                                 lambda row: [row["reportTime"], row["reportId"]])
+        if page.stream:
+            response = stream_rows(conn, cursor)
+            conn = cursor = None  # closed by the stream when it finishes
+            return response
         sightings = cursor.fetchall()
         return jsonify(sightings)
     except Error as e:
-        print(f"Error fetching user sightings: {e}")
+        log_event(logger, logging.ERROR, "user_sightings_failed", userId=userId, error=str(e))
         return jsonify({"message": "Failed to fetch user sightings", "error": str(e)}), 500
     finally:
         if cursor:
@@ -106,8 +229,12 @@ def create_sighting():
     if not pokemon_id or not user_id or longitude is None or latitude is None:
         return jsonify({"message": "pokemonId, userId, longitude, and latitude are required"}), 400
 
-    weather_data = fetch_weather_data(latitude, longitude)
-    
+    if weather_enricher is not None:
+        # saved with the client's weather (or a placeholder), fixed up in the background
+        weather_data = None
+    else:
+        weather_data = fetch_weather_data(latitude, longitude)
+
     if weather_data:
         weather = weather_data['weather']
         temperature = weather_data['temperature']
@@ -126,13 +253,17 @@ def create_sighting():
     cursor = None
     try:
         conn = get_connection()
-        cursor = conn.cursor()
 
-        # Call the stored procedure with transaction
-        args = (sighting_id, pokemon_id, longitude, latitude, appeared_time, 
-                weather, temperature, wind_speed, user_id, notes, 0)
-        result = cursor.callproc('CreateSightingWithReport', args)
-        report_id = result[-1]
+        # CreateSightingWithReport (a stored procedure on MySQL), one transaction
+        report_id = storage.create_sighting_with_report(
+            conn, sighting_id, pokemon_id, longitude, latitude, appeared_time,
+            weather, temperature, wind_speed, user_id, notes)
+
+        if sighting_index is not None:
+            sighting_index.add(sighting_id, pokemon_id, latitude, longitude, weather, appeared_time)
+
+        if weather_enricher is not None:
+            weather_enricher.submit(sighting_id, latitude, longitude)
 
         return jsonify({
             "message": "Sighting created successfully",
@@ -140,7 +271,7 @@ def create_sighting():
             "reportId": report_id
         })
     except Error as e:
-        print(f"Database error creating sighting: {e}")  #debug
+        log_event(logger, logging.ERROR, "create_sighting_failed", error=str(e))
         return jsonify({"message": "Failed to create sighting", "error": str(e)}), 500
     finally:
         if cursor:
@@ -148,28 +279,419 @@ def create_sighting():
         if conn:
             conn.close()
 
+SIGHTING_CLUSTER_MAX_CELLS = int(os.environ.get("SIGHTING_CLUSTER_MAX_CELLS", 4096))
+
+#map clusters: one aggregated marker per grid cell in the viewport
+@sightings_bp.route("/api/sightings/clusters", methods=["GET"])
+def get_sighting_clusters():
+    """Query: south, north, west, east, zoom, optional name, weather, cellPixels."""
+    args = request.args
+    try:
+        south = float(args["south"])
+        north = float(args["north"])
+        west = float(args["west"])
+        east = float(args["east"])
+        zoom = int(args.get("zoom", 10))
+        cell_pixels = int(args.get("cellPixels", DEFAULT_CELL_PIXELS))
+    except (KeyError, ValueError):
+        return jsonify({"message": "south, north, west, east (and an integer zoom) are required"}), 400
+    if south > north or not 0 <= zoom <= 22 or cell_pixels <= 0:
+        return jsonify({"message": "Invalid viewport"}), 400
+
+    name = args.get("name")
+    weather = args.get("weather")
+    boxes = viewport_boxes(south, north, west, east)
+    # a viewport much larger than the screen at this zoom gets a coarser grid
+    cell_deg = capped_cell_degrees(cell_degrees(zoom, cell_pixels), boxes, SIGHTING_CLUSTER_MAX_CELLS)
+    grid = ClusterGrid(cell_deg)
+
+    if sighting_index is not None and sighting_index.loaded:
+        for box in boxes:
+            for lat, lng, s_weather, pokemon_name in sighting_index.sightings_in_box(
+                    *box, name=name, weather=weather):
+                grid.add(lat, lng, s_weather, pokemon_name)
+        return jsonify({"zoom": zoom, "cellDegrees": cell_deg, "clusters": grid.clusters()})
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        for min_lat, max_lat, min_lng, max_lng in boxes:
+            # pre-aggregate per (cell, weather, species) in the database; the box is index-friendly
+            box_sql, box_params = storage.box_where(min_lat, max_lat, min_lng, max_lng)
+            filters = [box_sql]
+            params = [cell_deg, cell_deg] + box_params
+            if name:
+                filters.append("p.pokemon_name = %s")
+                params.append(name)
+            if weather:
+                filters.append("s.weather = %s")
+                params.append(weather)
+            cursor.execute(f"""
+                SELECT FLOOR(s.latitude / %s) AS cy, FLOOR(s.longitude / %s) AS cx,
+                       s.weather, p.pokemon_name,
+                       COUNT(*) AS n, SUM(s.latitude) AS sum_lat, SUM(s.longitude) AS sum_lng
+                FROM Sighting s
+                JOIN Pokemon p ON s.pokemon_id = p.pokemon_id
+                WHERE {" AND ".join(filters)}
+                GROUP BY cy, cx, s.weather, p.pokemon_name
+            """, params)
+            for row in cursor.fetchall():
+                n = row["n"]
+                sum_lat = float(row["sum_lat"])
+                sum_lng = float(row["sum_lng"])
+                grid.add(sum_lat / n, sum_lng / n, row["weather"], row["pokemon_name"],
+                         count=n, sum_lat=sum_lat, sum_lng=sum_lng)
+        return jsonify({"zoom": zoom, "cellDegrees": cell_deg, "clusters": grid.clusters()})
+    except Error as e:
+        return jsonify({"message": "Failed to fetch sighting clusters", "error": str(e)}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+SIGHTING_BATCH_CHUNK_SIZE = int(os.environ.get("SIGHTING_BATCH_CHUNK_SIZE", 500))
+SIGHTING_BATCH_MAX_ITEMS = int(os.environ.get("SIGHTING_BATCH_MAX_ITEMS", 10000))
+# concurrent upstream lookups for the weather cells of one batch (sync weather mode)
+SIGHTING_BATCH_WEATHER_CONCURRENCY = int(os.environ.get("SIGHTING_BATCH_WEATHER_CONCURRENCY", 8))
+
+SIGHTING_COLUMNS = ("sightingId", "pokemon_id", "longitude", "latitude", "appearedTimeOfDay",
+                    "weather", "temperature", "windSpeed")
+REPORT_COLUMNS = ("sightingId", "userId", "status", "notes", "time")
+LOCATION_COLUMNS = ("longitude", "latitude", "city", "population_density", "closeToWater")
+
+
+def _iter_batch_items():
+    """Yield (index, item) from a JSON array body or an NDJSON stream.
+
+    NDJSON is read line by line from the request stream, so a large upload is
+    never held in memory all at once. Unparseable lines yield (index, None).
+    """
+    content_type = (request.mimetype or "").lower()
+    if content_type in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+        index = 0
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = None
+            yield index, item
+            index += 1
+        return
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get("sightings")
+    if not isinstance(data, list):
+        raise ValueError("Body must be a JSON array of sightings (or NDJSON)")
+    for index, item in enumerate(data):
+        yield index, item
+
+
+def _prepare_batch_item(item):
+    """Validate one uploaded sighting and fill in the same defaults as create_sighting.
+
+    Items without weather get weather None here; _fill_batch_weather sets it.
+    """
+    if not isinstance(item, dict):
+        raise ValueError("Item is not a JSON object")
+    pokemon_id = item.get("pokemonId")
+    user_id = item.get("userId")
+    longitude = item.get("longitude")
+    latitude = item.get("latitude")
+    if not pokemon_id or not user_id or longitude is None or latitude is None:
+        raise ValueError("pokemonId, userId, longitude, and latitude are required")
+    # ids and report times are assigned here, as for single creates
+    if "sightingId" in item or "time" in item:
+        raise ValueError("sightingId and time are assigned by the server")
+    try:
+        float(latitude)
+        float(longitude)
+    except (TypeError, ValueError):
+        raise ValueError("latitude and longitude must be numbers")
+
+    # uploads usually carry their own (historical) weather; only look it up when missing
+    if item.get("weather"):
+        weather = item["weather"]
+        temperature = item.get("temperature", 70.0)
+        wind_speed = item.get("windSpeed", 5.0)
+    else:
+        weather = temperature = wind_speed = None
+
+    return {
+        "sightingId": str(uuid.uuid4()),
+        "pokemon_id": pokemon_id,
+        "userId": user_id,
+        "longitude": longitude,
+        "latitude": latitude,
+        "appearedTimeOfDay": item.get("appearedTimeOfDay") or get_time_of_day(),
+        "weather": weather,
+        "temperature": temperature,
+        "windSpeed": wind_speed,
+        "notes": item.get("notes", ""),
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "enrich": False,
+    }
+
+
+def _fill_batch_weather(rows):
+    """Set the weather of prepared rows that came without it.
+
+    With the async enricher the rows get the defaults and are enriched after
+    the insert. Otherwise each distinct weather cell is looked up once, with
+    up to SIGHTING_BATCH_WEATHER_CONCURRENCY lookups in flight, so a batch
+    waits for about one upstream round trip rather than one per cell.
+    """
+    missing = [row for row in rows if row["weather"] is None]
+    if not missing:
+        return
+    found = {}
+    if weather_enricher is None:
+        cells = {}
+        for row in missing:
+            cells.setdefault(weather_cell(row["latitude"], row["longitude"]), row)
+        workers = max(1, min(SIGHTING_BATCH_WEATHER_CONCURRENCY, len(cells)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-weather") as pool:
+            found = dict(zip(cells, pool.map(
+                lambda row: fetch_weather_data(row["latitude"], row["longitude"]), cells.values())))
+
+    for row in missing:
+        weather_data = found.get(weather_cell(row["latitude"], row["longitude"]))
+        if weather_data:
+            row["weather"] = weather_data['weather']
+            row["temperature"] = weather_data['temperature']
+            row["windSpeed"] = weather_data['windSpeed']
+        else:
+            row["weather"], row["temperature"], row["windSpeed"] = "Clear", 70.0, 5.0
+            row["enrich"] = weather_enricher is not None
+
+
+def _insert_sighting_chunk(conn, rows):
+    """Insert a chunk of prepared sightings in one transaction, set-based.
+
+    Mirrors CreateSightingWithReport: Location (if new), Sighting, then a
+    'confirmed' Report per sighting. Returns {sightingId: reportId}.
+    """
+    cursor = conn.cursor()
+    try:
+        locations = list({(r["longitude"], r["latitude"]): None for r in rows})
+        insert_many(cursor, "Location", LOCATION_COLUMNS,
+                    [(lng, lat, 'Unknown', 0, False) for lng, lat in locations],
+                    verb="INSERT IGNORE")
+        insert_many(cursor, "Sighting", SIGHTING_COLUMNS,
+                    [tuple(r[c] for c in SIGHTING_COLUMNS) for r in rows])
+        insert_many(cursor, "Reports", REPORT_COLUMNS,
+                    [(r["sightingId"], r["userId"], 'confirmed', r["notes"], r["time"]) for r in rows])
+
+        # auto-increment ids of a multi-row insert aren't guaranteed consecutive
+        ids = [r["sightingId"] for r in rows]
+        cursor.execute(
+            "SELECT sightingId, reportId FROM Reports WHERE sightingId IN ("
+            + ", ".join(["%s"] * len(ids)) + ")", ids)
+        report_ids = dict(cursor.fetchall())
+        conn.commit()
+        return report_ids
+    except Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+#bulk upload: JSON array or NDJSON, inserted in chunked multi-row transactions
+@sightings_bp.route("/api/sightings/batch", methods=["POST"])
+def create_sightings_batch():
+    started = time.monotonic()
+    results = []
+    pending = []
+
+    try:
+        for index, item in _iter_batch_items():
+            if index >= SIGHTING_BATCH_MAX_ITEMS:
+                return jsonify({"message": f"At most {SIGHTING_BATCH_MAX_ITEMS} sightings per batch"}), 413
+            try:
+                pending.append((index, _prepare_batch_item(item)))
+            except ValueError as e:
+                results.append({"index": index, "status": "error", "message": str(e)})
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    _fill_batch_weather([row for _, row in pending])
+
+    conn = None
+    try:
+        conn = get_connection()
+        for chunk in chunked(pending, SIGHTING_BATCH_CHUNK_SIZE):
+            try:
+                report_ids = _insert_sighting_chunk(conn, [row for _, row in chunk])
+                inserted = chunk
+            except Error:
+                # one bad row (e.g. unknown pokemonId/userId) fails the whole statement;
+                # retry the chunk row by row so only the bad items are reported
+                report_ids = {}
+                inserted = []
+                for index, row in chunk:
+                    try:
+                        report_ids.update(_insert_sighting_chunk(conn, [row]))
+                        inserted.append((index, row))
+                    except Error as e:
+                        results.append({"index": index, "status": "error", "message": str(e)})
+
+            for index, row in inserted:
+                results.append({
+                    "index": index,
+                    "status": "created",
+                    "sightingId": row["sightingId"],
+                    "reportId": report_ids.get(row["sightingId"]),
+                })
+                if row["enrich"]:
+                    weather_enricher.submit(row["sightingId"], row["latitude"], row["longitude"])
+            if sighting_index is not None and inserted:
+                sighting_index.add_many(
+                    (row["sightingId"], row["pokemon_id"], row["latitude"], row["longitude"],
+                     row["weather"], row["appearedTimeOfDay"]) for _, row in inserted)
+    except Error as e:
+        return jsonify({"message": "Failed to create sightings", "error": str(e)}), 500
+    finally:
+        if conn:
+            conn.close()
+
+    results.sort(key=lambda r: r["index"])
+    created = sum(1 for r in results if r["status"] == "created")
+    elapsed = time.monotonic() - started
+    return jsonify({
+        "message": f"Created {created} of {len(results)} sightings",
+        "created": created,
+        "failed": len(results) - created,
+        "elapsedMs": round(elapsed * 1000, 1),
+        "rowsPerSecond": round(created / elapsed, 1) if elapsed > 0 else None,
+        "results": results,
+    })
+
+#bulk delete: { "sightingIds": [...] } or { "all": true } for the sightings the user reported
+#(at most SIGHTING_BATCH_MAX_ITEMS per request; "hasMore" says to repeat it)
+@sightings_bp.route("/api/sightings/batch", methods=["DELETE"])
+def delete_sightings_batch():
+    started = time.monotonic()
+    data = request.get_json(silent=True) or {}
+    delete_all = data.get("all") is True
+    sighting_ids = data.get("sightingIds")
+    if not delete_all:
+        if not isinstance(sighting_ids, list) or not sighting_ids:
+            return jsonify({"message": "sightingIds (a non-empty list) or \"all\": true is required"}), 400
+        if len(sighting_ids) > SIGHTING_BATCH_MAX_ITEMS:
+            return jsonify({"message": f"At most {SIGHTING_BATCH_MAX_ITEMS} sightings per batch"}), 413
+        # one result per distinct id, in request order
+        sighting_ids = list(dict.fromkeys(str(sighting_id) for sighting_id in sighting_ids))
+
+    results = []
+    removed_count = 0
+    has_more = False
+    conn = None
+    cursor = None
+    try:
+        user, error = authenticate(data.get("userId"))
+        if error:
+            return error
+        user_id = user["userId"]
+
+        conn = get_connection()
+        cursor = conn.cursor()
+        if delete_all:
+            cursor.execute("""
+                SELECT DISTINCT sightingId FROM Reports
+                WHERE userId = %s AND sightingId IS NOT NULL
+                LIMIT %s
+            """, (user_id, SIGHTING_BATCH_MAX_ITEMS + 1))
+            sighting_ids = [row[0] for row in cursor.fetchall()]
+            has_more = len(sighting_ids) > SIGHTING_BATCH_MAX_ITEMS
+            sighting_ids = sighting_ids[:SIGHTING_BATCH_MAX_ITEMS]
+
+        for chunk in chunked(sighting_ids, SIGHTING_BATCH_CHUNK_SIZE):
+            try:
+                # tells the ids of other users' sightings (forbidden) from unknown ones
+                cursor.execute("SELECT sightingId FROM Sighting WHERE sightingId IN ("
+                               + ", ".join(["%s"] * len(chunk)) + ")", chunk)
+                existing = {row[0] for row in cursor.fetchall()}
+                deleted, removed = storage.delete_sightings(conn, user_id, chunk)
+            except Error as e:
+                conn.rollback()
+                # the chunk's transaction was rolled back; later chunks still run
+                results.extend({"sightingId": sighting_id, "status": "error", "message": str(e)}
+                               for sighting_id in chunk)
+                continue
+            for sighting_id in chunk:
+                if sighting_id in deleted:
+                    results.append({
+                        "sightingId": sighting_id,
+                        "status": "deleted",
+                        "message": f"{deleted[sighting_id]} sighting deleted",
+                        "sightingRemoved": sighting_id in removed,
+                    })
+                elif sighting_id in existing:
+                    results.append({"sightingId": sighting_id, "status": "forbidden",
+                                    "message": "You can only delete your own sighting reports"})
+                else:
+                    results.append({"sightingId": sighting_id, "status": "not_found",
+                                    "message": "Sighting not found"})
+            removed_count += len(removed)
+            if sighting_index is not None and removed:
+                sighting_index.remove_many(removed)
+    except Error as e:
+        return jsonify({"message": "Failed to delete sightings", "error": str(e)}), 500
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+    deleted_count = sum(1 for r in results if r["status"] == "deleted")
+    if deleted_count:
+        # event reports can carry a sightingId too
+        response_cache.invalidate("events")
+    return jsonify({
+        "message": f"Deleted {deleted_count} of {len(results)} sightings",
+        "deleted": deleted_count,
+        "failed": len(results) - deleted_count,
+        "sightingsRemoved": removed_count,
+        "hasMore": has_more,
+        "elapsedMs": round((time.monotonic() - started) * 1000, 1),
+        "results": results,
+    })
+
+
 #deleting sighting using transaction DeleteSightingWithCleanup
 @sightings_bp.route("/api/sightings/<sightingId>", methods=["DELETE"])
 def delete_sighting(sightingId):
-    data = request.get_json()
-    user_id = data.get("userId")
-
-    if not user_id:
-        return jsonify({"message": "userId is required"}), 400
+    data = request.get_json(silent=True) or {}
 
     conn = None
     cursor = None
     try:
+        user, error = authenticate(data.get("userId"))
+        if error:
+            return error
+        user_id = user["userId"]
+
         conn = get_connection()
-        cursor = conn.cursor()
 
-        # Call the stored procedure with transaction
-        args = (sightingId, user_id, False, '')
-        result = cursor.callproc('DeleteSightingWithCleanup', args)
-        success = result[2]  # p_success OUT parameter
-        message = result[3]  # p_message OUT parameter
+        # DeleteSightingWithCleanup (a stored procedure on MySQL), one transaction
+        success, message = storage.delete_sighting_with_cleanup(conn, sightingId, user_id)
 
         if success:
+            if sighting_index is not None:
+                cursor = conn.cursor()
+                # the procedure keeps the Sighting row if other users still report it
+                cursor.execute("SELECT 1 FROM Sighting WHERE sightingId = %s", (sightingId,))
+                if cursor.fetchone() is None:
+                    sighting_index.remove(sightingId)
+            # event reports can carry a sightingId too
+            response_cache.invalidate("events")
             return jsonify({"message": message})
         else:
             return jsonify({"message": message}), 403
@@ -180,3 +702,12 @@ def delete_sighting(sightingId):
             cursor.close()
         if conn:
             conn.close()
+
+
+@sightings_bp.route("/api/sightings/enrichment/stats", methods=["GET"])
+def weather_enrichment_stats():
+    if weather_enricher is None:
+        return jsonify({"mode": "sync"})
+    stats = weather_enricher.stats()
+    stats["mode"] = "async"
+    return jsonify(stats)
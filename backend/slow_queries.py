@@ -0,0 +1,149 @@
+import collections
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+import metrics
+from logs import get_logger, log_event
+
+logger = get_logger(__name__)
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"")
+_PLACEHOLDER = re.compile(r"%s|%\(\w+\)s")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_LISTS = re.compile(r"\(\?\+\)(?:\s*,\s*\(\?\+\))+")
+_WHITESPACE = re.compile(r"\s+")
+# statements on these tables carry credentials; their params are never kept
+_SENSITIVE_TABLES = re.compile(r"\bUser\b", re.IGNORECASE)
+
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE")
+
+
+def normalize_sql(sql):
+    """Statement shape: literals and placeholders become ?, value lists (?+), whitespace collapsed."""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    shape = _STRING.sub("?", sql)
+    shape = _PLACEHOLDER.sub("?", shape)
+    shape = _NUMBER.sub("?", shape)
+    shape = _VALUE_LIST.sub("(?+)", shape)
+    shape = _REPEATED_LISTS.sub("(?+), ...", shape)
+    return _WHITESPACE.sub(" ", shape).strip().rstrip(";")
+
+
+def _fingerprint(shape):
+    return hashlib.sha1(shape.encode()).hexdigest()[:12]
+
+
+def _short_repr(value, limit=500):
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _logged_params(shape, params):
+    if params and _SENSITIVE_TABLES.search(shape):
+        return "<redacted>"
+    return _short_repr(params)
+
+
+class SlowQueryLog:
+    """Bounded log of statements slower than `threshold_ms`.
+
+    Keeps the last `capacity` slow executions (shape, params, duration, rows)
+    plus per-shape totals. Params of statements on User are redacted. The
+    first time a shape is seen, the caller-supplied explain function runs
+    EXPLAIN for it and the plan is kept with the shape. A negative threshold
+    disables the log. The log is per process (per worker under gunicorn).
+    """
+
+    def __init__(self, threshold_ms=200.0, capacity=200, max_shapes=500):
+        self.threshold_ms = threshold_ms
+        self.max_shapes = max_shapes
+        self._lock = threading.Lock()
+        self._entries = collections.deque(maxlen=capacity)
+        self._shapes = collections.OrderedDict()  # fingerprint -> shape stats + plan
+
+    @property
+    def enabled(self):
+        return self.threshold_ms >= 0
+
+    def observe(self, sql, params, seconds, rows, explain=None, route=None):
+        """Record the statement if it ran over the threshold. Returns True if it did."""
+        duration_ms = seconds * 1000
+        if not self.enabled or duration_ms < self.threshold_ms:
+            return False
+
+        shape = normalize_sql(sql)
+        fingerprint = _fingerprint(shape)
+        with self._lock:
+            stats = self._shapes.get(fingerprint)
+            new_shape = stats is None
+            if new_shape:
+                stats = self._shapes[fingerprint] = {
+                    "fingerprint": fingerprint, "shape": shape, "count": 0,
+                    "totalMs": 0.0, "maxMs": 0.0, "explain": None}
+                while len(self._shapes) > self.max_shapes:
+                    self._shapes.popitem(last=False)
+            stats["count"] += 1
+            stats["totalMs"] = round(stats["totalMs"] + duration_ms, 2)
+            stats["maxMs"] = round(max(stats["maxMs"], duration_ms), 2)
+            self._entries.append({
+                "fingerprint": fingerprint,
+                "shape": shape,
+                "params": _logged_params(shape, params),
+                "durationMs": round(duration_ms, 2),
+                "rows": rows,
+                "route": route,
+                "at": time.time(),
+            })
+
+        metrics.registry.inc("slow_queries_total")
+        log_event(logger, logging.WARNING, "slow_query", fingerprint=fingerprint,
+                  duration_ms=round(duration_ms, 2), rows=rows, route=route)
+
+        if new_shape and explain is not None and shape.upper().startswith(EXPLAINABLE):
+            try:
+                plan = explain(sql, params)
+            except Exception as e:
+                plan = {"error": str(e)}
+            with self._lock:
+                stats["explain"] = plan
+        return True
+
+    def set_explain(self, sql, plan):
+        fingerprint = _fingerprint(normalize_sql(sql))
+        with self._lock:
+            if fingerprint in self._shapes:
+                self._shapes[fingerprint]["explain"] = plan
+
+    def needs_explain(self, sql):
+        """True if the shape has been logged but has no plan yet (for async callers)."""
+        shape = normalize_sql(sql)
+        with self._lock:
+            stats = self._shapes.get(_fingerprint(shape))
+            return (stats is not None and stats["explain"] is None
+                    and shape.upper().startswith(EXPLAINABLE))
+
+    def report(self):
+        with self._lock:
+            entries = list(reversed(self._entries))
+            shapes = sorted((dict(s) for s in self._shapes.values()),
+                            key=lambda s: s["totalMs"], reverse=True)
+        return {"thresholdMs": self.threshold_ms, "entries": entries, "shapes": shapes}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._shapes.clear()
+
+
+metrics.registry.describe("slow_queries_total", "counter", "Statements over SLOW_QUERY_THRESHOLD_MS")
+
+slow_query_log = SlowQueryLog(
+    threshold_ms=float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", 200)),
+    capacity=int(os.environ.get("SLOW_QUERY_LOG_SIZE", 200)),
+)
@@ -0,0 +1,226 @@
+"""Per-cell species rollup: what /api/get_pokemon reads instead of raw sightings.
+
+SpeciesCellRollup holds one row per (geohash cell, pokemon_id, weather,
+appearedTimeOfDay) with the number of sightings and when the last one was
+recorded. Triggers on Sighting keep it current, so every writer (the
+create/delete procedures, batch uploads, weather enrichment, the loaders)
+updates it in the same transaction; see species_rollup.txt for MySQL, the
+SQLite schema has the same triggers.
+
+A species search covers its circle with geohash cells, coarse ones in the
+middle and finer ones along the edge. Cells entirely inside the circle are
+read as primary-key prefix ranges; the edge cells come back per
+ROLLUP_PRECISION cell and are kept if they touch the circle, so results
+match the raw search to within one cell (~0.75 x 0.4 mi). Searches under
+SPECIES_ROLLUP_MIN_RANGE_MILES keep using the raw sightings.
+
+    python species_rollup.py rebuild                # MYSQL_* settings
+    python species_rollup.py rebuild --sqlite PATH
+
+rebuilds the table from Sighting (after a bulk load with the triggers
+missing, or to refresh lastSeen); run it with writes stopped.
+"""
+import argparse
+import collections
+import functools
+import os
+import sys
+import time
+
+import mysql.connector
+
+from geo import GEOHASH_ALPHABET, bounding_box, box_distance_miles, geohash, geohash_box
+from pokemon_catalog import collation_key
+
+# cell length stored in SpeciesCellRollup.cell; the triggers use the same value
+ROLLUP_PRECISION = 6
+MAX_COVER_CELLS = int(os.environ.get("SPECIES_ROLLUP_MAX_CELLS", 64))
+# below this the raw search is cheap anyway and an edge cell is a big share of the circle
+MIN_RANGE_MILES = float(os.environ.get("SPECIES_ROLLUP_MIN_RANGE_MILES", 2))
+# sorts after every cell; upper bound of the last range
+PAST_LAST_CELL = "z" * (ROLLUP_PRECISION + 1)
+
+REBUILD_SQL = [
+    "DELETE FROM SpeciesCellRollup",
+    f"""
+    INSERT INTO SpeciesCellRollup (cell, pokemon_id, weather, appearedTimeOfDay, sightingCount, lastSeen)
+    SELECT ST_GeoHash(s.longitude, s.latitude, {ROLLUP_PRECISION}), s.pokemon_id,
+           COALESCE(s.weather, ''), COALESCE(s.appearedTimeOfDay, ''), COUNT(*), MAX(r.firstReport)
+    FROM Sighting s
+    LEFT JOIN (
+        SELECT sightingId, MIN(time) AS firstReport FROM Reports GROUP BY sightingId
+    ) r ON r.sightingId = s.sightingId
+    GROUP BY 1, 2, 3, 4
+    """,
+]
+
+
+def _cells_in_box(precision, min_lat, max_lat, min_lng, max_lng):
+    lng_bits = (precision * 5 + 1) // 2
+    lat_bits = precision * 5 // 2
+    height = 180.0 / (1 << lat_bits)
+    width = 360.0 / (1 << lng_bits)
+    rows = range(int((min_lat + 90) // height), min(int((max_lat + 90) // height), (1 << lat_bits) - 1) + 1)
+    cols = range(int((min_lng + 180) // width), min(int((max_lng + 180) // width), (1 << lng_bits) - 1) + 1)
+    return len(rows) * len(cols), (
+        geohash(-90 + (y + 0.5) * height, -180 + (x + 0.5) * width, precision)
+        for y in rows for x in cols)
+
+
+def _prefix_range(prefix):
+    """[low, high) of the cells starting with `prefix`."""
+    chars = list(prefix)
+    while chars:
+        position = GEOHASH_ALPHABET.index(chars[-1])
+        if position + 1 < len(GEOHASH_ALPHABET):
+            chars[-1] = GEOHASH_ALPHABET[position + 1]
+            return prefix, "".join(chars)
+        chars.pop()
+    return prefix, PAST_LAST_CELL
+
+
+def _ranges(cells):
+    """Sorted, merged [low, high) ranges covering every cell under the given prefixes."""
+    merged = []
+    for low, high in sorted(_prefix_range(cell) for cell in cells):
+        if merged and merged[-1][1] >= low:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+@functools.lru_cache(maxsize=1024)
+def cover(lat, lng, range_miles, max_cells=MAX_COVER_CELLS):
+    """Geohash cells covering the circle: (inside, edge) lists of [low, high) ranges.
+
+    Starts from the finest precision at which the bounding box spans a
+    handful of cells and splits edge cells into their 32 children, coarsest
+    first, while the total stays under max_cells.
+    """
+    lat = float(lat)
+    lng = float(lng)
+    range_miles = float(range_miles)
+    box = bounding_box(lat, lng, range_miles)
+
+    precision = 1
+    while precision < ROLLUP_PRECISION and _cells_in_box(precision + 1, *box)[0] <= 16:
+        precision += 1
+
+    def classify(cells):
+        inside, edge = [], []
+        for cell in cells:
+            nearest, farthest = box_distance_miles(lat, lng, geohash_box(cell))
+            if nearest > range_miles:
+                continue
+            (inside if farthest <= range_miles else edge).append(cell)
+        return inside, edge
+
+    inside, pending = classify(_cells_in_box(precision, *box)[1])
+    pending = collections.deque(pending)
+    edge = []
+    while pending:
+        cell = pending.popleft()
+        if len(cell) < ROLLUP_PRECISION:
+            child_inside, child_edge = classify(cell + char for char in GEOHASH_ALPHABET)
+            total = len(inside) + len(edge) + len(pending) + len(child_inside) + len(child_edge)
+            if total <= max_cells:
+                inside += child_inside
+                pending.extend(child_edge)
+                continue
+        edge.append(cell)
+    return _ranges(inside), _ranges(edge)
+
+
+def ranges_where(ranges, column="r.cell"):
+    """(sql, params) matching `column` against [low, high) ranges."""
+    sql = " OR ".join([f"({column} >= %s AND {column} < %s)"] * len(ranges))
+    return f"({sql})", [value for low_high in ranges for value in low_high]
+
+
+def species_names(rows, lat, lng, range_miles, catalog, pokemon_type=None, rarity=None,
+                  min_cp=None, max_cp=None):
+    """Sorted [{"pokemon_name": ...}] from species_rollup_sql or species_search_sql rows.
+
+    Edge cells that don't touch the circle are dropped, and the Pokémon
+    filters are applied from the catalog, as SightingIndex.species_near does.
+    """
+    lat = float(lat)
+    lng = float(lng)
+    range_miles = float(range_miles)
+    pokemon = catalog.snapshot()
+    # p.type = %s / p.rarity = %s compared under MySQL's case-insensitive collation
+    pokemon_type = collation_key(pokemon_type) if pokemon_type else None
+    rarity = collation_key(rarity) if rarity else None
+    touches = {}
+    names = set()
+    for row in rows:
+        cell = row.get("cell")
+        if cell is not None:
+            if cell not in touches:
+                touches[cell] = box_distance_miles(lat, lng, geohash_box(cell))[0] <= range_miles
+            if not touches[cell]:
+                continue
+        info = pokemon.get(row["pokemon_id"])
+        if info is None:
+            continue
+        if pokemon_type and collation_key(info["type"]) != pokemon_type:
+            continue
+        if rarity and collation_key(info["rarity"]) != rarity:
+            continue
+        if min_cp or max_cp:
+            if info["max_cp"] is None:
+                continue
+            if min_cp and info["max_cp"] < float(min_cp):
+                continue
+            if max_cp and info["max_cp"] > float(max_cp):
+                continue
+        names.add(info["pokemon_name"])
+    return [{"pokemon_name": name} for name in sorted(names, key=str.lower)]
+
+
+def rebuild(conn):
+    """Recompute SpeciesCellRollup from Sighting in one transaction; returns its row count."""
+    cursor = conn.cursor()
+    try:
+        for statement in REBUILD_SQL:
+            cursor.execute(statement)
+        count = cursor.rowcount
+        conn.commit()
+        return count
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the SpeciesCellRollup table from Sighting.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--host", default=os.environ.get("MYSQL_HOST", "localhost"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("MYSQL_PORT", 3306)))
+    parser.add_argument("--user", default=os.environ.get("MYSQL_USER", "root"))
+    parser.add_argument("--password", default=os.environ.get("MYSQL_PASSWORD", ""))
+    parser.add_argument("--database", default=os.environ.get("MYSQL_DATABASE"))
+    parser.add_argument("--sqlite", metavar="PATH", help="rebuild in this SQLite file instead of MySQL")
+    args = parser.parse_args(argv)
+
+    if args.sqlite:
+        from sqlite_storage import SQLiteConnection, init_schema
+        init_schema(args.sqlite)
+        conn = SQLiteConnection(args.sqlite)
+    else:
+        conn = mysql.connector.connect(host=args.host, port=args.port, user=args.user,
+                                       password=args.password, database=args.database)
+    started = time.monotonic()
+    try:
+        count = rebuild(conn)
+    finally:
+        conn.close()
+    print(f"SpeciesCellRollup rebuilt: {count} rows in {time.monotonic() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,462 @@
+"""Embedded storage: every table in one SQLite file (STORAGE_BACKEND=sqlite).
+
+For small deployments and edge nodes: no database server, no network round
+trip. SQLITE_PATH (default backend/data/pokesight.sqlite3) is created with
+the full schema on first start.
+
+Connections are wrapped to look like the mysql.connector ones the routes
+already use: %s placeholders, dictionary cursors, mysql.connector.Error
+exceptions, and an implicit transaction that the first write (or SELECT ...
+FOR UPDATE) opens with BEGIN IMMEDIATE and commit()/rollback() end. The
+few MySQL spellings in the app's SQL are rewritten by translate_sql().
+
+Sighting coordinates are mirrored into an R*Tree by triggers, so every writer
+keeps it current and radius/box searches probe the tree instead of scanning
+Sighting. The tree is keyed by Sighting's rowid, which VACUUM may renumber:
+run rebuild_spatial_index() after one. The SpeciesCellRollup triggers call
+ST_GeoHash, which only the app's connections define, so write to Sighting
+through SQLiteConnection rather than the sqlite3 shell.
+"""
+import contextlib
+import datetime
+import decimal
+import functools
+import logging
+import math
+import os
+import re
+import sqlite3
+
+from mysql.connector import Error
+from mysql.connector import errors as mysql_errors
+
+from db_pool import pool_from_env
+from geo import bounding_box, geohash, haversine_miles
+from logs import get_logger, log_event
+from species_rollup import rebuild as rebuild_species_rollup
+from storage import Storage
+
+logger = get_logger(__name__)
+
+SQLITE_PATH = os.environ.get(
+    "SQLITE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "pokesight.sqlite3"),
+)
+SQLITE_BUSY_TIMEOUT = float(os.environ.get("SQLITE_BUSY_TIMEOUT", 5))
+
+# MySQL compares strings case-insensitively by default; NOCASE keeps lookups
+# by name/userId/organization behaving the same
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS StatsCP (
+    base_attack INTEGER NOT NULL, base_defense INTEGER NOT NULL, base_stamina INTEGER NOT NULL,
+    max_cp INTEGER NOT NULL,
+    PRIMARY KEY (base_attack, base_defense, base_stamina)
+);
+CREATE TABLE IF NOT EXISTS Pokemon (
+    pokemon_id INTEGER PRIMARY KEY, pokemon_name TEXT COLLATE NOCASE,
+    base_attack INTEGER, base_defense INTEGER, base_stamina INTEGER,
+    type TEXT COLLATE NOCASE, rarity TEXT COLLATE NOCASE
+);
+CREATE TABLE IF NOT EXISTS Location (
+    longitude REAL NOT NULL, latitude REAL NOT NULL, city TEXT COLLATE NOCASE,
+    population_density REAL, closeToWater BOOLEAN,
+    PRIMARY KEY (longitude, latitude)
+);
+CREATE TABLE IF NOT EXISTS Sighting (
+    sightingId TEXT PRIMARY KEY, pokemon_id INTEGER NOT NULL,
+    longitude REAL NOT NULL, latitude REAL NOT NULL,
+    appearedTimeOfDay TEXT, weather TEXT COLLATE NOCASE, temperature REAL, windSpeed REAL
+);
+CREATE INDEX IF NOT EXISTS sighting_pokemon_index ON Sighting (pokemon_id);
+CREATE TABLE IF NOT EXISTS Organizations (
+    organizationName TEXT COLLATE NOCASE PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS User (
+    userId TEXT COLLATE NOCASE PRIMARY KEY, password TEXT NOT NULL, role TEXT,
+    organizationName TEXT COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS user_organization_index ON User (organizationName);
+CREATE TABLE IF NOT EXISTS Events (
+    eventId INTEGER PRIMARY KEY, eventName TEXT, description TEXT, location TEXT,
+    time DATETIME, participantCount INTEGER NOT NULL DEFAULT 0,
+    organizationName TEXT COLLATE NOCASE
+);
+CREATE INDEX IF NOT EXISTS events_time_index ON Events (time, eventId);
+CREATE TABLE IF NOT EXISTS Reports (
+    reportId INTEGER PRIMARY KEY AUTOINCREMENT, sightingId TEXT,
+    userId TEXT COLLATE NOCASE, eventId INTEGER, status TEXT, notes TEXT, time DATETIME
+);
+CREATE INDEX IF NOT EXISTS reports_sighting_index ON Reports (sightingId);
+CREATE INDEX IF NOT EXISTS reports_user_index ON Reports (userId);
+CREATE INDEX IF NOT EXISTS reports_event_user_index ON Reports (eventId, userId);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS sighting_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng);
+CREATE TRIGGER IF NOT EXISTS sighting_rtree_insert AFTER INSERT ON Sighting BEGIN
+    INSERT INTO sighting_rtree VALUES (new.rowid, new.latitude, new.latitude, new.longitude, new.longitude);
+END;
+CREATE TRIGGER IF NOT EXISTS sighting_rtree_delete AFTER DELETE ON Sighting BEGIN
+    DELETE FROM sighting_rtree WHERE id = old.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS sighting_rtree_update AFTER UPDATE OF latitude, longitude ON Sighting BEGIN
+    UPDATE sighting_rtree
+    SET min_lat = new.latitude, max_lat = new.latitude, min_lng = new.longitude, max_lng = new.longitude
+    WHERE id = new.rowid;
+END;
+
+CREATE TABLE IF NOT EXISTS SpeciesCellRollup (
+    cell TEXT NOT NULL, pokemon_id INTEGER NOT NULL, weather TEXT COLLATE NOCASE NOT NULL,
+    appearedTimeOfDay TEXT NOT NULL, sightingCount INTEGER NOT NULL, lastSeen DATETIME,
+    PRIMARY KEY (cell, pokemon_id, weather, appearedTimeOfDay)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS species_rollup_insert AFTER INSERT ON Sighting BEGIN
+    INSERT INTO SpeciesCellRollup (cell, pokemon_id, weather, appearedTimeOfDay, sightingCount, lastSeen)
+    VALUES (ST_GeoHash(new.longitude, new.latitude, 6), new.pokemon_id,
+            COALESCE(new.weather, ''), COALESCE(new.appearedTimeOfDay, ''), 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (cell, pokemon_id, weather, appearedTimeOfDay)
+    DO UPDATE SET sightingCount = sightingCount + 1, lastSeen = excluded.lastSeen;
+END;
+CREATE TRIGGER IF NOT EXISTS species_rollup_delete AFTER DELETE ON Sighting BEGIN
+    UPDATE SpeciesCellRollup SET sightingCount = sightingCount - 1
+    WHERE cell = ST_GeoHash(old.longitude, old.latitude, 6) AND pokemon_id = old.pokemon_id
+      AND weather = COALESCE(old.weather, '') AND appearedTimeOfDay = COALESCE(old.appearedTimeOfDay, '');
+    DELETE FROM SpeciesCellRollup
+    WHERE cell = ST_GeoHash(old.longitude, old.latitude, 6) AND pokemon_id = old.pokemon_id
+      AND weather = COALESCE(old.weather, '') AND appearedTimeOfDay = COALESCE(old.appearedTimeOfDay, '')
+      AND sightingCount <= 0;
+END;
+CREATE TRIGGER IF NOT EXISTS species_rollup_update
+AFTER UPDATE OF longitude, latitude, pokemon_id, weather, appearedTimeOfDay ON Sighting
+WHEN old.longitude IS NOT new.longitude OR old.latitude IS NOT new.latitude
+  OR old.pokemon_id IS NOT new.pokemon_id OR old.weather IS NOT new.weather
+  OR old.appearedTimeOfDay IS NOT new.appearedTimeOfDay
+BEGIN
+    UPDATE SpeciesCellRollup SET sightingCount = sightingCount - 1
+    WHERE cell = ST_GeoHash(old.longitude, old.latitude, 6) AND pokemon_id = old.pokemon_id
+      AND weather = COALESCE(old.weather, '') AND appearedTimeOfDay = COALESCE(old.appearedTimeOfDay, '');
+    DELETE FROM SpeciesCellRollup
+    WHERE cell = ST_GeoHash(old.longitude, old.latitude, 6) AND pokemon_id = old.pokemon_id
+      AND weather = COALESCE(old.weather, '') AND appearedTimeOfDay = COALESCE(old.appearedTimeOfDay, '')
+      AND sightingCount <= 0;
+    INSERT INTO SpeciesCellRollup (cell, pokemon_id, weather, appearedTimeOfDay, sightingCount, lastSeen)
+    VALUES (ST_GeoHash(new.longitude, new.latitude, 6), new.pokemon_id,
+            COALESCE(new.weather, ''), COALESCE(new.appearedTimeOfDay, ''), 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (cell, pokemon_id, weather, appearedTimeOfDay)
+    DO UPDATE SET sightingCount = sightingCount + 1, lastSeen = excluded.lastSeen;
+END;
+"""
+
+
+def _parse_datetime(value):
+    text = value.decode()
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return text
+
+
+# DATETIME columns come back as datetime objects, as they do from MySQL
+sqlite3.register_converter("DATETIME", _parse_datetime)
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(" ", "seconds"))
+sqlite3.register_adapter(decimal.Decimal, float)
+
+
+_TOKENS = re.compile(
+    r"'(?:[^']|'')*'|%s|%%|\bINSERT\s+IGNORE\b|\bGREATEST\s*\(|\bLEAST\s*\(|\bNOW\(\)|\s+FOR\s+UPDATE\b",
+    re.IGNORECASE)
+_WRITE = re.compile(r"\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=1024)
+def translate_sql(sql):
+    """MySQL-flavoured SQL -> (SQLite SQL, whether it asked for row locks).
+
+    Handles what the app uses: %s placeholders, INSERT IGNORE,
+    GREATEST/LEAST, NOW(), SELECT ... FOR UPDATE and EXPLAIN.
+    """
+    locking = False
+
+    def replace(match):
+        nonlocal locking
+        token = match.group(0)
+        upper = token.upper()
+        if token.startswith("'"):
+            return token.replace("%%", "%")
+        if token == "%s":
+            return "?"
+        if token == "%%":
+            return "%"
+        if upper.startswith("INSERT"):
+            return "INSERT OR IGNORE"
+        if upper.startswith("GREATEST"):
+            return "MAX("
+        if upper.startswith("LEAST"):
+            return "MIN("
+        if upper == "NOW()":
+            return "CURRENT_TIMESTAMP"
+        locking = True  # FOR UPDATE: SQLite locks the whole database instead
+        return ""
+
+    translated = _TOKENS.sub(replace, sql)
+    stripped = translated.lstrip()
+    if stripped[:8].upper() == "EXPLAIN " and not stripped[8:].lstrip().upper().startswith("QUERY PLAN"):
+        translated = "EXPLAIN QUERY PLAN " + stripped[8:]
+    return translated, locking
+
+
+@contextlib.contextmanager
+def _mysql_errors():
+    # the routes catch mysql.connector.Error; InterfaceError marks the pooled connection broken
+    try:
+        yield
+    except sqlite3.IntegrityError as e:
+        raise mysql_errors.IntegrityError(msg=str(e)) from e
+    except sqlite3.ProgrammingError as e:
+        raise mysql_errors.ProgrammingError(msg=str(e)) from e
+    except sqlite3.InterfaceError as e:
+        raise mysql_errors.InterfaceError(msg=str(e)) from e
+    except sqlite3.Error as e:
+        raise mysql_errors.DatabaseError(msg=str(e)) from e
+
+
+def _st_geohash(longitude, latitude, precision):
+    # MySQL's argument order
+    return geohash(latitude, longitude, precision)
+
+
+def _floor(value):
+    return None if value is None else math.floor(value)
+
+
+class SQLiteCursor:
+    def __init__(self, connection, dictionary=False):
+        self._connection = connection
+        self._cursor = connection._raw.cursor()
+        self._dictionary = dictionary
+        self._columns = None
+        self.rowcount = -1
+        self.lastrowid = None
+
+    def _prepare(self, operation):
+        sql, locking = translate_sql(operation)
+        if (locking or _WRITE.match(sql)) and not self._connection.in_transaction:
+            self._connection._raw.execute("BEGIN IMMEDIATE")
+        return sql
+
+    def _executed(self):
+        description = self._cursor.description
+        self._columns = [column[0] for column in description] if description else None
+        self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+
+    def execute(self, operation, params=None):
+        with _mysql_errors():
+            self._cursor.execute(self._prepare(operation), tuple(params or ()))
+        self._executed()
+
+    def executemany(self, operation, seq_params):
+        with _mysql_errors():
+            self._cursor.executemany(self._prepare(operation), [tuple(p) for p in seq_params])
+        self._executed()
+
+    def callproc(self, procname, args=()):
+        raise mysql_errors.NotSupportedError(
+            msg=f"SQLite has no stored procedures ({procname}); use the storage backend")
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self._columns, row))
+
+    def fetchone(self):
+        with _mysql_errors():
+            return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        with _mysql_errors():
+            return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        with _mysql_errors():
+            return [self._row(row) for row in self._cursor.fetchall()]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """A SQLite handle with the parts of the mysql.connector connection API the app uses."""
+
+    unread_result = False
+
+    def __init__(self, path, timeout=SQLITE_BUSY_TIMEOUT):
+        with _mysql_errors():
+            # autocommit at the driver level; SQLiteCursor opens the transactions
+            self._raw = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                        check_same_thread=False,
+                                        detect_types=sqlite3.PARSE_DECLTYPES)
+            self._raw.execute("PRAGMA journal_mode = WAL")
+            self._raw.execute("PRAGMA synchronous = NORMAL")
+            self._raw.create_function("FLOOR", 1, _floor, deterministic=True)
+            self._raw.create_function("geo_distance_miles", 4, haversine_miles, deterministic=True)
+            self._raw.create_function("ST_GeoHash", 3, _st_geohash, deterministic=True)
+        self._closed = False
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self, dictionary=dictionary)
+
+    def commit(self):
+        with _mysql_errors():
+            if self._raw.in_transaction:
+                self._raw.execute("COMMIT")
+
+    def rollback(self):
+        with _mysql_errors():
+            if self._raw.in_transaction:
+                self._raw.execute("ROLLBACK")
+
+    def consume_results(self):
+        pass
+
+    def ping(self, reconnect=False):
+        with _mysql_errors():
+            self._raw.execute("SELECT 1").fetchone()
+
+    def is_connected(self):
+        return not self._closed
+
+    def close(self):
+        self._closed = True
+        self._raw.close()
+
+
+def init_schema(path):
+    """Create missing tables, indexes, the R*Tree and the rollup with their triggers."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = SQLiteConnection(path)
+    try:
+        with _mysql_errors():
+            had_rollup = conn._raw.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'SpeciesCellRollup'").fetchone()
+            conn._raw.executescript(SCHEMA)
+        if not had_rollup:
+            # a file from before the rollup existed: fill it once
+            rebuild_species_rollup(conn)
+    finally:
+        conn.close()
+
+
+class SQLiteStorage(Storage):
+    name = "sqlite"
+    species_rollup = True
+
+    def __init__(self, path):
+        self.path = path
+        init_schema(path)
+        super().__init__(pool_from_env({"database": path}, connect=lambda: SQLiteConnection(path)))
+
+    def create_sighting_with_report(self, conn, sighting_id, pokemon_id, longitude, latitude,
+                                    appeared_time, weather, temperature, wind_speed, user_id, notes):
+        # CreateSightingWithReport; its similar-sightings count is never used, so it is skipped
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT OR IGNORE INTO Location (longitude, latitude, city, population_density, closeToWater)
+                VALUES (%s, %s, 'Unknown', 0, FALSE)
+            """, (longitude, latitude))
+            cursor.execute("""
+                INSERT INTO Sighting (sightingId, pokemon_id, longitude, latitude, appearedTimeOfDay,
+                                      weather, temperature, windSpeed)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, (sighting_id, pokemon_id, longitude, latitude, appeared_time,
+                  weather, temperature, wind_speed))
+            cursor.execute("""
+                INSERT INTO Reports (sightingId, userId, status, notes, time)
+                VALUES (%s, %s, 'confirmed', %s, CURRENT_TIMESTAMP)
+            """, (sighting_id, user_id, notes))
+            report_id = cursor.lastrowid
+            conn.commit()
+            return report_id
+        except Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def delete_sighting_with_cleanup(self, conn, sighting_id, user_id):
+        # DeleteSightingWithCleanup: FOR UPDATE takes the write lock up front
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT p.pokemon_name, COUNT(r.reportId)
+                FROM Reports r
+                JOIN Sighting s ON r.sightingId = s.sightingId
+                JOIN Pokemon p ON s.pokemon_id = p.pokemon_id
+                WHERE r.sightingId = %s AND r.userId = %s
+                GROUP BY p.pokemon_name
+                FOR UPDATE
+            """, (sighting_id, user_id))
+            row = cursor.fetchone()
+            if row is None:
+                conn.rollback()
+                return False, 'You can only delete your own sighting reports'
+
+            cursor.execute("DELETE FROM Reports WHERE sightingId = %s AND userId = %s",
+                           (sighting_id, user_id))
+            cursor.execute("""
+                DELETE FROM Sighting
+                WHERE sightingId = %s
+                  AND NOT EXISTS (SELECT 1 FROM Reports r WHERE r.sightingId = %s)
+            """, (sighting_id, sighting_id))
+            conn.commit()
+            return True, f'{row[0]} sighting deleted'
+        except Error as e:
+            # like the procedure's exit handler: roll back and report failure
+            conn.rollback()
+            log_event(logger, logging.ERROR, "delete_sighting_failed", error=str(e))
+            return False, 'Database error occurred'
+        finally:
+            cursor.close()
+
+    def box_where(self, min_lat, max_lat, min_lng, max_lng, alias="s"):
+        # the R*Tree stores float32 boxes rounded outwards, so it only
+        # narrows to candidates; the BETWEENs on the real columns are exact
+        sql = (f"{alias}.rowid IN (SELECT id FROM sighting_rtree"
+               f" WHERE max_lat >= %s AND min_lat <= %s AND max_lng >= %s AND min_lng <= %s)"
+               f" AND {alias}.latitude BETWEEN %s AND %s AND {alias}.longitude BETWEEN %s AND %s")
+        box = [float(min_lat), float(max_lat), float(min_lng), float(max_lng)]
+        return sql, box + box
+
+    def radius_where(self, lat, lng, range_miles, alias="s"):
+        box_sql, params = self.box_where(*bounding_box(lat, lng, range_miles), alias=alias)
+        sql = f"{box_sql} AND geo_distance_miles(%s, %s, {alias}.latitude, {alias}.longitude) <= %s"
+        return sql, params + [float(lat), float(lng), float(range_miles)]
+
+    def rebuild_spatial_index(self):
+        """Refill the R*Tree from Sighting (after a VACUUM, or if it ever drifts)."""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM sighting_rtree")
+            cursor.execute("""
+                INSERT INTO sighting_rtree
+                SELECT rowid, latitude, latitude, longitude, longitude FROM Sighting
+            """)
+            count = cursor.rowcount
+            conn.commit()
+            return count
+        finally:
+            cursor.close()
+            conn.close()
@@ -0,0 +1,149 @@
+"""Storage backends: where the tables live and how the multi-statement operations run.
+
+STORAGE_BACKEND=mysql (default) is the MySQL server from db_config, with the
+stored procedures in procedures.txt. STORAGE_BACKEND=sqlite keeps every table
+in one local file (SQLITE_PATH) and answers spatial searches from an R*Tree;
+see sqlite_storage.py.
+
+Either way the routes get pooled connections with the mysql.connector API
+(%s placeholders, dictionary cursors, mysql.connector.Error) and run their
+own SQL on them. What differs between engines goes through the backend:
+
+- create_sighting_with_report / delete_sighting_with_cleanup: the stored
+  procedures (Python transactions on SQLite)
+- delete_sightings: the set-based bulk form of delete_sighting_with_cleanup,
+  plain SQL that runs unchanged on both engines
+- radius_where / box_where: WHERE fragments for spatial searches
+- species_rollup: whether /api/get_pokemon can read SpeciesCellRollup
+  (always on SQLite; SPECIES_ROLLUP=1 on MySQL once species_rollup.txt ran)
+"""
+import os
+
+from mysql.connector import Error
+
+from db_pool import pool_from_env
+from geo import radius_where
+
+
+class Storage:
+    name = None
+    species_rollup = False
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def get_connection(self):
+        """Check a connection out of the pool (close() returns it)."""
+        return self.pool.get_connection()
+
+    def create_sighting_with_report(self, conn, sighting_id, pokemon_id, longitude, latitude,
+                                    appeared_time, weather, temperature, wind_speed, user_id, notes):
+        """Insert the Location (if new), Sighting and 'confirmed' Report in one
+        transaction and commit; returns the new reportId."""
+        raise NotImplementedError
+
+    def delete_sighting_with_cleanup(self, conn, sighting_id, user_id):
+        """Delete the user's reports of a sighting, and the sighting once nobody
+        reports it anymore; returns (success, message)."""
+        raise NotImplementedError
+
+    def delete_sightings(self, conn, user_id, sighting_ids):
+        """delete_sighting_with_cleanup for many sightings at once, in one transaction.
+
+        Deletes the user's reports of the given sightings, then every one of
+        those sightings nobody reports anymore with a single NOT EXISTS
+        anti-join. Ids the user has no report of are left alone. Commits and
+        returns ({sightingId: pokemon_name} of the sightings whose reports
+        were deleted, set of sightingIds removed); rolls back and raises on
+        error.
+        """
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT r.sightingId, p.pokemon_name
+                FROM Reports r
+                JOIN Sighting s ON r.sightingId = s.sightingId
+                JOIN Pokemon p ON s.pokemon_id = p.pokemon_id
+                WHERE r.userId = %s AND r.sightingId IN ({", ".join(["%s"] * len(sighting_ids))})
+                GROUP BY r.sightingId, p.pokemon_name
+                FOR UPDATE
+            """, [user_id, *sighting_ids])
+            owned = dict(cursor.fetchall())
+            if not owned:
+                conn.rollback()
+                return {}, set()
+
+            ids = list(owned)
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(f"DELETE FROM Reports WHERE userId = %s AND sightingId IN ({placeholders})",
+                           [user_id, *ids])
+            cursor.execute(f"""
+                DELETE FROM Sighting
+                WHERE sightingId IN ({placeholders})
+                  AND NOT EXISTS (SELECT 1 FROM Reports r WHERE r.sightingId = Sighting.sightingId)
+            """, ids)
+            removed = set(ids)
+            if cursor.rowcount != len(ids):
+                # some are still reported by other users
+                cursor.execute(f"SELECT sightingId FROM Sighting WHERE sightingId IN ({placeholders})", ids)
+                removed -= {row[0] for row in cursor.fetchall()}
+            conn.commit()
+            return owned, removed
+        except Error:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def radius_where(self, lat, lng, range_miles, alias="s"):
+        """(sql, params) selecting rows of `alias` within range_miles of a point."""
+        raise NotImplementedError
+
+    def box_where(self, min_lat, max_lat, min_lng, max_lng, alias="s"):
+        """(sql, params) selecting rows of `alias` inside a lat/lng box."""
+        raise NotImplementedError
+
+
+class MySQLStorage(Storage):
+    name = "mysql"
+
+    def __init__(self, db_config):
+        super().__init__(pool_from_env(db_config))
+        self.species_rollup = os.environ.get("SPECIES_ROLLUP", "0") == "1"
+
+    def create_sighting_with_report(self, conn, sighting_id, pokemon_id, longitude, latitude,
+                                    appeared_time, weather, temperature, wind_speed, user_id, notes):
+        cursor = conn.cursor()
+        try:
+            args = (sighting_id, pokemon_id, longitude, latitude, appeared_time,
+                    weather, temperature, wind_speed, user_id, notes, 0)
+            result = cursor.callproc('CreateSightingWithReport', args)
+            return result[-1]
+        finally:
+            cursor.close()
+
+    def delete_sighting_with_cleanup(self, conn, sighting_id, user_id):
+        cursor = conn.cursor()
+        try:
+            result = cursor.callproc('DeleteSightingWithCleanup', (sighting_id, user_id, False, ''))
+            return bool(result[2]), result[3]  # p_success, p_message OUT parameters
+        finally:
+            cursor.close()
+
+    def radius_where(self, lat, lng, range_miles, alias="s"):
+        return radius_where(lat, lng, range_miles, alias)
+
+    def box_where(self, min_lat, max_lat, min_lng, max_lng, alias="s"):
+        return (f"{alias}.latitude BETWEEN %s AND %s AND {alias}.longitude BETWEEN %s AND %s",
+                [min_lat, max_lat, min_lng, max_lng])
+
+
+def storage_from_env(db_config):
+    """The backend selected by STORAGE_BACKEND (mysql or sqlite)."""
+    kind = os.environ.get("STORAGE_BACKEND", "mysql").lower()
+    if kind == "mysql":
+        return MySQLStorage(db_config)
+    if kind == "sqlite":
+        from sqlite_storage import SQLiteStorage, SQLITE_PATH
+        return SQLiteStorage(SQLITE_PATH)
+    raise ValueError(f"Unknown STORAGE_BACKEND {kind!r} (expected mysql or sqlite)")
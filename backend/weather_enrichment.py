@@ -0,0 +1,181 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+from mysql.connector import Error
+
+from logs import get_logger, log_event
+
+logger = get_logger(__name__)
+
+
+class WeatherEnricher:
+    """Background workers that fill in weather for sightings after they're saved.
+
+    create_sighting inserts the row with placeholder (or client-provided)
+    weather and calls submit(); a worker then fetches the real weather and
+    UPDATEs the Sighting row. Failed lookups are retried with exponential
+    backoff up to `max_attempts`. The queue is bounded: when it's full, submit()
+    returns False and the row keeps its placeholder weather.
+    """
+
+    def __init__(self, get_connection, fetch_weather, workers=2, queue_size=1000,
+                 max_attempts=5, base_delay=1.0, max_delay=60.0, on_update=None):
+        self.get_connection = get_connection
+        self.fetch_weather = fetch_weather
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.on_update = on_update
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._pending_retries = 0
+
+        self._stats = {
+            "submitted": 0,
+            "enriched": 0,
+            "failed": 0,
+            "dropped": 0,
+            "retries": 0,
+            "lag_ms_total": 0.0,
+            "lag_ms_max": 0.0,
+            "lag_ms_last": 0.0,
+        }
+
+    def _ensure_started(self):
+        # threads don't survive a fork, so (re)start them in whichever process submits
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"weather-enricher-{i}", daemon=True)
+            thread.start()
+
+    def submit(self, sighting_id, latitude, longitude):
+        self._ensure_started()
+        job = {
+            "sightingId": sighting_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "submitted_at": time.monotonic(),
+            "attempts": 0,
+        }
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._lock:
+            self._stats["submitted"] += 1
+        return True
+
+    def _retry_later(self, job):
+        delay = min(self.base_delay * (2 ** (job["attempts"] - 1)), self.max_delay)
+        with self._lock:
+            self._stats["retries"] += 1
+            self._pending_retries += 1
+
+        def requeue():
+            with self._lock:
+                self._pending_retries -= 1
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                with self._lock:
+                    self._stats["dropped"] += 1
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        timer.start()
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._process(job)
+            except Exception as e:
+                log_event(logger, logging.ERROR, "weather_enrichment_error",
+                          sightingId=job["sightingId"], error=str(e), exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    def _process(self, job):
+        job["attempts"] += 1
+        weather_data = self.fetch_weather(job["latitude"], job["longitude"])
+        if weather_data is not None:
+            try:
+                self._update_sighting(job["sightingId"], weather_data)
+            except Error as e:
+                log_event(logger, logging.WARNING, "weather_enrichment_update_failed",
+                          sightingId=job["sightingId"], error=str(e))
+                weather_data = None
+
+        if weather_data is None:
+            if job["attempts"] < self.max_attempts:
+                self._retry_later(job)
+            else:
+                with self._lock:
+                    self._stats["failed"] += 1
+            return
+
+        lag_ms = (time.monotonic() - job["submitted_at"]) * 1000
+        with self._lock:
+            self._stats["enriched"] += 1
+            self._stats["lag_ms_total"] += lag_ms
+            self._stats["lag_ms_last"] = lag_ms
+            if lag_ms > self._stats["lag_ms_max"]:
+                self._stats["lag_ms_max"] = lag_ms
+
+        if self.on_update is not None:
+            self.on_update(job["sightingId"], weather_data)
+
+    def _update_sighting(self, sighting_id, weather_data):
+        conn = None
+        cursor = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE Sighting SET weather = %s, temperature = %s, windSpeed = %s "
+                "WHERE sightingId = %s",
+                (weather_data["weather"], weather_data["temperature"],
+                 weather_data["windSpeed"], sighting_id)
+            )
+            conn.commit()
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending_retries"] = self._pending_retries
+        stats["queue_depth"] = self._queue.qsize()
+        stats["queue_capacity"] = self._queue.maxsize
+        stats["lag_ms_avg"] = (
+            stats["lag_ms_total"] / stats["enriched"] if stats["enriched"] else 0.0)
+        return stats
+
+
+def enricher_from_env(get_connection, fetch_weather, on_update=None):
+    """WeatherEnricher when WEATHER_ENRICHMENT=async, otherwise None (inline lookups)."""
+    if os.environ.get("WEATHER_ENRICHMENT", "sync") != "async":
+        return None
+    return WeatherEnricher(
+        get_connection,
+        fetch_weather,
+        workers=int(os.environ.get("WEATHER_ENRICHMENT_WORKERS", 2)),
+        queue_size=int(os.environ.get("WEATHER_ENRICHMENT_QUEUE_SIZE", 1000)),
+        max_attempts=int(os.environ.get("WEATHER_ENRICHMENT_MAX_ATTEMPTS", 5)),
+        base_delay=float(os.environ.get("WEATHER_ENRICHMENT_RETRY_DELAY", 1)),
+        on_update=on_update,
+    )